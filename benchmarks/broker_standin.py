@@ -0,0 +1,132 @@
+"""
+------------------------------------------------------------------------
+本地 MQTT Broker 替身（仅用于基准测试）
+只实现发布侧需要的报文：CONNECT/CONNACK、PUBLISH/PUBACK、PINGREQ/PINGRESP、DISCONNECT，
+不做订阅转发；每条 PUBLISH 到达时回调 on_publish(topic, payload, recv_time)
+------------------------------------------------------------------------
+"""
+
+import asyncio
+import struct
+import threading
+import time
+from typing import Callable, Optional
+
+CONNECT = 1
+PUBLISH = 3
+PINGREQ = 12
+DISCONNECT = 14
+
+_CONNACK_V5 = b'\x20\x03\x00\x00\x00'
+_CONNACK_V311 = b'\x20\x02\x00\x00'
+_PINGRESP = b'\xd0\x00'
+
+
+async def _read_remaining_length(reader: asyncio.StreamReader) -> int:
+    multiplier = 1
+    value = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        value += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            return value
+        multiplier *= 128
+
+
+def _read_varint(data: bytes, offset: int):
+    multiplier = 1
+    value = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            return value, offset
+        multiplier *= 128
+
+
+class BrokerStandIn:
+    """在独立线程的事件循环中运行的最小 MQTT 服务端"""
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 on_publish: Optional[Callable[[str, bytes, float], None]] = None):
+        self.host = host
+        self.port = port
+        self.on_publish = on_publish
+        self.received = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self) -> int:
+        """启动并返回实际监听端口"""
+        self._thread = threading.Thread(target=self._run, name="BrokerStandIn", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        protocol_level = 5
+        try:
+            while True:
+                first = (await reader.readexactly(1))[0]
+                length = await _read_remaining_length(reader)
+                body = await reader.readexactly(length) if length else b''
+                packet_type = first >> 4
+
+                if packet_type == CONNECT:
+                    name_len = struct.unpack_from('>H', body, 0)[0]
+                    protocol_level = body[2 + name_len]
+                    writer.write(_CONNACK_V5 if protocol_level == 5 else _CONNACK_V311)
+                elif packet_type == PUBLISH:
+                    recv_time = time.perf_counter()
+                    qos = (first >> 1) & 0x03
+                    topic_len = struct.unpack_from('>H', body, 0)[0]
+                    offset = 2 + topic_len
+                    topic = body[2:offset].decode('utf-8')
+                    packet_id = None
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                    if protocol_level == 5:
+                        props_len, offset = _read_varint(body, offset)
+                        offset += props_len
+                    self.received += 1
+                    if self.on_publish is not None:
+                        self.on_publish(topic, body[offset:], recv_time)
+                    if qos == 1:
+                        writer.write(b'\x40\x02' + packet_id)
+                elif packet_type == PINGREQ:
+                    writer.write(_PINGRESP)
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
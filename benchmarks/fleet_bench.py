@@ -0,0 +1,199 @@
+"""
+------------------------------------------------------------------------
+端到端吞吐基准：模拟设备群 -> 本地 UdpDriver
+发送线程按计划向驱动器发包，驱动器在本进程的事件循环中接收、解码、写缓存；
+发送方以 perf_counter 微秒作为数据包时间戳，探测任务轮询静态/流缓存中各 uid 的条目，
+时间戳更新时以探测时刻减去时间戳计算发送到缓存可见的延迟（含不超过一个探测间隔的误差）
+运行：python -m benchmarks.fleet_bench --devices 200 --duration 10 --output fleet.json
+------------------------------------------------------------------------
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from benchmarks.loadgen import DeviceProfile, Fleet
+from network.udp.udp_driver import UdpManager
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def _rss_kb() -> Optional[int]:
+    """当前常驻内存（KB），/proc 不可用时返回峰值"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+def _clock_us() -> int:
+    """发送方时间戳：perf_counter 微秒（与驱动器同进程，可直接与探测时刻比较）"""
+    return time.perf_counter_ns() // 1000
+
+
+async def _probe_visibility(manager: UdpManager, fleet: Fleet, interval: float,
+                            static_latencies: List[float], stream_latencies: List[float],
+                            stop: asyncio.Event) -> int:
+    """
+    轮询缓存：静态条目的时间戳变化、流条目（以初始化包时间戳标识）首次出现时记录可见延迟（毫秒）
+    :return: 探测轮数
+    """
+    uids, stream_uids = fleet.uids()
+    seen: Dict[int, int] = {}
+    seen_streams: Dict[int, int] = {}
+    rounds = 0
+    while not stop.is_set():
+        now = _clock_us()
+        for uid in uids:
+            entry = manager.static_cache.get_by_id(uid)
+            if entry is not None and seen.get(uid) != entry.timestamp:
+                seen[uid] = entry.timestamp
+                static_latencies.append((now - entry.timestamp) / 1000)
+        for uid in stream_uids:
+            entry = manager.stream_cache.get_by_id(uid)
+            if entry is not None and seen_streams.get(uid) != entry.timestamp:
+                seen_streams[uid] = entry.timestamp
+                stream_latencies.append((now - entry.timestamp) / 1000)
+        rounds += 1
+        await asyncio.sleep(interval)
+    return rounds
+
+
+async def run_case(fleet: Fleet, duration: float, speed: float, drain: float,
+                   probe_interval: float = 0.001) -> Dict[str, Any]:
+    manager = UdpManager()
+    latencies: List[float] = []
+    stream_latencies: List[float] = []
+    counts: Dict[str, int] = {}
+
+    def sink(record: Dict[str, Any], decode_type: str) -> None:
+        counts[decode_type] = counts.get(decode_type, 0) + 1
+
+    manager.add_sink(sink)
+    manager.registry.start()
+    driver_id, driver = await manager.create_driver(ip="127.0.0.1")
+    await asyncio.sleep(0.1)
+    stop_probe = asyncio.Event()
+    probe = asyncio.create_task(_probe_visibility(manager, fleet, probe_interval,
+                                                  latencies, stream_latencies, stop_probe))
+
+    rss_before = _rss_kb()
+    rss_peak = rss_before or 0
+    sender: Dict[str, Any] = {}
+    thread = threading.Thread(target=lambda: sender.update(fleet.run("127.0.0.1", driver.port, duration, speed,
+                                                                     clock=_clock_us)),
+                              name="FleetSender", daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    while thread.is_alive():
+        await asyncio.sleep(0.2)
+        rss_peak = max(rss_peak, _rss_kb() or 0)
+    send_elapsed = time.perf_counter() - start
+    # 等待积压处理完
+    deadline = time.perf_counter() + drain
+    while driver.backlog() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    stop_probe.set()
+    probe_rounds = await probe
+
+    packets = driver.validator.get_stats()
+    received = driver.received
+    sent = sender.get("sent", 0)
+    await manager.registry.stop()
+    await manager.stop_all_drivers()
+
+    latencies.sort()
+    stream_latencies.sort()
+    return {
+        "sender": sender,
+        "received": received,
+        "accepted": packets["accepted"],
+        "rejected": packets["rejected"],
+        "shed": driver.dropped,
+        "drop_rate": round(1 - received / sent, 5) if sent else 0.0,
+        "send_seconds": round(send_elapsed, 4),
+        "total_seconds": round(elapsed, 4),
+        "throughput_pkt_s": round(received / elapsed, 1) if elapsed else 0.0,
+        "records": counts,
+        "visibility_p50_ms": round(_percentile(latencies, 50), 3),
+        "visibility_p99_ms": round(_percentile(latencies, 99), 3),
+        "visibility_max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "visibility_samples": len(latencies),
+        "stream_visibility_p50_ms": round(_percentile(stream_latencies, 50), 3),
+        "stream_visibility_p99_ms": round(_percentile(stream_latencies, 99), 3),
+        "stream_visibility_samples": len(stream_latencies),
+        "probe_interval_ms": probe_interval * 1000,
+        "probe_rounds": probe_rounds,
+        "devices_online": manager.registry.online_count,
+        "rss_before_kb": rss_before,
+        "rss_peak_kb": rss_peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic device fleet end-to-end benchmark")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="模拟时长（秒）")
+    parser.add_argument("--speed", type=float, default=1.0, help="时间倍速，0 表示尽快发送")
+    parser.add_argument("--sensors", type=int, default=4)
+    parser.add_argument("--telemetry-rate", type=float, default=10.0)
+    parser.add_argument("--stream-interval", type=float, default=10.0)
+    parser.add_argument("--stream-kinds", type=str, default="flt,img,aud")
+    parser.add_argument("--stream-chunks", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--drain", type=float, default=5.0, help="发送结束后等待积压处理的最长秒数")
+    parser.add_argument("--probe-interval", type=float, default=0.001, help="缓存可见性探测间隔（秒）")
+    parser.add_argument("--log-level", type=str, default="WARNING")
+    parser.add_argument("--output", type=str, default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    # 驱动器逐包输出 INFO 日志，基准默认只保留告警
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    profile = DeviceProfile(sensors=args.sensors,
+                            telemetry_rate=args.telemetry_rate,
+                            stream_interval=args.stream_interval,
+                            stream_kinds=tuple(kind for kind in args.stream_kinds.split(",") if kind),
+                            stream_chunks=args.stream_chunks,
+                            chunk_size=args.chunk_size,
+                            loss=args.loss,
+                            reorder=args.reorder)
+    fleet = Fleet(args.devices, profile, seed=args.seed)
+    result = asyncio.run(run_case(fleet, args.duration, args.speed, args.drain, args.probe_interval))
+    print(f"devices={args.devices} sent={result['sender'].get('sent', 0)} recv={result['received']} "
+          f"throughput={result['throughput_pkt_s']:.0f} pkt/s drop={result['drop_rate']:.2%} "
+          f"p50={result['visibility_p50_ms']:.3f} ms p99={result['visibility_p99_ms']:.3f} ms "
+          f"rss_peak={result['rss_peak_kb']} KB")
+
+    report = {"params": vars(args), "result": result}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
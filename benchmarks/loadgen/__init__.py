@@ -0,0 +1,3 @@
+from .fleet import Device, DeviceProfile, Fleet
+
+__all__ = ['Device', 'DeviceProfile', 'Fleet']
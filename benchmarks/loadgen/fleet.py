@@ -0,0 +1,190 @@
+"""
+------------------------------------------------------------------------
+模拟设备群
+每台设备依次发送 FIN、每个传感器的 SEN 注册，之后按频率轮流发送 FLO/INT/STR 遥测，
+按间隔发送 FLT/IMG/AUD 流（初始化包 + 分片），并周期性发送 HEA；
+丢包按概率直接不发送，乱序按概率与同一设备的下一个包交换发送顺序
+------------------------------------------------------------------------
+"""
+
+import heapq
+import os
+import random
+import socket
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.loadgen import packets
+
+@dataclass
+class DeviceProfile:
+    sensors: int = 4                    # 每台设备的传感器数量
+    telemetry_rate: float = 10.0        # 每台设备的遥测包频率（包/秒）
+    heartbeat_interval: float = 5.0     # 心跳间隔（秒）
+    stream_interval: float = 10.0       # 每台设备发起流的间隔（秒），0 表示不发送流
+    stream_kinds: Tuple[str, ...] = ('flt', 'img', 'aud')
+    stream_chunks: int = 16             # 每个流的分片数
+    chunk_size: int = 200               # 分片字节数（流式文本不超过 255）
+    loss: float = 0.0                   # 丢包概率
+    reorder: float = 0.0                # 乱序概率
+
+
+class Device:
+    """ 单台模拟设备：按时间产出 (发送时刻偏移, 数据报)，时间戳由发送方在发送时写入 """
+    def __init__(self, index: int, profile: DeviceProfile, rng: random.Random, base_id: int = 0x10000000):
+        self.index = index
+        self.device_id = base_id + index
+        self.profile = profile
+        self.rng = rng
+        # 设备自行约定传感器 uid（上行包直接携带）
+        self.uids = [(self.device_id & 0xFFFF) << 8 | sensor for sensor in range(profile.sensors)]
+        self.stream_uid = (self.device_id & 0xFFFF) << 8 | 0xFF
+
+    def schedule(self, duration: float) -> Iterator[Tuple[float, bytes]]:
+        profile = self.profile
+        rng = self.rng
+        device_id = self.device_id
+        # 各设备错开启动，避免所有设备同一时刻发包
+        t = rng.random() * min(1.0, duration)
+        yield t, packets.fin(device_id, 0, f"dev{self.index}")
+        for sensor in range(len(self.uids)):
+            yield t, packets.sen(device_id, 0, f"s{sensor}")
+        step = 1.0 / profile.telemetry_rate if profile.telemetry_rate > 0 else duration + 1
+        next_telemetry = t + step
+        next_heartbeat = t + profile.heartbeat_interval
+        next_stream = t + (rng.random() * profile.stream_interval if profile.stream_interval > 0 else duration + 1)
+        counter = 0
+        stream_counter = 0
+        while True:
+            t = min(next_telemetry, next_heartbeat, next_stream)
+            if t > duration:
+                return
+            if t == next_heartbeat:
+                next_heartbeat += profile.heartbeat_interval
+                yield t, packets.hea(device_id, 0)
+            elif t == next_telemetry:
+                next_telemetry += step
+                uid = self.uids[counter % len(self.uids)] if self.uids else self.stream_uid
+                kind = counter % 3
+                counter += 1
+                if kind == 0:
+                    yield t, packets.flo(device_id, 0, uid, rng.random() * 100)
+                elif kind == 1:
+                    yield t, packets.int_(device_id, 0, uid, rng.randint(-1000, 1000))
+                else:
+                    yield t, packets.str_(device_id, 0, uid, f"v{counter}")
+            else:
+                next_stream += profile.stream_interval
+                kind = profile.stream_kinds[stream_counter % len(profile.stream_kinds)]
+                stream_counter += 1
+                for datagram in self._stream(kind):
+                    yield t, datagram
+
+    def _stream(self, kind: str) -> Iterator[bytes]:
+        profile = self.profile
+        uid = self.stream_uid
+        device_id = self.device_id
+        chunks = profile.stream_chunks
+        if kind == 'flt':
+            size = min(profile.chunk_size, 255)
+            yield packets.flt_init(device_id, 0, uid, chunks * size)
+            for index in range(chunks):
+                yield packets.flt_chunk(device_id, 0, uid, b'x' * size, index)
+        elif kind == 'img':
+            # 灰度图：宽固定为 chunk_size，每个分片一行
+            yield packets.img_init(device_id, 0, uid, 'GS8', profile.chunk_size, chunks)
+            row = os.urandom(profile.chunk_size)
+            for index in range(chunks):
+                yield packets.img_chunk(device_id, 0, uid, row, index)
+        elif kind == 'aud':
+            yield packets.aud_init(device_id, 0, uid)
+            frame = os.urandom(profile.chunk_size)
+            for index in range(chunks):
+                yield packets.aud_chunk(device_id, 0, uid, frame, index)
+
+
+class Fleet:
+    """
+    N 台设备的合并发送计划
+    每台设备使用独立的源端口（套接字数超过 max_sockets 时多台设备共用）
+    """
+    def __init__(self, devices: int, profile: Optional[DeviceProfile] = None,
+                 seed: int = 0, max_sockets: int = 256):
+        self.profile = profile or DeviceProfile()
+        self.rng = random.Random(seed)
+        self.devices = [Device(index, self.profile, random.Random(seed * 1000003 + index))
+                        for index in range(devices)]
+        self.max_sockets = max_sockets
+        self.stats = {"generated": 0, "sent": 0, "lost": 0, "reordered": 0, "errors": 0}
+
+    def _merged(self, duration: float) -> Iterator[Tuple[float, int, bytes]]:
+        """按发送时刻合并所有设备的计划，乱序在同一设备相邻包之间交换"""
+        streams = [device.schedule(duration) for device in self.devices]
+        heap = []
+        held: Dict[int, Tuple[float, bytes]] = {}
+        for index, stream in enumerate(streams):
+            first = next(stream, None)
+            if first is not None:
+                heap.append((first[0], index, first[1]))
+        heapq.heapify(heap)
+        while heap:
+            t, index, datagram = heapq.heappop(heap)
+            self.stats["generated"] += 1
+            following = next(streams[index], None)
+            if following is not None:
+                heapq.heappush(heap, (following[0], index, following[1]))
+            if self.rng.random() < self.profile.loss:
+                self.stats["lost"] += 1
+                continue
+            if index in held:
+                # 被延后的包在下一个包之后发出
+                yield t, index, datagram
+                yield t, index, held.pop(index)[1]
+                continue
+            if following is not None and self.rng.random() < self.profile.reorder:
+                self.stats["reordered"] += 1
+                held[index] = (t, datagram)
+                continue
+            yield t, index, datagram
+        for index, (t, datagram) in held.items():
+            yield t, index, datagram
+
+    def uids(self) -> Tuple[List[int], List[int]]:
+        """所有设备的 (传感器 uid, 流 uid)"""
+        return ([uid for device in self.devices for uid in device.uids],
+                [device.stream_uid for device in self.devices])
+
+    def run(self, host: str, port: int, duration: float, speed: float = 1.0,
+            clock: Optional[Callable[[], int]] = None) -> Dict[str, float]:
+        """
+        在当前线程中按计划发送
+        :param speed: 时间倍速，0 表示不等待、尽快发送
+        :param clock: 写入数据包的时间戳时钟（不超过 48 位），缺省为 Unix 毫秒；
+                      与接收端同进程时可用 perf_counter 微秒获得更高分辨率
+        """
+        clock = clock or (lambda: int(time.time() * 1000))
+        sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                   for _ in range(min(len(self.devices), self.max_sockets))]
+        target_addr = (host, port)
+        start = time.perf_counter()
+        size = 0
+        try:
+            for t, index, datagram in self._merged(duration):
+                if speed > 0:
+                    delay = start + t / speed - time.perf_counter()
+                    if delay > 0.001:
+                        time.sleep(delay)
+                try:
+                    # 时间戳在发送时写入，接收端据此计算发送到可见的延迟
+                    sockets[index % len(sockets)].sendto(packets.stamp(datagram, clock()), target_addr)
+                    self.stats["sent"] += 1
+                    size += len(datagram)
+                except OSError:
+                    self.stats["errors"] += 1
+        finally:
+            for sock in sockets:
+                sock.close()
+        elapsed = time.perf_counter() - start
+        return dict(self.stats, bytes=size, seconds=round(elapsed, 4),
+                    rate_pkt_s=round(self.stats["sent"] / elapsed, 1) if elapsed else 0.0)
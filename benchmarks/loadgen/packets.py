@@ -0,0 +1,141 @@
+"""
+------------------------------------------------------------------------
+上行数据包构造（设备 -> UDP 驱动器），字段顺序与 packet.py 中的解码类一致
+HEA/STO/FLO/INT 的上行布局与下行响应相同，直接复用 packet.py 的编码器；
+其余类型的上行布局与响应不同，用预编译的 struct 按解码类的字段顺序打包
+------------------------------------------------------------------------
+"""
+
+import struct
+
+from network.udp.packet import (HeartBeatEncoder, StopEncoder, FloatEncoder, IntEncoder,
+                                HeartBeatResponse, StopResponse, FloatResponse, IntResponse)
+from network.udp.protocol import RequestType, DefaultProtocolHeader
+
+_HEAD_LEN = DefaultProtocolHeader.__len__()
+_BASE = '>IHI'      # id/时间戳高16位/时间戳低32位
+
+_ACK = struct.Struct(_BASE)
+_FIN = struct.Struct(_BASE + 'B')           # + name_len
+_SEN = struct.Struct(_BASE + 'B')           # + name_len
+_STR = struct.Struct(_BASE + 'IB')          # + uid/len
+_FLT_I = struct.Struct(_BASE + 'IiB')       # + uid/stream_len/flags
+_FLT = struct.Struct(_BASE + 'IB')          # + uid/len, 末尾 index(i)
+_AUD_I = struct.Struct(_BASE + 'i3siBBB')   # + uid/format/sample_rate/bit_depth/channels/flags
+_IMG_I = struct.Struct(_BASE + 'i3sHHB')    # + uid/format/width/height/flags
+_CHUNK = struct.Struct(_BASE + 'ii')        # + uid/chunk_size，末尾 index(i)
+_AGG = struct.Struct(_BASE + 'BB')          # + flags/count
+_AGG_RECORD = struct.Struct('>IB')          # uid/type
+_AGG_VALUES = {0x10: struct.Struct('>f'), 0x11: struct.Struct('>i')}
+_INDEX = struct.Struct('>i')
+_STAMP = struct.Struct('>HI')
+_STAMP_OFFSET = _HEAD_LEN + 4   # 所有上行包的时间戳紧跟在 4 字节 id 之后
+
+
+def _packet(request_type: RequestType, payload: bytes) -> bytes:
+    request = request_type.struct
+    return DefaultProtocolHeader.encode_method(request.channel, request.port,
+                                               request.decode, len(payload)) + payload
+
+
+def _encoded(request_type: RequestType, encoder, device_id: int, response) -> bytes:
+    buffer = bytearray(_HEAD_LEN + encoder.max_size(response))
+    end = encoder.encode_into(buffer, _HEAD_LEN, device_id, response)
+    request = request_type.struct
+    DefaultProtocolHeader.pack_into(buffer, 0, request.channel, request.port,
+                                    request.decode, end - _HEAD_LEN)
+    return bytes(buffer[:end])
+
+
+def _base(fmt: struct.Struct, device_id: int, timestamp: int, *fields) -> bytes:
+    return fmt.pack(device_id, timestamp >> 32, timestamp & 0xFFFFFFFF, *fields)
+
+
+def stamp(datagram: bytes, timestamp: int) -> bytearray:
+    """改写已构造数据包的时间戳"""
+    buffer = bytearray(datagram)
+    _STAMP.pack_into(buffer, _STAMP_OFFSET, timestamp >> 32, timestamp & 0xFFFFFFFF)
+    return buffer
+
+
+def fin(device_id: int, timestamp: int, name: str) -> bytes:
+    name = name.encode('utf-8')
+    return _packet(RequestType.FIN, _base(_FIN, device_id, timestamp, len(name)) + name)
+
+
+def hea(device_id: int, timestamp: int) -> bytes:
+    return _encoded(RequestType.HEA, HeartBeatEncoder, device_id, HeartBeatResponse(timestamp))
+
+
+def sto(device_id: int, timestamp: int) -> bytes:
+    return _encoded(RequestType.STO, StopEncoder, device_id, StopResponse(timestamp))
+
+
+def ack(device_id: int, timestamp: int) -> bytes:
+    return _packet(RequestType.ACK, _base(_ACK, device_id, timestamp))
+
+
+def sen(device_id: int, timestamp: int, sensor_name: str) -> bytes:
+    name = sensor_name.encode('utf-8')
+    return _packet(RequestType.SEN, _base(_SEN, device_id, timestamp, len(name)) + name)
+
+
+def flo(device_id: int, timestamp: int, uid: int, value: float) -> bytes:
+    return _encoded(RequestType.FLO, FloatEncoder, device_id, FloatResponse(timestamp, uid, value))
+
+
+def int_(device_id: int, timestamp: int, uid: int, value: int) -> bytes:
+    return _encoded(RequestType.INT, IntEncoder, device_id, IntResponse(timestamp, uid, value))
+
+
+def str_(device_id: int, timestamp: int, uid: int, value: str) -> bytes:
+    value = value.encode('utf-8')
+    return _packet(RequestType.STR, _base(_STR, device_id, timestamp, uid, len(value)) + value)
+
+
+def agg(device_id: int, timestamp: int, records) -> bytes:
+    """
+    多记录聚合包（不使用时间增量）
+    :param records: [(uid, value)]，float 按 FLO、int 按 INT、str 按 STR 编码
+    """
+    parts = [_base(_AGG, device_id, timestamp, 0, len(records))]
+    for uid, value in records:
+        if isinstance(value, float):
+            parts.append(_AGG_RECORD.pack(uid, 0x10) + _AGG_VALUES[0x10].pack(value))
+        elif isinstance(value, int):
+            parts.append(_AGG_RECORD.pack(uid, 0x11) + _AGG_VALUES[0x11].pack(value))
+        else:
+            value = value.encode('utf-8')
+            parts.append(_AGG_RECORD.pack(uid, 0x12) + bytes((len(value),)) + value)
+    return _packet(RequestType.AGG, b''.join(parts))
+
+
+def flt_init(device_id: int, timestamp: int, uid: int, stream_len: int, flags: int = 0) -> bytes:
+    return _packet(RequestType.FLT_I, _base(_FLT_I, device_id, timestamp, uid, stream_len, flags))
+
+
+def flt_chunk(device_id: int, timestamp: int, uid: int, data: bytes, index: int) -> bytes:
+    return _packet(RequestType.FLT,
+                   _base(_FLT, device_id, timestamp, uid, len(data)) + data + _INDEX.pack(index))
+
+
+def aud_init(device_id: int, timestamp: int, uid: int, formats: str = 'PCM',
+             sample_rate: int = 16000, bit_depth: int = 16, channels: int = 1, flags: int = 0) -> bytes:
+    return _packet(RequestType.AUD_I, _base(_AUD_I, device_id, timestamp, uid, formats.encode('ascii'),
+                                            sample_rate, bit_depth, channels, flags))
+
+
+def aud_chunk(device_id: int, timestamp: int, uid: int, data: bytes, index: int) -> bytes:
+    return _packet(RequestType.AUD,
+                   _base(_CHUNK, device_id, timestamp, uid, len(data)) + data + _INDEX.pack(index))
+
+
+def img_init(device_id: int, timestamp: int, uid: int, formats: str = 'GS8',
+             width: int = 32, height: int = 32, flags: int = 0) -> bytes:
+    return _packet(RequestType.IMG_I, _base(_IMG_I, device_id, timestamp, uid, formats.encode('ascii'),
+                                            width, height, flags))
+
+
+def img_chunk(device_id: int, timestamp: int, uid: int, data: bytes, index: int) -> bytes:
+    return _packet(RequestType.IMG,
+                   _base(_CHUNK, device_id, timestamp, uid, len(data)) + data + _INDEX.pack(index))
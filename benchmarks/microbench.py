@@ -0,0 +1,364 @@
+"""
+------------------------------------------------------------------------
+热点函数微基准：解码、静态缓存、流缓冲区、图片解码
+每个用例报告 ops/s（多轮取最好值，中位数供参考）、相对速度和单次调用的内存分配：
+    relative          与固定参考负载交替计时得到的速度比（多轮中位数），抵消机器整体降频与负载波动
+    alloc_peak_bytes  单次调用期间的临时内存峰值（tracemalloc）
+    alloc_blocks      每次调用净增的内存块数（sys.getallocatedblocks）
+与基线比较时速度（默认 relative，--absolute 时为 ops/s）下降超过 --threshold
+或分配增长超过 --alloc-threshold 视为回退，退出码为 1
+基线与当前运行应在同一台机器、同一 Python 版本上生成
+运行：python -m benchmarks.microbench --save-baseline micro_base.json
+     python -m benchmarks.microbench --baseline micro_base.json --threshold 0.2
+------------------------------------------------------------------------
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import struct
+import sys
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from benchmarks.loadgen import packets
+from network.udp.cache import StaticBufferStruct, StaticCache, StreamBufferStruct, ImgStruct
+from network.udp.packet import IMGFORMAT
+from network.udp.protocol import RequestType, DefaultProtocolHeader
+from utils.image.image_byte_decode import decode_image_data
+
+_HEAD_LEN = DefaultProtocolHeader.__len__()
+_DEVICE_ID = 0x10000001
+_TIMESTAMP = 1700000000000
+_UID = 0x000101
+STREAM_LENGTHS = (16, 256, 4096)
+CHUNK_SIZE = 200
+IMAGE_SIZE = (64, 64)
+ALLOC_ROUNDS = 200          # 统计净增内存块时的调用次数
+ALLOC_SLACK_BYTES = 256     # 内存峰值比较的绝对容差，避免小用例被噪声误判
+
+_REFERENCE_STRUCT = struct.Struct('>IHIf')
+_REFERENCE_DATA = _REFERENCE_STRUCT.pack(_DEVICE_ID, _TIMESTAMP >> 32, _TIMESTAMP & 0xFFFFFFFF, 1.5)
+
+
+@dataclass
+class Case:
+    name: str
+    func: Callable[[], Any]
+
+
+def _payload(datagram: bytes) -> bytes:
+    """去掉协议头，得到解码方法的输入"""
+    return datagram[_HEAD_LEN:]
+
+
+def _decode_cases() -> List[Case]:
+    payloads = {
+        RequestType.FIN: packets.fin(_DEVICE_ID, _TIMESTAMP, "bench-device"),
+        RequestType.HEA: packets.hea(_DEVICE_ID, _TIMESTAMP),
+        RequestType.STO: packets.sto(_DEVICE_ID, _TIMESTAMP),
+        RequestType.ACK: packets.ack(_DEVICE_ID, _TIMESTAMP),
+        RequestType.SEN: packets.sen(_DEVICE_ID, _TIMESTAMP, "temperature"),
+        RequestType.FLO: packets.flo(_DEVICE_ID, _TIMESTAMP, _UID, 23.5),
+        RequestType.INT: packets.int_(_DEVICE_ID, _TIMESTAMP, _UID, -42),
+        RequestType.STR: packets.str_(_DEVICE_ID, _TIMESTAMP, _UID, "status: ok"),
+        RequestType.AGG: packets.agg(_DEVICE_ID, _TIMESTAMP,
+                                     [(_UID + i, value) for i, value in enumerate((1.5, 7, "on") * 4)]),
+        RequestType.FLT_I: packets.flt_init(_DEVICE_ID, _TIMESTAMP, _UID, 16 * CHUNK_SIZE),
+        RequestType.AUD_I: packets.aud_init(_DEVICE_ID, _TIMESTAMP, _UID),
+        RequestType.IMG_I: packets.img_init(_DEVICE_ID, _TIMESTAMP, _UID, 'GS8', *IMAGE_SIZE),
+        RequestType.FLT: packets.flt_chunk(_DEVICE_ID, _TIMESTAMP, _UID, b'x' * CHUNK_SIZE, 3),
+        RequestType.AUD: packets.aud_chunk(_DEVICE_ID, _TIMESTAMP, _UID, b'\x01' * CHUNK_SIZE, 3),
+        RequestType.IMG: packets.img_chunk(_DEVICE_ID, _TIMESTAMP, _UID, b'\x02' * CHUNK_SIZE, 3),
+    }
+    cases = []
+    table = RequestType.decoder_table()
+    for request_type, datagram in payloads.items():
+        request = request_type.struct
+        decode = table[(request.channel, request.port, request.decode)][0]
+        data = _payload(datagram)
+        cases.append(Case(f"decode.{request_type.value}", lambda decode=decode, data=data: decode(data)))
+
+    datagram = payloads[RequestType.FLO]
+    header = DefaultProtocolHeader()
+    cases.append(Case("header.decode_method", lambda: header.decode_method(datagram)))
+    return cases
+
+
+def _static_buffer(uid: int, value: Any) -> StaticBufferStruct:
+    return StaticBufferStruct(id=_DEVICE_ID, uid=uid, name=None, addr=("127.0.0.1", 9000),
+                              timestamp=_TIMESTAMP, data=value, rout=f"nar/device/{_DEVICE_ID:08x}/{uid}/static")
+
+
+def _static_cases() -> List[Case]:
+    cases = []
+    # 稳态：uid 集合固定，add 走更新已有项的路径
+    buffers = [_static_buffer(_UID + i, float(i)) for i in range(256)]
+    cache = StaticCache(max_len=4096, max_ram=1 << 24)
+    for buffer in buffers:
+        cache.add(buffer)
+    assert len(cache.get_all_data()) == len(buffers), "static cache dropped steady-state entries"
+    state = {"index": 0}
+
+    def add():
+        index = state["index"]
+        state["index"] = (index + 1) & 0xFF
+        cache.add(buffers[index])
+
+    cases.append(Case("static_cache.add", add))
+    for entries in (256, 4096):
+        filled = StaticCache(max_len=entries, max_ram=1 << 24)
+        for i in range(entries):
+            filled.add(_static_buffer(_UID + i, i))
+        # 缓存未按条目数保留时，get_all_data 测的是更小的字典
+        assert len(filled.get_all_data()) == entries, f"static cache kept {len(filled.get_all_data())}/{entries} entries"
+        cases.append(Case(f"static_cache.get_all_data[n={entries}]", filled.get_all_data))
+    return cases
+
+
+def _stream_buffer(length: int) -> StreamBufferStruct:
+    return StreamBufferStruct(addr=("127.0.0.1", 9000), id=_DEVICE_ID, uid=_UID, name=None,
+                              timestamp=_TIMESTAMP, rout=f"nar/device/{_DEVICE_ID:08x}/{_UID}/flt",
+                              end_chunk=length)
+
+
+def _filled_stream(length: int, chunk: bytes) -> StreamBufferStruct:
+    buffer = _stream_buffer(length)
+    for index in range(length):
+        buffer.add_chunk(chunk, index)
+    return buffer
+
+
+def _stream_cases() -> List[Case]:
+    cases = []
+    chunk = b'x' * CHUNK_SIZE
+    for length in STREAM_LENGTHS:
+        # 一次操作 = 新建缓冲区并按序写满 length 个 chunk
+        def fill(length=length):
+            buffer = _stream_buffer(length)
+            add_chunk = buffer.add_chunk
+            for index in range(length):
+                add_chunk(chunk, index)
+
+        filled = _filled_stream(length, chunk)
+
+        # 一次操作 = 迭代读完全部 chunk（读到 None 后迭代器自动复位）
+        def drain(buffer=filled):
+            get_next_chunk = buffer.get_next_chunk
+            while get_next_chunk() is not None:
+                pass
+
+        cases.append(Case(f"stream.add_chunk[n={length}]", fill))
+        cases.append(Case(f"stream.get_next_chunk[n={length}]", drain))
+        cases.append(Case(f"stream.get_full_data[n={length}]", lambda buffer=filled: buffer.get_full_data))
+    return cases
+
+
+def _image_cases() -> List[Case]:
+    cases = []
+    width, height = IMAGE_SIZE
+    bytes_per_pixel = {'565': 2, '888': 3, 'GS8': 1}
+    for code, pixel in bytes_per_pixel.items():
+        row = bytes(range(256)) * (width * pixel // 256 + 1)
+        datas = _filled_stream(height, row[:width * pixel])
+        # 与驱动器一致，formats 为解码后的格式名
+        img = ImgStruct(id=_DEVICE_ID, uid=_UID, addr=("127.0.0.1", 9000), name=None,
+                        timestamp=_TIMESTAMP, rout=f"nar/device/{_DEVICE_ID:08x}/{_UID}/img",
+                        formats=IMGFORMAT[code], size=IMAGE_SIZE, datas=datas)
+        if decode_image_data(img) is None:
+            raise RuntimeError(f"decode_image_data returned nothing for format {code}")
+        cases.append(Case(f"image.decode[{code} {width}x{height}]", lambda img=img: decode_image_data(img)))
+    return cases
+
+
+def build_cases() -> List[Case]:
+    return _decode_cases() + _static_cases() + _stream_cases() + _image_cases()
+
+
+def _reference() -> int:
+    """固定的纯 Python 参考负载：解包、构造记录字典、格式化路由，与被测热点的操作类型接近"""
+    unpack_from = _REFERENCE_STRUCT.unpack_from
+    total = 0
+    for i in range(32):
+        device_id, high, low, value = unpack_from(_REFERENCE_DATA, 0)
+        record = {'id': device_id, 'timestamp': high << 32 | low, 'data': value}
+        total += len(f"nar/device/{record['id']:08x}/{i}/static")
+    return total
+
+
+def _calibrate(timer: timeit.Timer, min_time: float) -> int:
+    """每轮调用次数按 2 的幂增长，直到单轮耗时不少于 min_time"""
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return number
+
+
+def _measure_speed(func: Callable[[], Any], reference: Tuple[timeit.Timer, int],
+                   min_time: float, repeat: int) -> Tuple[float, float, float, int]:
+    """
+    参考负载与被测函数逐轮交替计时（timeit 计时期间关闭 GC）
+    返回 (最好 ops/s, 中位数 ops/s, 相对速度中位数, 每轮调用次数)
+    """
+    reference_timer, reference_number = reference
+    timer = timeit.Timer(func)
+    number = _calibrate(timer, min_time)
+    rates = []
+    ratios = []
+    for _ in range(repeat):
+        reference_rate = reference_number / reference_timer.timeit(reference_number)
+        rate = number / timer.timeit(number)
+        rates.append(rate)
+        ratios.append(rate / reference_rate)
+    return max(rates), statistics.median(rates), statistics.median(ratios), number
+
+
+def _measure_alloc(func: Callable[[], Any]) -> Tuple[int, float]:
+    """返回 (单次调用临时内存峰值字节数, 每次调用净增内存块数)"""
+    gc.collect()
+    gc.disable()
+    try:
+        blocks = sys.getallocatedblocks()
+        for _ in range(ALLOC_ROUNDS):
+            func()
+        retained = (sys.getallocatedblocks() - blocks) / ALLOC_ROUNDS
+
+        tracemalloc.start()
+        try:
+            func()
+            tracemalloc.clear_traces()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        gc.enable()
+    return max(0, peak - current), round(retained, 3)
+
+
+def run(cases: List[Case], min_time: float, repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    reference_timer = timeit.Timer(_reference)
+    reference = (reference_timer, _calibrate(reference_timer, min_time / 2))
+    for case in cases:
+        # 预热：填充 lru 缓存、UID 表等首次调用才建立的状态
+        for _ in range(3):
+            case.func()
+        best, median, relative, number = _measure_speed(case.func, reference, min_time, repeat)
+        peak, blocks = _measure_alloc(case.func)
+        results[case.name] = {
+            "ops_s": round(best, 1),
+            "ops_s_median": round(median, 1),
+            "relative": round(relative, 6),
+            "ns_op": round(1e9 / best, 1),
+            "number": number,
+            "alloc_peak_bytes": peak,
+            "alloc_blocks": blocks,
+        }
+        print(f"{case.name:<40} {best:>14,.0f} ops/s {1e9 / best:>12,.0f} ns/op {relative:>10.4f} rel "
+              f"{peak:>10,d} B peak {blocks:>8.2f} blocks")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float, alloc_threshold: float, absolute: bool = False) -> List[str]:
+    """返回回退说明列表，空列表表示全部通过"""
+    metric = "ops_s" if absolute else "relative"
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<40} new (no baseline)")
+            continue
+        change = current[metric] / base[metric] - 1 if base.get(metric) else 0.0
+        problems = []
+        if change < -threshold:
+            problems.append(f"{metric} {change:+.1%}")
+        peak_limit = base["alloc_peak_bytes"] * (1 + alloc_threshold) + ALLOC_SLACK_BYTES
+        if current["alloc_peak_bytes"] > peak_limit:
+            problems.append(f"peak {base['alloc_peak_bytes']} -> {current['alloc_peak_bytes']} B")
+        if current["alloc_blocks"] > base["alloc_blocks"] + 0.5:
+            problems.append(f"blocks {base['alloc_blocks']} -> {current['alloc_blocks']}")
+        status = "REGRESSION " + ", ".join(problems) if problems else "ok"
+        print(f"{name:<40} {change:+8.1%}  {status}")
+        if problems:
+            regressions.append(f"{name}: {', '.join(problems)}")
+    return regressions
+
+
+def _environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path microbenchmarks with baseline comparison")
+    parser.add_argument("--filter", type=str, default=None, help="只运行名称匹配该正则的用例")
+    parser.add_argument("--list", action="store_true", help="列出用例后退出")
+    parser.add_argument("--min-time", type=float, default=0.05, help="每轮最短计时（秒）")
+    parser.add_argument("--repeat", type=int, default=7, help="计时轮数")
+    parser.add_argument("--baseline", type=str, default=None, help="对比的基线 JSON")
+    parser.add_argument("--save-baseline", type=str, default=None, help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的速度下降比例")
+    parser.add_argument("--absolute", action="store_true", help="按 ops/s 而不是相对速度比较")
+    parser.add_argument("--alloc-threshold", type=float, default=0.1, help="允许的内存峰值增长比例")
+    parser.add_argument("--output", type=str, default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    # 缓存与流缓冲区逐次输出 INFO/DEBUG 日志，基准只保留告警
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    cases = build_cases()
+    if args.filter:
+        pattern = re.compile(args.filter)
+        cases = [case for case in cases if pattern.search(case.name)]
+    if args.list:
+        for case in cases:
+            print(case.name)
+        return
+
+    results = run(cases, args.min_time, args.repeat)
+    report = {"environment": _environment(), "params": vars(args), "cases": results}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("python") != report["environment"]["python"]:
+            print(f"warning: baseline was recorded on Python {baseline.get('environment', {}).get('python')}",
+                  file=sys.stderr)
+        print()
+        regressions = compare(results, baseline.get("cases", {}), args.threshold, args.alloc_threshold,
+                              args.absolute)
+        report["regressions"] = regressions
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": report["environment"], "cases": results}, f, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over threshold", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
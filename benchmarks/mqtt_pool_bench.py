@@ -0,0 +1,119 @@
+"""
+------------------------------------------------------------------------
+MQTT 发布连接池基准：单连接与多连接对比
+负载前 8 字节为发送时刻（perf_counter），Broker 替身收到后计算端到端延迟
+运行：python -m benchmarks.mqtt_pool_bench --messages 20000 --sizes 1,2,4,8
+------------------------------------------------------------------------
+"""
+
+import argparse
+import json
+import struct
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.broker_standin import BrokerStandIn
+from network.mqtt.mqtt_pool import MqttPublisherPool
+
+_STAMP = struct.Struct('>d')
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def run_case(port: int, broker: BrokerStandIn, size: int, messages: int, topics: int,
+             payload_size: int, qos: int, inflight: int, timeout: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    done = threading.Event()
+    lock = threading.Lock()
+    # 在途窗口已满的消息被直接丢弃，发送结束后按实际提交数等待
+    expected = [messages]
+
+    def on_publish(topic: str, payload: bytes, recv_time: float):
+        with lock:
+            latencies.append(recv_time - _STAMP.unpack_from(payload)[0])
+            if len(latencies) >= expected[0]:
+                done.set()
+
+    broker.on_publish = on_publish
+    pool = MqttPublisherPool({"endpoint": "127.0.0.1", "client_id": f"bench_pool_{size}"},
+                             port=port, size=size, inflight=inflight)
+    try:
+        # 等待所有连接建立，避免把握手时间计入吞吐
+        deadline = time.perf_counter() + timeout
+        while not all(p.client.is_connected() for p in pool.publishers):
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Broker stand-in connection timed out")
+            time.sleep(0.01)
+
+        topic_names = [f"nar/bench/{i:04d}/static" for i in range(topics)]
+        padding = b'\x00' * max(0, payload_size - _STAMP.size)
+        start = time.perf_counter()
+        for i in range(messages):
+            pool.publish(topic_names[i % topics], _STAMP.pack(time.perf_counter()) + padding, qos)
+        sent = time.perf_counter() - start
+        with lock:
+            expected[0] = messages - sum(stats["dropped"] for stats in pool.get_stats())
+            if len(latencies) >= expected[0]:
+                done.set()
+        done.wait(timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.stop()
+        broker.on_publish = None
+
+    latencies.sort()
+    dropped = sum(stats["dropped"] for stats in pool.get_stats())
+    return {
+        "pool_size": size,
+        "messages": messages,
+        "received": len(latencies),
+        "dropped": dropped,
+        "send_seconds": round(sent, 4),
+        "total_seconds": round(elapsed, 4),
+        "throughput_msg_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "latency_p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT publisher pool benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=64)
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--sizes", type=str, default="1,2,4,8")
+    parser.add_argument("--qos", type=int, default=1, choices=(0, 1))
+    parser.add_argument("--inflight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", type=str, default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    broker = BrokerStandIn()
+    port = broker.start()
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            result = run_case(port, broker, size, args.messages, args.topics,
+                              args.payload_size, args.qos, args.inflight, args.timeout)
+            results.append(result)
+            print(f"pool={result['pool_size']:<2} "
+                  f"recv={result['received']}/{result['messages']} dropped={result['dropped']} "
+                  f"throughput={result['throughput_msg_s']:.0f} msg/s "
+                  f"p50={result['latency_p50_ms']:.3f} ms p99={result['latency_p99_ms']:.3f} ms")
+    finally:
+        broker.stop()
+
+    report = {"params": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+------------------------------------------------------------------------
+抓包回放：把 DatagramCapture 记录的数据报按原始时间间隔发往 UDP 驱动器
+每个原始源地址使用一个独立的发送套接字，驱动器侧仍能按地址区分设备
+--speed 1 为原速，N 为 N 倍速，0 为不等待、尽快发送
+运行：python -m benchmarks.replay core/data/captures/udp_driver_1.ncap --port 1025 --speed 10
+------------------------------------------------------------------------
+"""
+
+import argparse
+import json
+import socket
+import time
+from typing import Dict, Tuple
+
+from network.udp.capture import read_capture
+
+def replay(path: str, host: str, port: int, speed: float, loops: int = 1) -> Dict[str, float]:
+    sockets: Dict[Tuple[str, int], socket.socket] = {}
+    sent = 0
+    size = 0
+    lag = 0.0
+    start = time.perf_counter()
+    try:
+        for _ in range(loops):
+            base = None
+            loop_start = time.perf_counter()
+            for arrival, addr, data in read_capture(path):
+                if base is None:
+                    base = arrival
+                if speed > 0:
+                    target = loop_start + (arrival - base) / speed
+                    delay = target - time.perf_counter()
+                    if delay > 0.001:
+                        time.sleep(delay)
+                    else:
+                        lag = max(lag, -delay)
+                sock = sockets.get(addr)
+                if sock is None:
+                    sock = sockets[addr] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.sendto(data, (host, port))
+                sent += 1
+                size += len(data)
+    finally:
+        for sock in sockets.values():
+            sock.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "datagrams": sent,
+        "bytes": size,
+        "sources": len(sockets),
+        "seconds": round(elapsed, 4),
+        "rate_pkt_s": round(sent / elapsed, 1) if elapsed else 0.0,
+        "max_lag_ms": round(lag * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a raw UDP datagram capture")
+    parser.add_argument("capture", type=str, help="抓包文件路径")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True, help="目标 UDP 驱动器端口")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示尽快发送")
+    parser.add_argument("--loops", type=int, default=1)
+    parser.add_argument("--output", type=str, default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    result = replay(args.capture, args.host, args.port, args.speed, args.loops)
+    print(f"sent={result['datagrams']} sources={result['sources']} "
+          f"rate={result['rate_pkt_s']:.0f} pkt/s seconds={result['seconds']:.3f} "
+          f"max_lag={result['max_lag_ms']:.3f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "result": result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 
-from fastapi import APIRouter
-from typing import Dict, Any
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import Dict, Any, Optional, Tuple
+import base64
 
 from dataclasses import dataclass
 from core.network.udp.packet import AUDFORMAT, IMGFORMAT
@@ -10,8 +11,17 @@ from core.network.udp.cache import (StaticCache, StreamCache,
                                     StaticBufferStruct,
                                     StreamBufferStruct)
 from core.utils.image.image_byte_decode import decode_image_data
+from core.utils.codec.device_id import format_device_id
 
 current_online = {}
+MAX_LONG_POLL_TIMEOUT = 30   # 长轮询最长等待秒数
+STREAM_MEDIA_TYPES = {
+    'flt': 'text/plain; charset=utf-8',
+    'img': 'application/octet-stream',
+    'PCM': 'audio/pcm',
+    'MP3': 'audio/mpeg',
+    'AAC': 'audio/aac',
+}
 router = APIRouter(prefix="/api/data", tags=["data"])
 
 
@@ -19,38 +29,144 @@ router = APIRouter(prefix="/api/data", tags=["data"])
 async def get_all_data():
     global current_online
 
-    static_cache_all : Dict = udp_manager.static_cache.get_all_data()
-    stream_cache_all : Dict = udp_manager.stream_cache.get_all_data()
-    merged_cache = {**static_cache_all, **stream_cache_all}
-    update_online = {}
-    for uid, cache in merged_cache.items():
-        cache : StaticBufferStruct | FltStruct | ImgStruct | AudStruct
-        dtype = cache.dtype
-        if dtype == 'static':
-            cache : StaticBufferStruct
-            online = cache.rout
-        elif dtype == 'flt':
-            cache : FltStruct
-            online = cache.rout
-
-        elif dtype == 'img':
-            cache : ImgStruct
-            if cache.datas.done:
-                online =cache.rout
-        elif dtype == 'aud':
-            cache : AudStruct
-            online = cache.rout
-        update_online[uid] = online
-    current_online = update_online
+    # 在线表由驱动增量维护，版本未变化时直接复用上一份快照
+    current_online = udp_manager.online_map.snapshot()
 
     return current_online
+
+@router.get("/network/udp/cache/delta")
+async def get_delta_data(since: int = 0,
+                         epoch: Optional[str] = None,
+                         timeout: float = 0):
+    """
+    在线主题增量同步
+    
+    Args:
+        since: 客户端上次同步到的版本号
+        epoch: 客户端上次同步时的 epoch，不匹配时返回全量
+        timeout: 无变更时的长轮询等待秒数，0 表示立即返回
+        
+    Returns:
+        dict: 自 since 以来新增/变更/移除的 uid 及当前版本号
+    """
+    online_map = udp_manager.online_map
+    timeout = min(max(timeout, 0), MAX_LONG_POLL_TIMEOUT)
+    if timeout > 0 and epoch == online_map.epoch:
+        await online_map.wait_for_change(since, timeout)
+
+    delta = online_map.delta(since, epoch)
+    return {
+        "epoch": delta.epoch,
+        "version": delta.version,
+        "reset": delta.reset,
+        "added": delta.added,
+        "changed": delta.changed,
+        "removed": delta.removed,
+    }
     
+def _get_stream_cache(uid: int) -> FltStruct | ImgStruct | AudStruct:
+    cache = udp_manager.stream_cache.get_by_id(uid)
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"流数据 {uid} 不存在")
+    return cache
+
+def _parse_range(range_header: str, total: int) -> Tuple[int, int]:
+    """
+    解析 HTTP Range 头（仅支持单区间），返回 [start, end) 
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(f"不支持的 Range: {range_header}")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) + 1 if last else total
+    else:
+        # 后缀区间 bytes=-n 表示最后 n 个字节
+        start = max(total - int(last), 0)
+        end = total
+    end = min(end, total)
+    if start >= end:
+        raise ValueError(f"Range 超出数据范围: {range_header}")
+    return start, end
+
+@router.get("/network/udp/cache/{uid}/chunks")
+async def get_data_chunks(uid: int, start: int = 0, end: Optional[int] = None):
+    """
+    按 chunk 序号区间读取流数据
+    
+    Args:
+        uid: 流数据 uid
+        start: 起始 chunk 序号（包含）
+        end: 结束 chunk 序号（不包含），为空时读到当前最新 chunk
+        
+    Returns:
+        dict: 区间内的 chunk，文本流为字符串，其余为 base64
+    """
+    cache = _get_stream_cache(uid)
+    chunks = cache.datas.get_chunk_range(start, end)
+    if cache.dtype == 'flt':
+        data = [chunk.decode("utf-8", errors="replace") for chunk in chunks]
+    else:
+        data = [base64.b64encode(chunk).decode("utf-8") for chunk in chunks]
+    return {
+        "id": format_device_id(cache.id),
+        "uid": cache.uid,
+        "type": cache.dtype,
+        "start": start,
+        "end": start + len(chunks),
+        "total": cache.datas.get_chunks_count,
+        "done": cache.datas.done,
+        "data": data,
+    }
+
+@router.get("/network/udp/cache/{uid}/bytes")
+async def get_data_bytes(uid: int, range_header: Optional[str] = Header(None, alias="Range")):
+    """
+    按字节区间读取流数据，支持 HTTP Range 头（音频可直接用于 seek）
+    
+    Args:
+        uid: 流数据 uid
+        range_header: HTTP Range 头，例如 bytes=0-1023
+        
+    Returns:
+        Response: 指定区间时返回 206，否则返回 200 全量数据
+    """
+    cache = _get_stream_cache(uid)
+    datas = cache.datas
+    total = len(datas)
+    length = str(total) if datas.done else "*"
+    media_type = STREAM_MEDIA_TYPES.get(cache.formats if cache.dtype == 'aud' else cache.dtype,
+                                        'application/octet-stream')
+
+    if range_header is None:
+        return Response(content=datas.get_byte_range(0, total),
+                        media_type=media_type,
+                        headers={"Accept-Ranges": "bytes"})
+    try:
+        start, end = _parse_range(range_header, total)
+    except ValueError as e:
+        raise HTTPException(status_code=416, detail=str(e),
+                            headers={"Content-Range": f"bytes */{total}"})
+
+    return Response(content=datas.get_byte_range(start, end),
+                    status_code=206,
+                    media_type=media_type,
+                    headers={"Accept-Ranges": "bytes",
+                             "Content-Range": f"bytes {start}-{end - 1}/{length}"})
+
 @router.get("/network/udp/cache/{uid}")
 async def get_data_uid(uid):
     static_uid_data = udp_manager.static_cache.get_cache(uid)
     stream_uid_data = udp_manager.stream_cache.get_cache(uid)
     if static_uid_data is not None:
         cache : StaticBufferStruct = static_uid_data
+        return {
+            "id": format_device_id(cache.id),
+            "uid": cache.uid,
+            "type": cache.dtype,
+            'data': cache.data,
+        }
     else:
         cache : FltStruct | ImgStruct | AudStruct = stream_uid_data
         dtype = cache.dtype
@@ -61,6 +177,7 @@ async def get_data_uid(uid):
             if current_data is not None:
                 data = current_data.decode("utf-8")
                 return {
+                    "id": format_device_id(cache.id),
                     "uid": cache.uid,
                     "type": "flt",
                     'data': data,
@@ -68,6 +185,7 @@ async def get_data_uid(uid):
             
             else:
                 return {
+                    "id": format_device_id(cache.id),
                     "uid": cache.uid,
                     "type": "flt",
                     'data': 'wait',
@@ -79,6 +197,7 @@ async def get_data_uid(uid):
                 img = decode_image_data(cache)
 
                 return {
+                    "id": format_device_id(cache.id),
                     "uid": cache.uid,
                     "type": "img",
                     'data': img,
@@ -86,6 +205,7 @@ async def get_data_uid(uid):
                 
             else:
                 return {
+                    "id": format_device_id(cache.id),
                     "uid": cache.uid,
                     "type": "img",
                     'data': 'wait',
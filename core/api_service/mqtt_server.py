@@ -1,7 +1,9 @@
+from core import core as _core
 from core.core import app, udp_manager
 from fastapi import APIRouter, HTTPException
 from typing import Dict, List
 from network.mqtt.mqtt_monitor import MqttSubscriptionMonitor
+from network.mqtt.mqtt_loopback import LoopbackSubscriber
 import os
 
 router = APIRouter(prefix="/api/mqtt", tags=["mqtt"])
@@ -9,8 +11,11 @@ router = APIRouter(prefix="/api/mqtt", tags=["mqtt"])
 # 全局MQTT订阅监控实例
 subscription_monitor: MqttSubscriptionMonitor = None
 
-def initialize_subscription_monitor():
-    """初始化MQTT订阅监控器"""
+def initialize_subscription_monitor(subscriber=None):
+    """
+    初始化MQTT订阅监控器
+    :param subscriber: 提供 $SYS 消息的订阅器（如 LoopbackSubscriber），为 None 时自建 Broker 连接
+    """
     global subscription_monitor
     if subscription_monitor is None:
         # MQTT配置
@@ -20,7 +25,7 @@ def initialize_subscription_monitor():
         }
         
         try:
-            subscription_monitor = MqttSubscriptionMonitor(mqtt_config, port=1883)
+            subscription_monitor = MqttSubscriptionMonitor(mqtt_config, port=1883, subscriber=subscriber)
             # 启动监控
             subscription_monitor.start_monitoring()
         except Exception as e:
@@ -28,8 +33,8 @@ def initialize_subscription_monitor():
 
 @router.on_event("startup")
 async def startup_event():
-    """应用启动时初始化MQTT订阅监控器"""
-    initialize_subscription_monitor()
+    """应用启动时初始化MQTT订阅监控器（进程内订阅，$SYS 由 core 从 Broker 转发）"""
+    initialize_subscription_monitor(LoopbackSubscriber(_core.loopback_broker))
 
 @router.get("/mqtt/subscriptions", summary="获取所有订阅信息")
 async def get_all_subscriptions():
@@ -39,9 +44,10 @@ async def get_all_subscriptions():
         raise HTTPException(status_code=400, detail="MQTT订阅监控器未初始化")
     
     try:
-        subscriptions = subscription_monitor.get_all_subscriptions()
+        version, subscriptions = subscription_monitor.get_subscriptions_snapshot()
         return {
             "status": "success",
+            "version": version,
             "data": subscriptions
         }
     except Exception as e:
@@ -72,12 +78,74 @@ async def get_all_clients():
         raise HTTPException(status_code=400, detail="MQTT订阅监控器未初始化")
     
     try:
-        clients = subscription_monitor.get_all_clients()
+        version, clients = subscription_monitor.get_clients_snapshot()
         return {
             "status": "success",
+            "version": version,
             "data": clients
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取客户端信息失败: {str(e)}")
 
+@router.get("/mqtt/receivers", summary="获取会收到指定主题的客户端")
+async def get_topic_receivers(topic: str):
+    """按订阅过滤器（含通配符）匹配，获取会收到该主题消息的客户端"""
+    global subscription_monitor
+    if subscription_monitor is None:
+        raise HTTPException(status_code=400, detail="MQTT订阅监控器未初始化")
+    
+    try:
+        return {
+            "status": "success",
+            "topic": topic,
+            "version": subscription_monitor.version,
+            "receivers": subscription_monitor.get_receivers(topic)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取主题接收者失败: {str(e)}")
+
+@router.get("/mqtt/latest", summary="获取进程内最新记录")
+async def get_latest_messages(topic: str = "nar/#"):
+    """按Topic过滤器（含通配符）获取进程内收到的各Topic最新记录，不经过Broker"""
+    if _core.latest_messages is None:
+        raise HTTPException(status_code=400, detail="进程内最新记录缓存未初始化")
+    try:
+        return {
+            "status": "success",
+            "topic": topic,
+            "data": _core.latest_messages.get(topic)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取最新记录失败: {str(e)}")
+
+@router.get("/mqtt/bridge/stats", summary="获取UDP-MQTT桥接统计")
+async def get_bridge_stats():
+    """获取UDP-MQTT桥接的接收/发布/丢弃计数"""
+    if _core.mqtt_bridge is None:
+        raise HTTPException(status_code=400, detail="UDP-MQTT桥接未初始化")
+    return {
+        "status": "success",
+        "data": _core.mqtt_bridge.get_stats()
+    }
+
+@router.get("/mqtt/downlink/stats", summary="获取下行命令统计")
+async def get_downlink_stats():
+    """获取下行命令的发送/确认/重发/放弃计数"""
+    if _core.udp_downlink is None:
+        raise HTTPException(status_code=400, detail="下行命令通道未初始化")
+    return {
+        "status": "success",
+        "data": _core.udp_downlink.get_stats()
+    }
+
+@router.get("/mqtt/conflation/stats", summary="获取MQTT合并发布统计")
+async def get_conflation_stats():
+    """获取各Topic分组收到与实际发布的消息数"""
+    if _core.mqtt_conflator is None:
+        raise HTTPException(status_code=400, detail="MQTT合并发布未初始化")
+    return {
+        "status": "success",
+        "data": _core.mqtt_conflator.get_stats()
+    }
+
 app.include_router(router)
\ No newline at end of file
@@ -1,36 +1,201 @@
+import time
+_IMPORT_START = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from typing import Dict, Optional
 import os
 import signal
-from network.mqtt.mqtt_broker import start_mosquitto
+from network.mqtt.mqtt_broker import start_mosquitto_async
+from network.mqtt.mqtt_bridge import UdpMqttBridge
+from network.mqtt.mqtt_conflate import MqttConflator, DEFAULT_CONFLATION_RATES
+from network.mqtt.mqtt_loopback import (LoopbackBroker, LoopbackPublisher, LoopbackSubscriber,
+                                        HybridPublisher, LatestMessageStore)
 from network.udp.udp_driver import UdpDriver, UdpManager
-import gradio as gr
+from network.udp.downlink import UdpDownlink, COMMAND_TOPIC
+from network.udp.autoscaler import UdpAutoscaler
+from network.udp.glob import UidGenerator
+from network.udp.configs import UdpConfigs
+from utils.timers.startup import StartupReport
+from utils.codec.device_id import parse_device_id
 from loguru import logger as _logger
 import asyncio
-import redis
 
 
 ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
 PID_LIST = []
+STARTUP_UDP_DRIVERS = 1     # 启动时创建的UDP驱动器数量
+ONNX_MODELS: Dict[str, dict] = {}   # 启动时预加载的ONNX模型 {model_name: InitStruct}
 udp_manager = UdpManager()
+onnx_api = None
+mqtt_bridge: UdpMqttBridge = None
+loopback_broker = LoopbackBroker()      # 进程内消费者（监控、桥接、API）直接在此订阅
+mqtt_conflator: MqttConflator = None
+latest_messages: LatestMessageStore = None     # 进程内最新记录，供 API 读取
+MQTT_CONFLATION_RATES: Dict[str, float] = dict(DEFAULT_CONFLATION_RATES)   # Topic过滤器 -> 刷新频率(Hz)
+MQTT_POOL_SIZE = 4      # 远端发布连接数，按Topic哈希分片
+MQTT_CONFIG = {
+    "endpoint": "127.0.0.1",  # 根据mosquitto.conf配置
+    "client_id": "narcissys_udp_bridge",
+}
+udp_downlink: UdpDownlink = None
+udp_autoscaler: UdpAutoscaler = None
+mqtt_subscribers = []      # 下行命令与 $SYS 转发的订阅器，关闭时统一停止
+startup_report = StartupReport(origin=_IMPORT_START)
+UID_JOURNAL_PATH = os.path.join(ROOT_PATH, "data", UdpConfigs.UID_JOURNAL_FILE)
+CAPTURE_PATH = os.path.join(ROOT_PATH, "data", "captures")   # 原始数据报抓包目录
+
+
+async def _start_broker():
+    """启动 MQTT Broker 并等待端口就绪"""
+    mosquitto_exe = os.path.join(ROOT_PATH, "network", "mosquitto", "mosquitto.exe")
+    config_file = os.path.join(ROOT_PATH, "configs", "mosquitto.conf")
+    broker_status, broker_pid = await start_mosquitto_async(mosquitto_exe, config_file)
+    if broker_pid:
+        PID_LIST.append(broker_pid)
+    _logger.info(f"网络初始化完成，Broker状态: {broker_status}")
+    if not broker_status:
+        raise RuntimeError("MQTT Broker 未就绪")
+
+async def _start_udp_drivers():
+    """并发创建启动时的UDP驱动器"""
+    udp_manager.registry.start()
+    await asyncio.gather(*(create_udp_driver() for _ in range(STARTUP_UDP_DRIVERS)))
+
+async def _start_mqtt_monitor(broker_task: asyncio.Task):
+    """
+    在进程内订阅器上创建订阅监控器与最新记录缓存，
+    Broker 就绪后把 $SYS 主题从远端转入进程内
+    """
+    global latest_messages
+    from .api_service.mqtt_server import initialize_subscription_monitor
+    from network.mqtt.mqtt_monitor import MONITOR_TOPICS
+    latest_messages = LatestMessageStore(LoopbackSubscriber(loopback_broker))
+    initialize_subscription_monitor(LoopbackSubscriber(loopback_broker))
+
+    await broker_task
+    if startup_report.phases.get("broker", {}).get("status") != "ok":
+        raise RuntimeError("MQTT Broker 未就绪，订阅监控器不会收到 $SYS 信息")
+    from network.mqtt.mqtt_sub import MqttSubscriber
+    config = dict(MQTT_CONFIG, client_id="narcissys_sys_relay")
+    relay = await asyncio.to_thread(MqttSubscriber, config)
+    for topic in MONITOR_TOPICS:
+        loopback_broker.relay_from(relay, topic)
+    mqtt_subscribers.append(relay)
+
+async def _start_mqtt_bridge(broker_task: asyncio.Task):
+    """创建本地优先的发布器，并把UDP解码记录经合并层桥接到MQTT"""
+    global mqtt_bridge, mqtt_conflator
+    from .api_service import mqtt_server
+
+    def _has_remote_receivers(topic: str) -> bool:
+        monitor = mqtt_server.subscription_monitor
+        # 监控器尚未收集到订阅信息时保守转发
+        if monitor is None or monitor.version == 0:
+            return True
+        return bool(monitor.get_receivers(topic))
+
+    remote = None
+    await broker_task
+    if startup_report.phases.get("broker", {}).get("status") == "ok":
+        from network.mqtt.mqtt_pool import MqttPublisherPool
+        remote = await asyncio.to_thread(MqttPublisherPool, MQTT_CONFIG, size=MQTT_POOL_SIZE)
+    else:
+        _logger.warning("MQTT Broker 未就绪，解码记录仅在进程内投递")
+
+    publisher = HybridPublisher(LoopbackPublisher(loopback_broker), remote,
+                                remote_filter=_has_remote_receivers)
+    mqtt_conflator = MqttConflator(publisher, rates=MQTT_CONFLATION_RATES)
+    await mqtt_conflator.start()
+    mqtt_bridge = UdpMqttBridge(mqtt_conflator)
+    await mqtt_bridge.start()
+    udp_manager.add_sink(mqtt_bridge.submit)
+
+async def _start_downlink(broker_task: asyncio.Task):
+    """订阅下行命令 Topic（进程内与 Broker），经UDP驱动器发往设备"""
+    global udp_downlink
+    from network.mqtt.mqtt_loopback import LoopbackSubscriber
+    from network.mqtt.mqtt_sub import DISPATCH_LOOP
+    loop = asyncio.get_running_loop()
+    udp_downlink = UdpDownlink(udp_manager, loop=loop)
+    udp_manager.add_sink(udp_downlink.on_record)
+
+    local = LoopbackSubscriber(loopback_broker, loop=loop)
+    local.subscribe(COMMAND_TOPIC, udp_downlink.on_command, dispatch=DISPATCH_LOOP)
+    mqtt_subscribers.append(local)
+
+    await broker_task
+    if startup_report.phases.get("broker", {}).get("status") != "ok":
+        raise RuntimeError("MQTT Broker 未就绪，下行命令仅接受进程内发布")
+    from network.mqtt.mqtt_sub import MqttSubscriber
+    config = dict(MQTT_CONFIG, client_id="narcissys_udp_downlink")
+    remote = await asyncio.to_thread(MqttSubscriber, config, loop=loop)
+    remote.subscribe(COMMAND_TOPIC, udp_downlink.on_command, dispatch=DISPATCH_LOOP, qos=1)
+    mqtt_subscribers.append(remote)
+
+async def _load_onnx_models():
+    """并发加载ONNX模型，未配置模型时不导入 onnxruntime"""
+    global onnx_api
+    if not ONNX_MODELS:
+        return
+    from model_api.onnx_api import OnnxApi
+    onnx_api = OnnxApi()
+    results = await asyncio.gather(*(asyncio.to_thread(onnx_api.add_model, name, config)
+                                     for name, config in ONNX_MODELS.items()))
+    for success, message in results:
+        if not success:
+            _logger.error(message)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    _start_compenents()
     # 应用启动时执行
+    report = startup_report.begin()
+    start = time.perf_counter()
+    _start_compenents()
+    report.record("components", start)
+    # UID 日志需在 UDP 驱动器开始解码前回放
+    start = time.perf_counter()
+    UidGenerator().open_journal(UID_JOURNAL_PATH)
+    report.record("uid_registry", start)
+
     _logger.info("正在初始化网络...")
-    mosquitto_exe = os.path.join(ROOT_PATH, "network", "mosquitto", "mosquitto.exe")
-    config_file = os.path.join(ROOT_PATH, "configs", "mosquitto.conf")
-    broker_status, broker_pid = start_mosquitto(mosquitto_exe, config_file)
-    PID_LIST.append(broker_pid)
-    _logger.info(f"网络初始化完成，Broker状态: {broker_status}")
-    await create_udp_driver()
+    # 互不依赖的组件并发初始化，订阅监控器等待 Broker 就绪
+    broker_task = asyncio.create_task(report.run_phase("broker", _start_broker()))
+    await asyncio.gather(
+        broker_task,
+        report.run_phase("udp_drivers", _start_udp_drivers()),
+        report.run_phase("mqtt_monitor", _start_mqtt_monitor(broker_task)),
+        report.run_phase("mqtt_bridge", _start_mqtt_bridge(broker_task)),
+        report.run_phase("udp_downlink", _start_downlink(broker_task)),
+        report.run_phase("onnx_models", _load_onnx_models()),
+    )
+    report.finish()
+    global udp_autoscaler
+    udp_autoscaler = UdpAutoscaler(udp_manager, downlink=udp_downlink)
+    udp_autoscaler.start()
     yield
     
     _logger.info("正在关闭应用，清理资源...")
-
+    if udp_autoscaler is not None:
+        await udp_autoscaler.stop()
+    await udp_manager.registry.stop()
+    if mqtt_bridge is not None:
+        await mqtt_bridge.stop()
+    if mqtt_conflator is not None:
+        await mqtt_conflator.stop()
+    if latest_messages is not None:
+        latest_messages.stop()
+    from .api_service import mqtt_server
+    if mqtt_server.subscription_monitor is not None:
+        mqtt_server.subscription_monitor.stop_monitoring()
+    for subscriber in mqtt_subscribers:
+        subscriber.stop()
+    mqtt_subscribers.clear()
+    if udp_downlink is not None:
+        udp_downlink.stop()
+    UidGenerator().close()
     
     for pid in PID_LIST:
         try:
@@ -63,6 +228,16 @@ def root():
         "message": "Narcissys System 正常运行", 
     }
 
+@app.get("/system/startup")
+def get_startup_report():
+    """
+    获取启动耗时报告
+    
+    Returns:
+        dict: 各启动阶段的开始时间、耗时与状态
+    """
+    return startup_report.as_dict()
+
 @app.post("/network/udp/drivers")
 async def create_udp_driver():
     """
@@ -140,6 +315,109 @@ async def list_udp_drivers():
         _logger.error(f"获取UDP驱动器列表时出错: {e}")
         raise HTTPException(status_code=500, detail=f"获取驱动器列表失败: {str(e)}")
 
+@app.get("/network/udp/drivers/{driver_id}/quarantine")
+async def get_udp_driver_quarantine(driver_id: str):
+    """
+    获取指定UDP驱动器最近被拒绝的数据包样本
+    
+    Args:
+        driver_id: 驱动器ID
+        
+    Returns:
+        dict: 按原因分类的拒绝计数与样本列表
+    """
+    driver = udp_manager.drivers.get(driver_id)
+    if driver is None:
+        raise HTTPException(status_code=404, detail=f"UDP驱动器 {driver_id} 不存在")
+    return {
+        "stats": driver.validator.get_stats(),
+        "samples": driver.validator.get_quarantine()
+    }
+
+@app.post("/network/udp/drivers/{driver_id}/capture")
+async def start_udp_capture(driver_id: str, name: Optional[str] = None):
+    """
+    开始记录指定UDP驱动器收到的原始数据报
+    
+    Args:
+        driver_id: 驱动器ID
+        name: 抓包文件名，缺省为 {driver_id}_{时间}.ncap，保存在 data/captures 下
+        
+    Returns:
+        dict: 抓包文件路径
+    """
+    driver = udp_manager.drivers.get(driver_id)
+    if driver is None:
+        raise HTTPException(status_code=404, detail=f"UDP驱动器 {driver_id} 不存在")
+    name = os.path.basename(name or f"{driver_id}_{time.strftime('%Y%m%d_%H%M%S')}.ncap")
+    capture = driver.start_capture(os.path.join(CAPTURE_PATH, name))
+    return {"message": f"UDP驱动器 {driver_id} 开始抓包", "path": capture.path}
+
+@app.delete("/network/udp/drivers/{driver_id}/capture")
+async def stop_udp_capture(driver_id: str):
+    """
+    结束指定UDP驱动器的抓包
+    
+    Returns:
+        dict: 抓包文件路径、数据报数量与字节数
+    """
+    driver = udp_manager.drivers.get(driver_id)
+    if driver is None:
+        raise HTTPException(status_code=404, detail=f"UDP驱动器 {driver_id} 不存在")
+    capture = driver.capture
+    stats = driver.stop_capture()
+    if stats is None:
+        raise HTTPException(status_code=400, detail=f"UDP驱动器 {driver_id} 未在抓包")
+    # 文件在写线程中关闭，写完后再返回，返回后即可读取或回放
+    await capture.wait_closed()
+    return stats
+
+@app.get("/network/udp/devices")
+async def list_udp_devices(online: bool = False):
+    """
+    列出设备在线状态
+    
+    Args:
+        online: 为 True 时只返回在线设备
+        
+    Returns:
+        dict: 设备列表（id/状态/距最后上行秒数/地址）与在线数量
+    """
+    registry = udp_manager.registry
+    return {
+        "devices": registry.snapshot(online_only=online),
+        "online": registry.online_count,
+        "total": len(registry)
+    }
+
+@app.get("/network/udp/devices/{device_id}")
+async def get_udp_device(device_id: str):
+    """
+    获取指定设备的在线状态
+    
+    Args:
+        device_id: 设备ID（8位十六进制）
+    """
+    try:
+        device = udp_manager.registry.get(parse_device_id(device_id))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if device is None:
+        raise HTTPException(status_code=404, detail=f"设备 {device_id} 不存在")
+    return device
+
+@app.get("/network/udp/autoscaler")
+async def get_udp_autoscaler():
+    """
+    获取UDP驱动器自动扩缩容状态
+    
+    Returns:
+        dict: 扩容/回收/重定向计数、自动创建的驱动器与最近一次负载采样
+    """
+    if udp_autoscaler is None:
+        raise HTTPException(status_code=503, detail="自动扩缩容未启动")
+    return udp_autoscaler.get_stats()
+
 @app.delete("/network/udp/drivers")
 async def stop_all_udp_drivers():
     """
@@ -1,18 +1,27 @@
 import onnxruntime as rt
 from typing import (Union, List, Final, 
                     Optional, Dict, Any,
-                    TypedDict, Tuple)
+                    TypedDict, Tuple, Set,
+                    AsyncIterable, AsyncIterator, Iterable)
+import asyncio
 import time
+import queue
 import numpy as np
 import threading
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, Future
 """
 ------------------------------------------------------------------------
 # numpy < 2.0.0 2.0.0以上版本兼容老模型一堆问题在这个onnx兼容问题官方解决之前
 暂时维持在numpy2.0.0版本以下，如果onnx模型更新，请自行更新numpy版本
 ------------------------------------------------------------------------
 """
-class InitStruct(TypedDict):
+class _BatchOptions(TypedDict, total=False):
+    """合批配置（可选）"""
+    max_batch_size: int         # 单次推理的最大行数（沿第 0 维），不大于 1 表示不合批
+    max_batch_delay: float      # 首个请求到达后等待凑批的最长时间（毫秒）
+
+class InitStruct(_BatchOptions):
     """初始化结构"""
     model_path: str
     model_info: Union[Dict[str, Any], None]
@@ -51,6 +60,7 @@ class ModelDriver:
     def __init__(self, config: InitStruct):
         self.config = config
         self.session = self._initialize_session()
+        self.output_names = [output.name for output in self.session.get_outputs()]
         self._warmup()
         self.stats = {
             "total_requests": 0,
@@ -111,14 +121,23 @@ class ModelDriver:
         }
         return type_mapping.get(onnx_type.split('(')[0], np.float32)
     
+    def batchable(self) -> bool:
+        """所有输入的第 0 维均为动态维度时才能沿第 0 维合批"""
+        for input_info in self.session.get_inputs():
+            if not input_info.shape:
+                return False
+            dim = input_info.shape[0]
+            if not (dim is None or isinstance(dim, str) or dim <= 0):
+                return False
+        return True
+
     def execute(self, request: RequestStruct) -> ResponseStruct:
         start_time = time.time()
         self.stats['total_requests'] += 1
 
         try: 
             outputs = self.session.run(None, request.input_data)
-            output_names = [output.name for output in self.session.get_outputs()]
-            result_dict = {name: data for name, data in zip(output_names, outputs)}
+            result_dict = {name: data for name, data in zip(self.output_names, outputs)}
             
             self.stats["success_requests"] += 1
             self.stats["last_active"] = time.time()
@@ -149,6 +168,40 @@ class ModelDriver:
                 latency=latency
             )
     
+    def execute_batch(self, requests: List[RequestStruct], rows: List[int]) -> List[ResponseStruct]:
+        """
+        合批推理：各请求的输入沿第 0 维拼接后运行一次，输出按各请求的行数拆分
+        输出不是按行对应的张量或合批运行失败时逐个执行，单个请求的错误不影响同批的其他请求
+        :param rows: 各请求输入的行数
+        """
+        if len(requests) == 1:
+            return [self.execute(requests[0])]
+        start_time = time.time()
+        total = sum(rows)
+        try:
+            input_data = {name: np.concatenate([request.input_data[name] for request in requests], axis=0)
+                          for name in requests[0].input_data}
+            outputs = self.session.run(None, input_data)
+            if not all(isinstance(output, np.ndarray) and output.ndim > 0 and output.shape[0] == total
+                       for output in outputs):
+                raise ValueError("outputs are not batched along axis 0")
+        except Exception:
+            return [self.execute(request) for request in requests]
+
+        offsets = np.cumsum(rows)[:-1]
+        parts = [np.split(output, offsets) for output in outputs]
+        self.stats['total_requests'] += len(requests)
+        self.stats["success_requests"] += len(requests)
+        self.stats["last_active"] = time.time()
+        # 同批请求共享一次推理，延迟均为本次推理耗时
+        latency = (time.time() - start_time) * 1000
+        return [ResponseStruct(
+                    success=True,
+                    result={name: part[index] for name, part in zip(self.output_names, parts)},
+                    request_id=request.request_id,
+                    latency=latency
+                ) for index, request in enumerate(requests)]
+
     def get_model_info(self) -> Dict[str, Any]:
         return {
             "config": dict(self.config),
@@ -165,9 +218,164 @@ class ModelDriver:
             "stats": dict(self.stats)
         }
 
+def _batch_key(input_data: Dict[str, np.ndarray]) -> Tuple[Optional[tuple], int]:
+    """
+    返回 (合批键, 行数)；输入名、dtype 与第 0 维以外的形状都相同的请求才能拼接
+    存在标量输入或各输入行数不一致时合批键为 None，该请求单独执行
+    """
+    key = []
+    rows = None
+    for name in sorted(input_data):
+        value = input_data[name]
+        if not isinstance(value, np.ndarray) or value.ndim == 0:
+            return None, 1
+        if rows is None:
+            rows = value.shape[0]
+        elif value.shape[0] != rows:
+            return None, 1
+        key.append((name, value.dtype.str, value.shape[1:]))
+    if rows is None:
+        return None, 1
+    return tuple(key), rows
+
+
+@dataclass
+class _BatchItem:
+    request: RequestStruct
+    future: Future
+    key: Optional[tuple]
+    rows: int
+
+
+class ModelBatcher:
+    """
+    单个模型的动态合批器
+    合批线程取到首个请求后在 max_batch_delay 内继续收集，行数达到 max_batch_size 时立即发出；
+    收集到的请求按合批键分组，每组拆成不超过 max_batch_size 行的批次提交到线程池执行
+    """
+    def __init__(self,
+                 model_name: str,
+                 model_instance: ModelDriver,
+                 executor: ThreadPoolExecutor,
+                 max_batch_size: int,
+                 max_batch_delay: float):
+        """
+        :param max_batch_size: 单批最大行数
+        :param max_batch_delay: 凑批最长等待（毫秒）
+        """
+        self.model_name = model_name
+        self.model_instance = model_instance
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay / 1000.0
+        self._queue: "queue.SimpleQueue[Optional[_BatchItem]]" = queue.SimpleQueue()
+        self.stats = {"batches": 0, "batched_requests": 0, "max_batch_rows": 0}
+        self._thread = threading.Thread(target=self._collect, name=f"OnnxBatcher-{model_name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: RequestStruct) -> Future:
+        """提交请求，返回结果为 ResponseStruct 的 Future"""
+        future = Future()
+        key, rows = _batch_key(request.input_data)
+        self._queue.put(_BatchItem(request, future, key, rows))
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            rows = item.rows
+            stopping = False
+            deadline = time.monotonic() + self.max_batch_delay
+            while rows < self.max_batch_size:
+                try:
+                    timeout = deadline - time.monotonic()
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+                rows += item.rows
+            self._dispatch(pending)
+            if stopping:
+                return
+
+    def _dispatch(self, pending: List[_BatchItem]) -> None:
+        groups: Dict[Optional[tuple], List[_BatchItem]] = {}
+        for item in pending:
+            if item.key is None:
+                self.executor.submit(self._run, [item])
+            else:
+                groups.setdefault(item.key, []).append(item)
+        for items in groups.values():
+            batch = []
+            rows = 0
+            for item in items:
+                if batch and rows + item.rows > self.max_batch_size:
+                    self.executor.submit(self._run, batch)
+                    batch, rows = [], 0
+                batch.append(item)
+                rows += item.rows
+            self.executor.submit(self._run, batch)
+
+    def _run(self, batch: List[_BatchItem]) -> None:
+        # 调用方已超时取消的请求不再推理
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        rows = [item.rows for item in batch]
+        try:
+            responses = self.model_instance.execute_batch([item.request for item in batch], rows)
+        except Exception as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        self.stats["batches"] += 1
+        self.stats["batched_requests"] += len(batch)
+        self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], sum(rows))
+        for item, response in zip(batch, responses):
+            item.future.set_result(response)
+
+    def stop(self) -> None:
+        """停止收集；已收集的请求仍会被提交执行"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def get_info(self) -> Dict[str, Any]:
+        return {"max_batch_size": self.max_batch_size,
+                "max_batch_delay": self.max_batch_delay * 1000,
+                **self.stats}
+
+
+_STREAM_END = object()
+
+
+async def _await_future(future: Future, timeout: float) -> Any:
+    """在事件循环中等待线程池 Future，超时抛出 asyncio.TimeoutError；Python 3.11 以下使用 wait_for"""
+    if hasattr(asyncio, "timeout"):
+        async with asyncio.timeout(timeout):
+            return await asyncio.wrap_future(future)
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+
+async def _aiter(requests: Union[AsyncIterable[RequestStruct], Iterable[RequestStruct]]) -> AsyncIterator[RequestStruct]:
+    """同时接受同步与异步可迭代对象"""
+    if hasattr(requests, "__aiter__"):
+        async for request in requests:
+            yield request
+    else:
+        for request in requests:
+            yield request
+
+
 class OnnxApi:
     def __init__(self, max_workers=8):
         self.models: Dict[str, ModelDriver] = {}
+        self.batchers: Dict[str, ModelBatcher] = {}
         self.lock = threading.Lock()
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.request_counter = 0
@@ -179,13 +387,30 @@ class OnnxApi:
         with self.lock:
             if model_name in self.models:
                 return False, f"Model {model_name} has been exist"
-            try:
-                instance = ModelDriver(config)
-                self.models[model_name] = instance
-                return True, f"Model {model_name} added successfully"
+        # 模型加载与预热耗时较长，放在锁外以支持多个模型并发加载
+        try:
+            instance = ModelDriver(config)
+        except Exception as e:
+            return False, f"Model load failure: {str(e)}"
 
-            except Exception as e:
-                return False, f"Model load failure: {str(e)}"
+        batcher = None
+        max_batch_size = config.get('max_batch_size', 1)
+        if max_batch_size > 1:
+            if instance.batchable():
+                batcher = ModelBatcher(model_name, instance, self.executor,
+                                       max_batch_size, config.get('max_batch_delay', 2.0))
+            else:
+                print(f"Model {model_name} has a fixed batch dimension, batching disabled")
+
+        with self.lock:
+            if model_name in self.models:
+                if batcher is not None:
+                    batcher.stop()
+                return False, f"Model {model_name} has been exist"
+            self.models[model_name] = instance
+            if batcher is not None:
+                self.batchers[model_name] = batcher
+            return True, f"Model {model_name} added successfully"
     
     def remove_model(self, model_name: str) -> Tuple[bool, str]:
         """移除模型"""
@@ -193,7 +418,10 @@ class OnnxApi:
             if model_name not in self.models:
                 return False, f"Model {model_name} does not exist"
             del self.models[model_name]
-            return True, f"Modle {model_name} has been removed"
+            batcher = self.batchers.pop(model_name, None)
+        if batcher is not None:
+            batcher.stop()
+        return True, f"Modle {model_name} has been removed"
     
     def model_exists(self, model_name: str) -> bool:
         """检查模型是否存在"""
@@ -204,56 +432,144 @@ class OnnxApi:
         """获取模型信息"""
         with self.lock:
             instance = self.models.get(model_name)
-            return instance.get_model_info() if instance else None
+            if not instance:
+                return None
+            info = instance.get_model_info()
+            batcher = self.batchers.get(model_name)
+            info["batching"] = batcher.get_info() if batcher else None
+            return info
         
     def list_models(self) -> List[str]:
         """获取所有模型名称"""
         with self.lock:
             return list(self.models.keys())
     
-    def inference(self, request: RequestStruct) -> ResponseStruct:
-        """执行推理请求"""
+    def _submit(self, request: RequestStruct) -> Tuple[Optional[Future], Optional[ResponseStruct], float]:
+        """
+        提交推理请求
+        返回 (结果为 ResponseStruct 的 Future, 提交失败时的错误响应, 超时秒数)
+        """
         # 检查模型是否存在
         if not self.model_exists(request.model_name):
-            return ResponseStruct(
+            return None, ResponseStruct(
                 success=False,
                 error=f"Model '{request.model_name}' has not been added yet.",
                 request_id=request.request_id
-            )
+            ), 0.0
         
         # 快速获取模型实例引用
         with self.lock:
             model_instance = self.models.get(request.model_name)
+            batcher = self.batchers.get(request.model_name)
         
         if not model_instance:
-            return ResponseStruct(
+            return None, ResponseStruct(
                 success=False,
                 error=f"Model class has not been initialized.",
                 request_id=request.request_id
-            )
-        
-        # 提交到线程池执行
-        future = self.executor.submit(model_instance.execute, request)
+            ), 0.0
         
+        # 配置了合批的模型交给合批器，否则直接提交到线程池执行
+        if batcher is not None:
+            future = batcher.submit(request)
+        else:
+            future = self.executor.submit(model_instance.execute, request)
+        return future, None, model_instance.config.get('time_out', 5000) / 1000.0
+
+    @staticmethod
+    def _timeout_response(request: RequestStruct, timeout_sec: float) -> ResponseStruct:
+        return ResponseStruct(
+            success=False,
+            error="Inference Error",
+            request_id=request.request_id,
+            latency=timeout_sec * 1000
+        )
+
+    def inference(self, request: RequestStruct) -> ResponseStruct:
+        """执行推理请求（阻塞调用线程，事件循环中请使用 ainference）"""
+        future, error, timeout_sec = self._submit(request)
+        if error is not None:
+            return error
         try:
-            
-            timeout_sec = model_instance.config.get('time_out', 5000) / 1000.0
             return future.result(timeout=timeout_sec)
         except TimeoutError:
+            future.cancel()
+            return self._timeout_response(request, timeout_sec)
+        except Exception as e:
             return ResponseStruct(
                 success=False,
-                error="Inference Error",
-                request_id=request.request_id,
-                latency=model_instance.config.get('time_out', 5000)
+                error=f"System error: {str(e)}",
+                request_id=request.request_id
             )
+
+    async def ainference(self, request: RequestStruct) -> ResponseStruct:
+        """
+        异步执行推理请求，等待期间不阻塞事件循环
+        超时或被取消时同时取消线程池中的 Future，尚未开始的推理不再执行
+        """
+        future, error, timeout_sec = self._submit(request)
+        if error is not None:
+            return error
+        try:
+            return await _await_future(future, timeout_sec)
+        except asyncio.TimeoutError:
+            return self._timeout_response(request, timeout_sec)
         except Exception as e:
             return ResponseStruct(
                 success=False,
                 error=f"System error: {str(e)}",
                 request_id=request.request_id
             )
+
+    async def astream(self,
+                      requests: Union[AsyncIterable[RequestStruct], Iterable[RequestStruct]],
+                      max_in_flight: int = 32) -> AsyncIterator[ResponseStruct]:
+        """
+        流式推理：边读取请求边提交，按完成顺序产出响应（与请求顺序无关，用 request_id 对应）
+        已提交但尚未被取走的请求不超过 max_in_flight 个，消费方变慢时暂停读取请求
+        提前结束迭代时取消所有未完成的请求
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(max_in_flight)
+        tasks: Set[asyncio.Task] = set()
+
+        async def run(request: RequestStruct) -> None:
+            results.put_nowait(await self.ainference(request))
+
+        async def feed() -> None:
+            try:
+                async for request in _aiter(requests):
+                    await slots.acquire()
+                    task = asyncio.create_task(run(request))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*tasks)
+                results.put_nowait(_STREAM_END)
+            except Exception as e:
+                results.put_nowait(e)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                item = await results.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            feeder.cancel()
+            for task in list(tasks):
+                task.cancel()
     
     def shutdown(self):
         """关闭服务"""
+        with self.lock:
+            batchers = list(self.batchers.values())
+            self.batchers.clear()
+        for batcher in batchers:
+            batcher.stop()
         self.executor.shutdown()
         print("ONNX Server Shutdown")
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 4096      # 桥接队列上限，满时丢弃新记录
+DEFAULT_MAX_BATCH = 256        # 单批次最大发布数量
+
+# 按解码类型区分 QoS：高频静态值/心跳 QoS 0，流初始化/完成事件与设备上下线 QoS 1
+DEFAULT_QOS_MAP: Dict[str, int] = {
+    'static': 0,
+    'control': 0,
+    'stop': 0,
+    'init': 1,
+    'complete': 1,
+    'state': 1,
+}
+
+# 发布到 MQTT 的记录字段（地址等内部字段不外发）
+_MESSAGE_FIELDS = ('id', 'uid', 'name', 'timestamp', 'data', 'type',
+                   'format', 'size', 'sample_rate', 'bit_depth', 'channels',
+                   'stream_len', 'chunks', 'rout')
+
+
+class UdpMqttBridge:
+    """
+    UDP 解码记录 -> MQTT 发布桥
+    解码流水线通过 submit 非阻塞投递记录，后台任务每个循环周期取空队列，
+    整批交给单线程执行器发布，接收路径不会等待 Broker
+    """
+    def __init__(self,
+                 publisher,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 qos_map: Optional[Dict[str, int]] = None):
+        """
+        :param publisher: 提供 publish_batch((topic, payload, qos)...) 的发布器
+        :param queue_size: 队列上限
+        :param max_batch: 单批次最大发布数量
+        :param qos_map: 解码类型 -> QoS，未列出的类型不发布
+        """
+        self.publisher = publisher
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.qos_map = qos_map if qos_map is not None else dict(DEFAULT_QOS_MAP)
+        self.stats = {
+            "received": 0,
+            "published": 0,
+            "dropped": 0,
+            "batches": 0,
+            "unpublished": 0,   # 本批未直接发布的消息（合并层缓冲或发布失败）
+            "errors": 0,
+        }
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # 单线程保证发布顺序与入队顺序一致
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MqttBridge")
+
+    def submit(self, record: Dict[str, Any], decode_type: str) -> bool:
+        """
+        投递一条解码记录（需在事件循环线程中调用），返回是否入队
+        """
+        qos = self.qos_map.get(decode_type)
+        if qos is None or record is None or not record.get('rout'):
+            return False
+
+        self.stats["received"] += 1
+        if self._queue is None:
+            self.stats["dropped"] += 1
+            return False
+
+        message = {key: record[key] for key in _MESSAGE_FIELDS if key in record}
+        try:
+            self._queue.put_nowait((record['rout'], message, qos))
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+
+    async def start(self):
+        """启动后台发布任务"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run(), name="udp_mqtt_bridge")
+        logger.debug("[MQTT-BRIDGE][START] UDP -> MQTT 桥接已启动")
+
+    async def stop(self):
+        """停止后台任务，尽量发布完剩余记录"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        remaining = self._drain([])
+        if remaining:
+            await self._publish(remaining)
+        self._executor.shutdown(wait=False)
+        logger.debug("[MQTT-BRIDGE][STOP] UDP -> MQTT 桥接已停止")
+
+    def _drain(self, batch: List[Tuple[str, Any, int]]) -> List[Tuple[str, Any, int]]:
+        """取出队列中当前已有的记录，直到批次上限"""
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _publish(self, batch: List[Tuple[str, Any, int]]):
+        loop = asyncio.get_running_loop()
+        try:
+            published = await loop.run_in_executor(self._executor, self.publisher.publish_batch, batch)
+            self.stats["published"] += published
+            self.stats["unpublished"] += len(batch) - published
+        except Exception as e:
+            self.stats["errors"] += len(batch)
+            logger.error(f"[MQTT-BRIDGE][ERROR] 批量发布失败: {e}")
+        self.stats["batches"] += 1
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            await self._publish(self._drain(batch))
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取桥接统计信息"""
+        stats = dict(self.stats)
+        stats["queued"] = self._queue.qsize() if self._queue is not None else 0
+        return stats
@@ -1,41 +1,108 @@
 import subprocess
+import asyncio
 import os
 import sys
 import time
 from loguru import logger as _logger
 
-def start_mosquitto(mos_path: str, config_path: str):
-    
+def _launch(mos_path: str, config_path: str):
+    """ 检查文件并启动 mosquitto 进程 """
     # 检查文件是否存在
     if not os.path.exists(mos_path):
         _logger.error(f"错误: 找不到mosquitto可执行文件: {mos_path}")
-        return False
-        
+        return None
+
     if not os.path.exists(config_path):
         _logger.error(f"错误: 找不到配置文件: {config_path}")
-        return False
-    
+        return None
+
+    # stdout和stderr设置为PIPE以避免阻塞
+    return subprocess.Popen(
+        [mos_path, "-c", config_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+def _launch_failed(process: subprocess.Popen):
+    _logger.error("Mosquitto启动失败")
+    stdout, stderr = process.communicate()
+    _logger.error(f"错误输出: {stderr.decode('utf-8', errors='replace')}")
+    return False, None
+
+def start_mosquitto(mos_path: str, config_path: str):
+
     try:
-        # stdout和stderr设置为PIPE以避免阻塞
-        process = subprocess.Popen(
-            [mos_path, "-c", config_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        
+        process = _launch(mos_path, config_path)
+        if process is None:
+            return False, None
+
         time.sleep(1)
-        
+
         # 检查进程是否仍在运行
         if process.poll() is None:
             _logger.info("Mosquitto MQTT Broker 已成功启动在后台运行")
-            _logger.info("PID:", process.pid)
+            _logger.info(f"PID: {process.pid}")
             return True, process.pid
         else:
-            _logger.error("Mosquitto启动失败")
-            stdout, stderr = process.communicate()
-            _logger.error("错误输出:", stderr.decode('utf-8'))
-            return False
-            
+            return _launch_failed(process)
+
+    except Exception as e:
+        _logger.error(f"启动Mosquitto时发生错误: {e}")
+        return False, None
+
+async def wait_broker_ready(host: str = "127.0.0.1",
+                            port: int = 1883,
+                            timeout: float = 5.0,
+                            interval: float = 0.05) -> bool:
+    """
+    异步探测 broker 端口是否可连接
+    :return: 超时前端口可连接返回 True
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            await writer.wait_closed()
+            return True
+        except OSError:
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+async def start_mosquitto_async(mos_path: str,
+                                config_path: str,
+                                host: str = "127.0.0.1",
+                                port: int = 1883,
+                                timeout: float = 5.0):
+    """
+    启动 mosquitto 并异步等待其就绪，不阻塞事件循环
+    :return: (是否就绪, 进程 PID)
+    """
+    try:
+        if await wait_broker_ready(host, port, timeout=0):
+            _logger.info(f"MQTT Broker 已在 {host}:{port} 运行，跳过启动")
+            return True, None
+
+        process = _launch(mos_path, config_path)
+        if process is None:
+            return False, None
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            if process.poll() is not None:
+                return _launch_failed(process)
+            if await wait_broker_ready(host, port, timeout=0):
+                _logger.info("Mosquitto MQTT Broker 已成功启动在后台运行")
+                _logger.info(f"PID: {process.pid}")
+                return True, process.pid
+            await asyncio.sleep(0.05)
+
+        _logger.error(f"Mosquitto 在 {timeout}s 内未就绪")
+        return False, process.pid
+
     except Exception as e:
         _logger.error(f"启动Mosquitto时发生错误: {e}")
-        return False
\ No newline at end of file
+        return False, None
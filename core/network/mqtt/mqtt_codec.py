@@ -0,0 +1,300 @@
+"""
+------------------------------------------------------------------------
+MQTT 二进制负载格式
+公共头:   magic(2s) 'NC' / version(B) / kind(B)
+RECORD:  id(I) / uid(I) / timestamp(Q) / tag(B) / value / extra_len(H) / extra(JSON)
+BLOB:    id(I) / uid(I) / timestamp(Q) / content(B) / meta_len(H) / meta(JSON) / raw bytes
+CHUNK:   msg_id(I) / index(H) / count(H) / 分片字节（拼接后为一条完整负载）
+uid 为空时写入 0xFFFFFFFF
+------------------------------------------------------------------------
+"""
+
+import base64
+import itertools
+import json
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from utils.codec.device_id import format_device_id, parse_device_id
+
+MAGIC = b'NC'
+VERSION = 1
+DEFAULT_MAX_PAYLOAD = 64 * 1024     # 超出后拆分为多条 CHUNK 消息
+
+KIND_RECORD = 0x01
+KIND_BLOB = 0x02
+KIND_CHUNK = 0x03
+
+TAG_NONE = 0x00
+TAG_F64 = 0x01
+TAG_I32 = 0x02
+TAG_I64 = 0x03
+TAG_STR = 0x04
+TAG_BYTES = 0x05
+TAG_BOOL = 0x06
+TAG_JSON = 0x07
+
+CONTENT_TYPES = {'raw': 0x00, 'img': 0x01, 'aud': 0x02, 'flt': 0x03}
+_CONTENT_NAMES = {code: name for name, code in CONTENT_TYPES.items()}
+
+_NO_UID = 0xFFFFFFFF
+_HEADER = struct.Struct('>2sBB')
+_BASE = struct.Struct('>IIQ')
+_BLOB_HEAD = struct.Struct('>IIQBH')
+_CHUNK_HEAD = struct.Struct('>IHH')
+_TAG = struct.Struct('>B')
+_F64 = struct.Struct('>d')
+_I32 = struct.Struct('>i')
+_I64 = struct.Struct('>q')
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+
+_RECORD_F64 = struct.Struct('>2sBBIIQBdH')
+_NO_EXTRA = _U16.pack(0)
+
+_HEADER_RECORD = _HEADER.pack(MAGIC, VERSION, KIND_RECORD)
+_HEADER_BLOB = _HEADER.pack(MAGIC, VERSION, KIND_BLOB)
+_HEADER_CHUNK = _HEADER.pack(MAGIC, VERSION, KIND_CHUNK)
+
+_BASE_FIELDS = frozenset(('id', 'uid', 'timestamp', 'data', 'rout', 'addr'))
+_msg_ids = itertools.count(1)
+
+
+def json_default(value):
+    """ JSON 无法直接序列化的类型（字节流/集合等）转换 """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode("utf-8")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_id(device_id: Any) -> int:
+    if isinstance(device_id, int):
+        return device_id
+    return parse_device_id(device_id)
+
+
+_decode_id = format_device_id
+
+
+def _encode_extra(record: Dict[str, Any]) -> bytes:
+    extra = {key: value for key, value in record.items()
+             if key not in _BASE_FIELDS and value is not None}
+    if not extra:
+        return _NO_EXTRA
+    raw = json.dumps(extra, separators=(',', ':'), default=json_default).encode('utf-8')
+    return _U16.pack(len(raw)) + raw
+
+
+def _encode_value(value: Any) -> bytes:
+    """ 按类型标签编码数据值 """
+    if value is None:
+        return _TAG.pack(TAG_NONE)
+    if isinstance(value, bool):
+        return _TAG.pack(TAG_BOOL) + _TAG.pack(int(value))
+    if isinstance(value, float):
+        return _TAG.pack(TAG_F64) + _F64.pack(value)
+    if isinstance(value, int):
+        if -0x80000000 <= value <= 0x7FFFFFFF:
+            return _TAG.pack(TAG_I32) + _I32.pack(value)
+        if -0x8000000000000000 <= value <= 0x7FFFFFFFFFFFFFFF:
+            return _TAG.pack(TAG_I64) + _I64.pack(value)
+    if isinstance(value, str):
+        raw = value.encode('utf-8')
+        return _TAG.pack(TAG_STR) + _U32.pack(len(raw)) + raw
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _TAG.pack(TAG_BYTES) + _U32.pack(len(value)) + bytes(value)
+    raw = json.dumps(value, separators=(',', ':'), default=json_default).encode('utf-8')
+    return _TAG.pack(TAG_JSON) + _U32.pack(len(raw)) + raw
+
+
+def _decode_value(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == TAG_NONE:
+        return None, offset
+    if tag == TAG_F64:
+        return _F64.unpack_from(data, offset)[0], offset + 8
+    if tag == TAG_I32:
+        return _I32.unpack_from(data, offset)[0], offset + 4
+    if tag == TAG_I64:
+        return _I64.unpack_from(data, offset)[0], offset + 8
+    if tag == TAG_BOOL:
+        return bool(data[offset]), offset + 1
+    length = _U32.unpack_from(data, offset)[0]
+    offset += 4
+    raw = data[offset:offset + length]
+    if len(raw) != length:
+        raise ValueError("Insufficient data for value field")
+    offset += length
+    if tag == TAG_STR:
+        return raw.decode('utf-8'), offset
+    if tag == TAG_BYTES:
+        return bytes(raw), offset
+    if tag == TAG_JSON:
+        return json.loads(raw), offset
+    raise ValueError(f"Unknown value tag: {tag:#04x}")
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """ 静态值记录编码 """
+    uid = record.get('uid')
+    value = record.get('data')
+    extra = _encode_extra(record)
+    if type(value) is float and extra == _NO_EXTRA:
+        # 高频浮点值快速路径：单次 pack 完成
+        return _RECORD_F64.pack(MAGIC, VERSION, KIND_RECORD,
+                                _encode_id(record['id']),
+                                _NO_UID if uid is None else uid,
+                                record.get('timestamp') or 0,
+                                TAG_F64, value, 0)
+    return b''.join((
+        _HEADER_RECORD,
+        _BASE.pack(_encode_id(record['id']),
+                   _NO_UID if uid is None else uid,
+                   record.get('timestamp') or 0),
+        _encode_value(value),
+        extra,
+    ))
+
+
+def encode_blob(record: Dict[str, Any], data: bytes, content: str = 'raw') -> bytes:
+    """ 图片/音频等原始字节编码，元数据放在小头部中 """
+    uid = record.get('uid')
+    meta = _encode_extra(record)
+    return b''.join((
+        _HEADER_BLOB,
+        _BLOB_HEAD.pack(_encode_id(record['id']),
+                        _NO_UID if uid is None else uid,
+                        record.get('timestamp') or 0,
+                        CONTENT_TYPES.get(content, CONTENT_TYPES['raw']),
+                        _U16.unpack(meta[:2])[0]),
+        meta[2:],
+        bytes(data),
+    ))
+
+
+def encode_payload(payload: Any) -> bytes:
+    """
+    负载编码入口
+    bytes/str 原样发送；data 为字节流的记录走 BLOB，其余记录走 RECORD
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode('utf-8')
+    data = payload.get('data')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return encode_blob(payload, data, payload.get('type', 'raw'))
+    return encode_record(payload)
+
+
+def split_chunks(message: bytes, max_size: int = DEFAULT_MAX_PAYLOAD) -> List[bytes]:
+    """ 超出 max_size 的负载拆分为 CHUNK 消息 """
+    if len(message) <= max_size:
+        return [message]
+    fragment_size = max_size - _HEADER.size - _CHUNK_HEAD.size
+    count = (len(message) + fragment_size - 1) // fragment_size
+    if count > 0xFFFF:
+        raise ValueError("Payload too large to be chunked")
+    msg_id = next(_msg_ids) & 0xFFFFFFFF
+    view = memoryview(message)
+    return [_HEADER_CHUNK + _CHUNK_HEAD.pack(msg_id, index, count)
+            + view[index * fragment_size:(index + 1) * fragment_size].tobytes()
+            for index in range(count)]
+
+
+def is_binary(data: bytes) -> bool:
+    return len(data) >= _HEADER.size and data[:2] == MAGIC
+
+
+def decode_payload(data: bytes, topic: Optional[str] = None) -> Dict[str, Any]:
+    """
+    二进制负载解码
+    CHUNK 分片返回 {'chunk': (msg_id, index, count), 'data': 分片}，需交给 ChunkReassembler
+    """
+    magic, version, kind = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary payload")
+    if version != VERSION:
+        raise ValueError(f"Unsupported payload version: {version}")
+    offset = _HEADER.size
+
+    if kind == KIND_CHUNK:
+        msg_id, index, count = _CHUNK_HEAD.unpack_from(data, offset)
+        return {'chunk': (msg_id, index, count),
+                'data': bytes(data[offset + _CHUNK_HEAD.size:]),
+                'rout': topic}
+
+    if kind == KIND_RECORD:
+        device_id, uid, timestamp = _BASE.unpack_from(data, offset)
+        value, offset = _decode_value(data, offset + _BASE.size)
+        extra_len = _U16.unpack_from(data, offset)[0]
+        offset += 2
+        record = {'id': _decode_id(device_id),
+                  'uid': None if uid == _NO_UID else uid,
+                  'timestamp': timestamp,
+                  'data': value}
+    elif kind == KIND_BLOB:
+        device_id, uid, timestamp, content, extra_len = _BLOB_HEAD.unpack_from(data, offset)
+        offset += _BLOB_HEAD.size
+        record = {'id': _decode_id(device_id),
+                  'uid': None if uid == _NO_UID else uid,
+                  'timestamp': timestamp,
+                  'type': _CONTENT_NAMES.get(content, 'raw'),
+                  'data': bytes(data[offset + extra_len:])}
+    else:
+        raise ValueError(f"Unknown payload kind: {kind:#04x}")
+
+    if extra_len:
+        record.update(json.loads(data[offset:offset + extra_len]))
+    record['rout'] = topic
+    return record
+
+
+class ChunkReassembler:
+    """
+    CHUNK 分片重组
+    按 (topic, msg_id) 收集分片，全部到齐后解码为完整记录；
+    超时或超出上限的未完成消息被丢弃
+    """
+    def __init__(self, timeout: float = 10.0, max_pending: int = 256):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Tuple[str, int], list]" = OrderedDict()
+        self.dropped = 0
+
+    def feed(self, fragment: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """ 输入 decode_payload 返回的分片，消息完整时返回解码后的记录 """
+        msg_id, index, count = fragment['chunk']
+        topic = fragment.get('rout')
+        key = (topic, msg_id)
+        now = time.monotonic()
+        self._expire(now)
+
+        entry = self._pending.get(key)
+        if entry is None:
+            # [截止时间, 已收数量, 分片列表]
+            entry = [now + self.timeout, 0, [None] * count]
+            self._pending[key] = entry
+        parts = entry[2]
+        if index >= len(parts):
+            return None
+        if parts[index] is None:
+            parts[index] = fragment['data']
+            entry[1] += 1
+        if entry[1] < len(parts):
+            return None
+
+        del self._pending[key]
+        return decode_payload(b''.join(parts), topic)
+
+    def _expire(self, now: float) -> None:
+        while self._pending:
+            key, entry = next(iter(self._pending.items()))
+            if entry[0] > now and len(self._pending) <= self.max_pending:
+                break
+            del self._pending[key]
+            self.dropped += 1
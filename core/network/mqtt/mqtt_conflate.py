@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from utils.datastruct.topic_trie import TopicTrie
+
+logger = logging.getLogger(__name__)
+
+# 默认仅合并高频静态值 Topic，其余 Topic（流初始化/完成等）直接透传
+DEFAULT_CONFLATION_RATES: Dict[str, float] = {
+    'nar/device/+/+/static': 20.0,
+}
+
+
+class _ConflationGroup:
+    """ 同一刷新频率的一组 Topic """
+    def __init__(self, topic_filter: str, rate: float):
+        self.topic_filter = topic_filter
+        self.interval = 1.0 / rate
+        self.next_flush = 0.0
+        self.latest: Dict[str, Tuple[Any, int]] = {}
+        self.received = 0
+        self.published = 0
+        self.errors = 0
+
+
+class MqttConflator:
+    """
+    MQTT 合并发布层
+    放在 MqttPublisher 前面，每个 Topic 只保留最新值，
+    调度任务按过滤器配置的频率批量刷新有更新的 Topic
+    """
+    def __init__(self,
+                 publisher,
+                 rates: Optional[Dict[str, float]] = None,
+                 default_rate: Optional[float] = None):
+        """
+        :param publisher: 提供 publish/publish_batch 的下游发布器
+        :param rates: Topic 过滤器（支持 +/#，按配置顺序匹配） -> 刷新频率(Hz)
+        :param default_rate: 未匹配 Topic 的刷新频率，None 表示直接透传
+        """
+        self.publisher = publisher
+        rates = DEFAULT_CONFLATION_RATES if rates is None else rates
+        self._groups: List[_ConflationGroup] = [_ConflationGroup(f, r) for f, r in rates.items()]
+        self._default = _ConflationGroup('#', default_rate) if default_rate else None
+        # 过滤器按配置顺序登记，多个过滤器匹配时取序号最小的分组
+        self._router = TopicTrie()
+        for index, group in enumerate(self._groups):
+            self._router.insert(group.topic_filter, index)
+        self._topic_groups: Dict[str, Optional[_ConflationGroup]] = {}
+        self._lock = threading.Lock()
+        self._passthrough = {"received": 0, "published": 0, "errors": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MqttConflator")
+
+        intervals = [group.interval for group in self._all_groups()]
+        self._tick = min(intervals) if intervals else 0.05
+
+    def _all_groups(self) -> List[_ConflationGroup]:
+        return self._groups + ([self._default] if self._default else [])
+
+    def _group_for(self, topic: str) -> Optional[_ConflationGroup]:
+        """ 查找 Topic 所属分组，结果按 Topic 缓存 """
+        try:
+            return self._topic_groups[topic]
+        except KeyError:
+            pass
+        matched = self._router.match_keys(topic)
+        group = self._groups[min(matched)] if matched else self._default
+        self._topic_groups[topic] = group
+        return group
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False):
+        """ 写入 Topic 最新值，透传 Topic 直接交给下游发布 """
+        group = self._group_for(topic)
+        if group is None:
+            self._passthrough["received"] += 1
+            try:
+                result = self.publisher.publish(topic, payload, qos, retain)
+            except Exception:
+                self._passthrough["errors"] += 1
+                raise
+            self._passthrough["published"] += 1
+            return result
+        with self._lock:
+            group.latest[topic] = (payload, qos)
+            group.received += 1
+        return None
+
+    def publish_batch(self, messages) -> int:
+        """
+        批量写入，单条失败不影响其余消息
+        :return: 本次直接发布到下游的消息数（只写入合并缓冲的消息不计入，刷新时计入分组的 published）
+        """
+        published = 0
+        for topic, payload, qos in messages:
+            try:
+                passthrough = self._group_for(topic) is None
+                self.publish(topic, payload, qos)
+                published += passthrough
+            except Exception as e:
+                logger.error(f"[MQTT-CONFLATE][ERROR] 透传发布失败 {topic}: {e}")
+        return published
+
+    async def start(self):
+        """启动刷新调度任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="mqtt_conflator")
+            logger.debug("[MQTT-CONFLATE][START] MQTT 合并发布已启动")
+
+    async def stop(self):
+        """停止调度任务并刷新剩余最新值"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._flush(time.monotonic(), force=True)
+        self._executor.shutdown(wait=False)
+        logger.debug("[MQTT-CONFLATE][STOP] MQTT 合并发布已停止")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._tick)
+            await self._flush(time.monotonic())
+
+    async def _flush(self, now: float, force: bool = False):
+        batches: List[Tuple[_ConflationGroup, List[Tuple[str, Any, int]]]] = []
+        with self._lock:
+            for group in self._all_groups():
+                if not group.latest or (not force and now < group.next_flush):
+                    continue
+                latest, group.latest = group.latest, {}
+                group.next_flush = now + group.interval
+                batches.append((group, [(topic, payload, qos) for topic, (payload, qos) in latest.items()]))
+        if not batches:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._publish_groups, batches)
+
+    def _publish_groups(self, batches: List[Tuple[_ConflationGroup, List[Tuple[str, Any, int]]]]) -> None:
+        """ 在执行器线程中按分组发布，发布数按下游 publish_batch 的返回值计入分组 """
+        for group, batch in batches:
+            try:
+                published = self.publisher.publish_batch(batch)
+            except Exception as e:
+                logger.error(f"[MQTT-CONFLATE][ERROR] 刷新发布失败: {e}")
+                published = 0
+            with self._lock:
+                group.published += published
+                group.errors += len(batch) - published
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计：各分组收到/发布的消息数与合并比"""
+        groups = {}
+        for group in self._all_groups():
+            groups[group.topic_filter] = {
+                "rate": round(1.0 / group.interval, 3),
+                "received": group.received,
+                "published": group.published,
+                "errors": group.errors,
+                "pending": len(group.latest),
+                "ratio": round(group.received / group.published, 3) if group.published else None,
+            }
+        received = sum(g["received"] for g in groups.values()) + self._passthrough["received"]
+        published = sum(g["published"] for g in groups.values()) + self._passthrough["published"]
+        return {
+            "received": received,
+            "published": published,
+            "ratio": round(received / published, 3) if published else None,
+            "passthrough": dict(self._passthrough),
+            "groups": groups,
+        }
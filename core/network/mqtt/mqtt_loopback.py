@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from utils.codec.device_id import format_device_id
+from utils.datastruct.topic_trie import TopicTrie
+from .mqtt_sub import (Subscription, DISPATCH_INLINE, DISPATCH_LOOP,
+                       ChunkReassembler, decode_message, dispatch, raw_payload)
+from .mqtt_codec import json_default
+
+logger = logging.getLogger(__name__)
+
+
+class LoopbackBroker:
+    """
+    进程内 pub/sub 传输
+    订阅关系保存在 Topic 前缀树中，发布时直接把负载对象的引用交给本地处理函数，
+    不经过序列化、TCP 与 paho 网络线程
+    """
+    def __init__(self, max_workers: int = 4):
+        self.router = TopicTrie()
+        self.max_workers = max_workers
+        self.reassembler = ChunkReassembler()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {"published": 0, "delivered": 0, "errors": 0}
+
+    def _default_decoder(self, topic: str, data: bytes):
+        return decode_message(topic, data, self.reassembler)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="MqttLoopback")
+        return self._executor
+
+    def subscribe(self, topic: str, subscription: Subscription) -> None:
+        with self._lock:
+            self.router.insert(topic, id(subscription), subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self.router.remove(subscription.topic, id(subscription))
+
+    def relay_from(self, subscriber, topic_filter: str, qos: int = 0) -> Subscription:
+        """
+        把远端订阅器收到的消息转入本地投递
+        只用于本进程不会发布的 Topic（$SYS、外部命令等），否则本地发布的消息会经 Broker 再投递一次；
+        负载保持原始字节，由各本地订阅自己的解码函数解码
+        :param subscriber: MqttSubscriber
+        :return: 远端订阅句柄
+        """
+        return subscriber.subscribe(topic_filter, self.publish, decoder=raw_payload, qos=qos)
+
+    def has_subscribers(self, topic: str) -> bool:
+        """是否存在匹配该 Topic 的本地订阅"""
+        with self._lock:
+            return next(self.router.match(topic), None) is not None
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False) -> int:
+        """
+        投递给所有匹配的本地订阅
+        记录对象按引用传递；bytes/str 负载按订阅的解码函数解码后传递
+        :return: 投递的订阅数量
+        """
+        with self._lock:
+            subscriptions: List[Subscription] = [sub for _, sub in self.router.match(topic)]
+        self.stats["published"] += 1
+        if not subscriptions:
+            return 0
+
+        raw = isinstance(payload, (bytes, bytearray, str))
+        # 与 MqttSubscriber 相同，以解码函数本身（而不是 id）去重
+        decoded: Dict[Callable, Any] = {}
+        delivered = 0
+        for subscription in subscriptions:
+            try:
+                message = payload
+                if raw and subscription.decoder is not None:
+                    key = subscription.decoder
+                    if key not in decoded:
+                        data = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+                        decoded[key] = subscription.decoder(topic, data)
+                    message = decoded[key]
+                if message is None or subscription.handler is None:
+                    continue
+                dispatch(subscription, topic, message, self._get_executor)
+                delivered += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"[MQTT-LOOPBACK][ERROR] 本地投递失败: {e}")
+        self.stats["delivered"] += delivered
+        return delivered
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+class LoopbackPublisher:
+    """与 MqttPublisher 接口一致的进程内发布器"""
+    def __init__(self, broker: LoopbackBroker):
+        self.broker = broker
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False):
+        return self.broker.publish(topic, payload, qos, retain)
+
+    def publish_batch(self, messages: Iterable[Tuple[str, Any, int]]) -> int:
+        published = 0
+        for topic, payload, qos in messages:
+            self.broker.publish(topic, payload, qos)
+            published += 1
+        return published
+
+    def publish_data(self, payload: dict):
+        message = payload.copy()
+        message.pop('data', None)
+        self.broker.publish(message["rout"], message)
+
+
+class LoopbackSubscriber:
+    """与 MqttSubscriber 接口一致的进程内订阅器"""
+    def __init__(self,
+                 broker: LoopbackBroker,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.broker = broker
+        self.loop = loop
+        self._subscriptions: Dict[int, Subscription] = {}
+
+    def subscribe(self, topic: str,
+                  on_data_ready=None,
+                  decoder: Optional[Callable[[str, bytes], Any]] = None,
+                  dispatch: str = DISPATCH_INLINE,
+                  loop: Optional[asyncio.AbstractEventLoop] = None,
+                  qos: int = 0) -> Subscription:
+        """参数与 MqttSubscriber.subscribe 相同，decoder 仅用于 bytes/str 负载"""
+        if dispatch == DISPATCH_LOOP and (loop or self.loop) is None:
+            raise ValueError("DISPATCH_LOOP 订阅需要指定事件循环")
+        subscription = Subscription(topic, on_data_ready, decoder or self.broker._default_decoder,
+                                    dispatch, loop or self.loop)
+        self.broker.subscribe(topic, subscription)
+        self._subscriptions[id(subscription)] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.broker.unsubscribe(subscription)
+        self._subscriptions.pop(id(subscription), None)
+
+    def stop(self):
+        for subscription in list(self._subscriptions.values()):
+            self.unsubscribe(subscription)
+
+
+class LatestMessageStore:
+    """
+    进程内最新消息缓存，供 API 直接读取
+    通过 LoopbackSubscriber 订阅，按 Topic 保存最新一条记录的引用，
+    Topic 数超过上限时淘汰最久未更新的 Topic
+    """
+    def __init__(self, subscriber: LoopbackSubscriber, topic_filter: str = "nar/#", max_topics: int = 4096):
+        self.max_topics = max_topics
+        self._latest: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.subscriber = subscriber
+        self.subscription = subscriber.subscribe(topic_filter, self._on_message)
+
+    def _on_message(self, topic: str, payload: Any) -> None:
+        with self._lock:
+            self._latest[topic] = (time.time(), payload)
+            self._latest.move_to_end(topic)
+            while len(self._latest) > self.max_topics:
+                self._latest.popitem(last=False)
+
+    def get(self, topic_filter: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取匹配过滤器（支持 +/#）的各 Topic 最新消息
+        :return: {topic: {"received": Unix 秒, "payload": JSON 可序列化的负载}}
+        """
+        matcher = TopicTrie()
+        matcher.insert(topic_filter, 0)
+        with self._lock:
+            items = [(topic, entry) for topic, entry in self._latest.items()
+                     if matcher.match_keys(topic)]
+        # 负载按引用保存，返回前转换为 JSON 可序列化的副本
+        return {topic: {"received": received,
+                        "payload": json.loads(json.dumps(self._export(payload), default=json_default))}
+                for topic, (received, payload) in items}
+
+    @staticmethod
+    def _export(payload: Any) -> Any:
+        """ 进程内记录的设备 id 为整数，对外与 JSON 订阅端一致使用十六进制字符串 """
+        if isinstance(payload, dict) and isinstance(payload.get('id'), int):
+            return dict(payload, id=format_device_id(payload['id']))
+        return payload
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def stop(self) -> None:
+        self.subscriber.unsubscribe(self.subscription)
+
+
+class HybridPublisher:
+    """
+    本地优先的发布器
+    本地订阅通过 LoopbackBroker 按引用投递，
+    只有存在远端订阅者时才经由 Broker 编码发布
+    """
+    def __init__(self,
+                 local: LoopbackPublisher,
+                 remote=None,
+                 remote_filter: Optional[Callable[[str], bool]] = None):
+        """
+        :param local: 进程内发布器
+        :param remote: 远端发布器（MqttPublisher 等），为空时只做本地投递
+        :param remote_filter: topic -> 是否存在远端订阅者，为空时总是转发远端
+        """
+        self.local = local
+        self.remote = remote
+        self.remote_filter = remote_filter
+        self.stats = {"local": 0, "remote": 0, "skipped": 0}
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False):
+        self.local.publish(topic, payload, qos, retain)
+        self.stats["local"] += 1
+        if self.remote is None:
+            return None
+        if self.remote_filter is not None and not self.remote_filter(topic):
+            self.stats["skipped"] += 1
+            return None
+        self.stats["remote"] += 1
+        return self.remote.publish(topic, payload, qos, retain)
+
+    def publish_batch(self, messages: Iterable[Tuple[str, Any, int]]) -> int:
+        published = 0
+        for topic, payload, qos in messages:
+            try:
+                self.publish(topic, payload, qos)
+                published += 1
+            except Exception as e:
+                logger.error(f"[MQTT-HYBRID][ERROR] 发布失败: {e}")
+        return published
+
+    def publish_data(self, payload: dict):
+        message = payload.copy()
+        message.pop('data', None)
+        self.publish(message["rout"], message)
@@ -1,23 +1,46 @@
 import json
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
 import paho.mqtt.client as paho
 from paho.mqtt.enums import CallbackAPIVersion
 from loguru import logger as _logger
+from utils.datastruct.topic_trie import TopicTrie
+from .mqtt_sub import raw_payload
+
+SYS_SUBSCRIPTIONS_TOPIC = "$SYS/broker/subscriptions/#"
+SYS_CLIENTS_TOPIC = "$SYS/broker/clients/+"
+MONITOR_TOPICS = (SYS_SUBSCRIPTIONS_TOPIC, SYS_CLIENTS_TOPIC)
+
 
 class MqttSubscriptionMonitor:
     """
     MQTT订阅监控器，用于监控和获取broker上的订阅信息
     """
-    def __init__(self, mqtt: dict, port: int = 1883):
+    def __init__(self, mqtt: Optional[dict] = None, port: int = 1883, subscriber=None):
         """
         初始化MQTT订阅监控客户端
         :param mqtt: MQTT配置字典，包含endpoint, client_id, username, password等
         :param port: MQTT Broker端口
+        :param subscriber: 提供 subscribe 的订阅器（LoopbackSubscriber 等），
+                           传入时不建立独立的 Broker 连接，$SYS 消息由该订阅器投递
         """
         self.config = mqtt
-        # 存储订阅信息：{topic: [client_ids]}
-        self.subscription_info = {}
-        # 存储客户端信息：{client_id: [topics]}
-        self.client_subscriptions = {}
+        # 存储订阅信息：{topic: {client_ids}}
+        self.subscription_info: Dict[str, Set[str]] = {}
+        # 存储客户端信息：{client_id: {topics}}
+        self.client_subscriptions: Dict[str, Set[str]] = {}
+        # 订阅过滤器前缀树：用于查询某个 Topic 会投递给哪些客户端
+        self._trie = TopicTrie()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshots: Dict[str, Tuple[int, Any]] = {}
+        self.client = None
+        self.subscriber = subscriber
+        self._subscriptions = []
+        if subscriber is not None:
+            self._subscriptions = [subscriber.subscribe(topic, self.handle_message, decoder=raw_payload)
+                                   for topic in MONITOR_TOPICS]
+            return
         
         self.client = paho.Client(
             callback_api_version=CallbackAPIVersion.VERSION2,
@@ -46,58 +69,52 @@ class MqttSubscriptionMonitor:
         if rc == 0:
             _logger.info("[MQTT-SUB-MONITOR][SUCCESS] 成功连接到MQTT Broker")
             # 订阅系统主题以获取订阅信息（如果broker支持）
-            self.client.subscribe("$SYS/broker/subscriptions/#")
+            self.client.subscribe(SYS_SUBSCRIPTIONS_TOPIC)
             _logger.debug("[MQTT-SUB-MONITOR][INFO] 已订阅订阅信息主题")
             
             # 订阅客户端连接/断开主题
-            self.client.subscribe("$SYS/broker/clients/+")
+            self.client.subscribe(SYS_CLIENTS_TOPIC)
             _logger.debug("[MQTT-SUB-MONITOR][INFO] 已订阅客户端状态主题")
         else:
             _logger.error(f"[MQTT-SUB-MONITOR][ERROR] 连接失败，返回码={rc}")
 
     def _on_message(self, client, userdata, msg):
         """消息回调 - 处理订阅信息"""
+        self.handle_message(msg.topic, msg.payload)
+
+    def handle_message(self, topic: str, payload: bytes) -> None:
+        """处理一条 $SYS 消息（独立连接与外部订阅器共用）"""
         try:
-            _logger.debug(f"[MQTT-SUB-MONITOR][MESSAGE] 收到消息 Topic: {msg.topic}")
+            _logger.debug(f"[MQTT-SUB-MONITOR][MESSAGE] 收到消息 Topic: {topic}")
             
             # 处理订阅相关信息
-            if msg.topic.startswith("$SYS/broker/subscriptions/"):
-                self._handle_subscription_info(msg)
-            elif msg.topic.startswith("$SYS/broker/clients/"):
-                self._handle_client_info(msg)
+            if topic.startswith("$SYS/broker/subscriptions/"):
+                self._handle_subscription_info(topic)
+            elif topic.startswith("$SYS/broker/clients/"):
+                self._handle_client_info(topic, payload)
                 
         except Exception as e:
             _logger.error(f"[MQTT-SUB-MONITOR][ERROR] 处理MQTT消息失败: {e}")
 
-    def _handle_subscription_info(self, msg):
+    def _handle_subscription_info(self, topic: str):
         """处理订阅信息"""
         # 解析订阅主题，格式可能是 $SYS/broker/subscriptions/{client_id}/{topic}
-        topic_parts = msg.topic.split('/')
+        topic_parts = topic.split('/')
         if len(topic_parts) >= 5:
             client_id = topic_parts[3]
             subscribed_topic = '/'.join(topic_parts[4:])
             
-            # 更新订阅信息
-            if subscribed_topic not in self.subscription_info:
-                self.subscription_info[subscribed_topic] = []
-            if client_id not in self.subscription_info[subscribed_topic]:
-                self.subscription_info[subscribed_topic].append(client_id)
-                
-            # 更新客户端订阅信息
-            if client_id not in self.client_subscriptions:
-                self.client_subscriptions[client_id] = []
-            if subscribed_topic not in self.client_subscriptions[client_id]:
-                self.client_subscriptions[client_id].append(subscribed_topic)
+            self._add_subscription(client_id, subscribed_topic)
                 
             _logger.info(f"[MQTT-SUB-MONITOR][SUBSCRIPTION] 客户端 {client_id} 订阅了主题 {subscribed_topic}")
 
-    def _handle_client_info(self, msg):
+    def _handle_client_info(self, topic: str, payload: bytes):
         """处理客户端信息"""
         # 解析客户端主题，格式可能是 $SYS/broker/clients/{client_id}
-        topic_parts = msg.topic.split('/')
+        topic_parts = topic.split('/')
         if len(topic_parts) >= 4:
             client_id = topic_parts[3]
-            status = msg.payload.decode('utf-8')
+            status = payload.decode('utf-8') if isinstance(payload, (bytes, bytearray)) else str(payload)
             
             # 如果客户端断开连接，清理其订阅信息
             if status == "0":  # 0表示断开连接
@@ -106,23 +123,32 @@ class MqttSubscriptionMonitor:
             elif status == "1":  # 1表示连接
                 _logger.info(f"[MQTT-SUB-MONITOR][CLIENT] 客户端 {client_id} 已连接")
 
-    def _remove_client_subscriptions(self, client_id):
-        """移除客户端的订阅信息"""
-        # 从客户端订阅列表中移除
-        if client_id in self.client_subscriptions:
-            del self.client_subscriptions[client_id]
-            
-        # 从主题订阅列表中移除
-        topics_to_remove = []
-        for topic, clients in self.subscription_info.items():
+    def _add_subscription(self, client_id: str, topic: str) -> None:
+        """登记一条订阅关系，同时维护双向索引与过滤器前缀树"""
+        with self._lock:
+            clients = self.subscription_info.setdefault(topic, set())
             if client_id in clients:
-                clients.remove(client_id)
-            if not clients:  # 如果主题没有订阅者了
-                topics_to_remove.append(topic)
-                
-        # 清理没有订阅者的主题
-        for topic in topics_to_remove:
-            del self.subscription_info[topic]
+                return
+            clients.add(client_id)
+            self.client_subscriptions.setdefault(client_id, set()).add(topic)
+            self._trie.insert(topic, client_id)
+            self._version += 1
+
+    def _remove_client_subscriptions(self, client_id):
+        """移除客户端的订阅信息，只遍历该客户端自己的订阅"""
+        with self._lock:
+            topics = self.client_subscriptions.pop(client_id, None)
+            if not topics:
+                return
+            for topic in topics:
+                clients = self.subscription_info.get(topic)
+                if clients is not None:
+                    clients.discard(client_id)
+                    # 清理没有订阅者的主题
+                    if not clients:
+                        del self.subscription_info[topic]
+                self._trie.remove(topic, client_id)
+            self._version += 1
 
     def _on_disconnect(self, client, userdata, rc, properties=None):
         """断开连接回调"""
@@ -132,6 +158,8 @@ class MqttSubscriptionMonitor:
         """
         开始监控订阅信息
         """
+        if self.client is None:
+            return
         self.client.loop_start()
         _logger.info("[MQTT-SUB-MONITOR][START] 开始监控MQTT订阅信息")
 
@@ -139,16 +167,50 @@ class MqttSubscriptionMonitor:
         """
         停止监控订阅信息
         """
+        if self.client is None:
+            for subscription in self._subscriptions:
+                self.subscriber.unsubscribe(subscription)
+            self._subscriptions = []
+            return
         self.client.loop_stop()
         self.client.disconnect()
         _logger.info("[MQTT-SUB-MONITOR][STOP] 停止监控MQTT订阅信息")
         
+    @property
+    def version(self) -> int:
+        """订阅关系版本号，每次变更递增"""
+        return self._version
+
+    def _snapshot(self, name: str, index: Dict[str, Set[str]]) -> Tuple[int, Dict[str, List[str]]]:
+        """按版本缓存的一致性快照，同一版本内复用"""
+        with self._lock:
+            cached = self._snapshots.get(name)
+            if cached is None or cached[0] != self._version:
+                cached = (self._version, {key: sorted(values) for key, values in index.items()})
+                self._snapshots[name] = cached
+            return cached
+
+    def get_subscriptions_snapshot(self) -> Tuple[int, Dict[str, List[str]]]:
+        """
+        获取带版本号的订阅信息快照
+        :return: (version, {topic: [client_ids]})
+        """
+        return self._snapshot("subscriptions", self.subscription_info)
+
+    def get_clients_snapshot(self) -> Tuple[int, Dict[str, List[str]]]:
+        """
+        获取带版本号的客户端订阅快照
+        :return: (version, {client_id: [topics]})
+        """
+        return self._snapshot("clients", self.client_subscriptions)
+
     def get_all_subscriptions(self):
         """
         获取所有订阅信息
         :return: {topic: [client_ids]} 格式的字典
         """
-        return self.subscription_info.copy()
+        _, snapshot = self.get_subscriptions_snapshot()
+        return {topic: list(clients) for topic, clients in snapshot.items()}
         
     def get_client_subscriptions(self, client_id):
         """
@@ -156,11 +218,22 @@ class MqttSubscriptionMonitor:
         :param client_id: 客户端ID
         :return: [topics] 该客户端订阅的主题列表
         """
-        return self.client_subscriptions.get(client_id, []).copy()
+        with self._lock:
+            return sorted(self.client_subscriptions.get(client_id, ()))
         
     def get_all_clients(self):
         """
         获取所有客户端的订阅信息
         :return: {client_id: [topics]} 格式的字典
         """
-        return self.client_subscriptions.copy()
\ No newline at end of file
+        _, snapshot = self.get_clients_snapshot()
+        return {client_id: list(topics) for client_id, topics in snapshot.items()}
+
+    def get_receivers(self, topic: str) -> List[str]:
+        """
+        获取会收到指定 Topic 消息的客户端（按订阅过滤器通配符匹配）
+        :param topic: 具体的 Topic
+        :return: [client_ids]
+        """
+        with self._lock:
+            return sorted(self._trie.match_keys(topic))
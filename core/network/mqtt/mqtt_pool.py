@@ -0,0 +1,79 @@
+import logging
+import zlib
+from typing import Any, Dict, Iterable, List, Tuple
+from .mqtt_pub import MqttPublisher
+from .mqtt_codec import DEFAULT_MAX_PAYLOAD
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4        # 默认连接数
+DEFAULT_INFLIGHT = 256       # 每个连接的在途消息窗口
+
+
+class MqttPublisherPool:
+    """
+    分片 MQTT 发布连接池
+    打开 N 条 Broker 连接，按 Topic 的 CRC32 固定映射到其中一条，
+    同一 Topic 的消息始终走同一连接，保证 Topic 内顺序；
+    每条连接有独立的网络线程与在途消息窗口
+    """
+    def __init__(self,
+                 mqtt: dict,
+                 port: int = 1883,
+                 size: int = DEFAULT_POOL_SIZE,
+                 inflight: int = DEFAULT_INFLIGHT,
+                 codec: str = "binary",
+                 max_payload: int = DEFAULT_MAX_PAYLOAD):
+        """
+        :param mqtt: MQTT 配置字典，client_id 会追加连接序号
+        :param port: MQTT Broker 端口
+        :param size: 连接数
+        :param inflight: 每个连接的在途消息窗口，窗口已满时不阻塞，丢弃并计数
+        :param codec: 记录负载格式，见 MqttPublisher
+        :param max_payload: 单条消息最大字节数
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.publishers: List[MqttPublisher] = []
+        base_id = mqtt.get('client_id', 'mqtt_publisher')
+        for index in range(size):
+            config = dict(mqtt, client_id=f"{base_id}_{index}")
+            self.publishers.append(MqttPublisher(config, port,
+                                                 codec=codec,
+                                                 max_payload=max_payload,
+                                                 inflight=inflight))
+        logger.debug(f"[MQTT-POOL][SUCCESS] MQTT 发布连接池初始化完成，连接数 {size}")
+
+    def shard_of(self, topic: str) -> int:
+        """Topic 对应的连接序号（与进程无关的稳定哈希）"""
+        return zlib.crc32(topic.encode('utf-8')) % self.size
+
+    def _route(self, topic: str) -> MqttPublisher:
+        # 每次直接哈希，不缓存 Topic -> 连接映射，Topic 数量不受限时也不会增长内存
+        return self.publishers[self.shard_of(topic)]
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False):
+        return self._route(topic).publish(topic, payload, qos, retain)
+
+    def publish_batch(self, messages: Iterable[Tuple[str, Any, int]]) -> int:
+        published = 0
+        for topic, payload, qos in messages:
+            try:
+                # 窗口已满时各连接非阻塞丢弃，一个分片拥塞不会拖住其它分片
+                if self._route(topic).publish(topic, payload, qos) is not None:
+                    published += 1
+            except Exception as e:
+                logger.error("[MQTT-POOL][ERROR] MQTT 连接池 发送数据失败: %s" % e)
+        return published
+
+    def publish_data(self, payload: dict):
+        self._route(payload["rout"]).publish_data(payload)
+
+    def get_stats(self) -> List[Dict[str, int]]:
+        """各连接的已发布与窗口满丢弃计数"""
+        return [dict(publisher.stats) for publisher in self.publishers]
+
+    def stop(self):
+        for publisher in self.publishers:
+            publisher.stop()
@@ -1,7 +1,11 @@
 import json
 import logging
+import threading
+from typing import Any, Iterable, Tuple
 import paho.mqtt.client as paho
 from paho.mqtt.enums import CallbackAPIVersion
+from .mqtt_codec import encode_payload, split_chunks, json_default, DEFAULT_MAX_PAYLOAD
+from utils.codec.device_id import format_device_id
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +21,22 @@ def _on_disconnect(client, userdata, flags, rc, properties=None):
 class MqttPublisher:
     def __init__(self,
                  mqtt: dict,
-                 port: 1883):
+                 port: int = 1883,
+                 codec: str = "binary",
+                 max_payload: int = DEFAULT_MAX_PAYLOAD,
+                 inflight: int = 0):
+        """
+        :param mqtt: MQTT 配置字典，包含 endpoint, client_id, username, password 等
+        :param port: MQTT Broker 端口
+        :param codec: 记录负载格式，binary 为紧凑二进制格式，json 兼容旧订阅端
+        :param max_payload: 单条消息最大字节数，超出后分片发布
+        :param inflight: 在途消息窗口大小，0 表示不限制；窗口已满时不等待，直接丢弃并计数
+        """
         self.mqtt = mqtt
+        self.codec = codec
+        self.max_payload = max_payload
+        self._window = threading.BoundedSemaphore(inflight) if inflight > 0 else None
+        self.stats = {"published": 0, "dropped": 0}
         self.client = paho.Client(
             callback_api_version = CallbackAPIVersion.VERSION2,
             client_id=mqtt['client_id'],
@@ -28,23 +46,111 @@ class MqttPublisher:
             logger.debug("[MQTT-BLOCK][INFO] 使用用户名密码进行认证")
             self.client.username_pw_set(mqtt['username'], mqtt['password'])
             
-        self.client.connect(mqtt['endpoint'], port=port)
-        self.client.loop_start()
         self.client.on_connect = _on_connect
         self.client.on_disconnect = _on_disconnect
+        if self._window is not None:
+            # paho 只允许在建立连接前设置在途上限
+            self.client.max_inflight_messages_set(inflight)
+            self.client.on_publish = self._on_publish
+        self.client.connect(mqtt['endpoint'], port=port)
+        self.client.loop_start()
         logger.debug("[MQTT-BLOCK][SUCESS] MQTT 模块 Client 初始化完成")
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        """消息已写出（QoS 0）或已确认（QoS 1/2），释放窗口"""
+        try:
+            self._window.release()
+        except ValueError:
+            pass
+
+    def _reserve(self, count: int) -> bool:
+        """
+        非阻塞地占用 count 个窗口位置（分片消息一次占齐，避免只发出部分分片）
+        窗口不足时归还已占用的位置并计入丢弃，不阻塞调用线程
+        """
+        if self._window is None:
+            return True
+        for acquired in range(count):
+            if not self._window.acquire(blocking=False):
+                for _ in range(acquired):
+                    self._window.release()
+                self.stats["dropped"] += 1
+                return False
+        return True
+
+    def _send(self, topic: str, message, qos: int, retain: bool):
+        """写入 paho 发送队列（调用前已占用窗口位置）"""
+        try:
+            info = self.client.publish(topic, payload=message, qos=qos, retain=retain)
+        except Exception:
+            if self._window is not None:
+                self._window.release()
+            raise
+        # 未进入发送队列的消息不会触发 on_publish，需立即归还窗口
+        if (self._window is not None and info.rc != paho.MQTT_ERR_SUCCESS
+                and (qos == 0 or info.rc == paho.MQTT_ERR_QUEUE_SIZE)):
+            self._window.release()
+        self.stats["published"] += 1
+        return info
     
     def publish_data(self, payload: dict):
         
         message = payload.copy()
-        if 'data' in message:
-            payload.pop('data')
+        message.pop('data', None)
         try:
-            message = json.dumps(message)
-            self.client.publish(message["rout"], payload=message)
+            self.publish(message["rout"], message)
             logger.debug("[MQTT-BLOCK][SUCESS] MQTT 模块 发送数据成功")
 
         except Exception as e:
             logger.error("[MQTT-BLOCK][ERROR] MQTT 模块 发送数据失败: %s" % e)
-        
-    
\ No newline at end of file
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False):
+        """
+        发布单条消息
+        :param topic: 目标 Topic
+        :param payload: bytes/str 原样发送，记录按 codec 编码，超出 max_payload 时分片发布
+        :param qos: MQTT QoS 等级
+        :return: 最后一条消息的 MQTTMessageInfo，在途窗口已满被丢弃时返回 None
+        """
+        if isinstance(payload, (bytes, bytearray, str)):
+            messages = [payload]
+        elif self.codec == "json":
+            if isinstance(payload, dict) and isinstance(payload.get('id'), int):
+                # 设备 id 在进程内为整数，JSON 订阅端沿用十六进制字符串
+                payload = dict(payload, id=format_device_id(payload['id']))
+            messages = [json.dumps(payload, default=json_default)]
+        else:
+            messages = split_chunks(encode_payload(payload), self.max_payload)
+
+        if not self._reserve(len(messages)):
+            return None
+        result = None
+        for index, message in enumerate(messages):
+            try:
+                result = self._send(topic, message, qos, retain)
+            except Exception:
+                # 归还剩余分片占用的窗口位置
+                if self._window is not None:
+                    for _ in range(len(messages) - index - 1):
+                        self._window.release()
+                raise
+        return result
+
+    def publish_batch(self, messages: Iterable[Tuple[str, Any, int]]) -> int:
+        """
+        批量发布消息，单条失败不影响其余消息
+        :param messages: (topic, payload, qos) 序列
+        :return: 成功提交的消息数量（窗口已满丢弃的不计入）
+        """
+        published = 0
+        for topic, payload, qos in messages:
+            try:
+                if self.publish(topic, payload, qos) is not None:
+                    published += 1
+            except Exception as e:
+                logger.error("[MQTT-BLOCK][ERROR] MQTT 模块 发送数据失败: %s" % e)
+        return published
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
@@ -1,17 +1,49 @@
+import asyncio
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 import paho.mqtt.client as paho
 from paho.mqtt.enums import CallbackAPIVersion
+from utils.datastruct.topic_trie import TopicTrie
+from .mqtt_codec import ChunkReassembler, decode_payload, is_binary
 
 logger = logging.getLogger(__name__)
 
+# 处理函数分发方式
+DISPATCH_INLINE = "inline"   # 在 paho 网络线程中直接调用
+DISPATCH_LOOP = "loop"       # 投递到 asyncio 事件循环
+DISPATCH_POOL = "pool"       # 投递到工作线程池
+
+def decode_message(topic: str, data: bytes, reassembler: ChunkReassembler = None):
+    """
+    解码消息负载：二进制格式按 codec 解码（分片交给重组器，未收齐时返回 None），
+    其余按 JSON 解码
+    """
+    if not is_binary(data):
+        return json.loads(data.decode("utf-8"))
+    payload = decode_payload(data, topic)
+    if "chunk" in payload:
+        if reassembler is None:
+            return None
+        return reassembler.feed(payload)
+    return payload
+
+def raw_payload(topic: str, data: bytes) -> bytes:
+    """不解码的解码函数，原样返回负载（用于 $SYS 等非记录格式的 Topic）"""
+    return data
+
 def _on_message(client, userdata, msg):
     """
-    默认的 MQTT 消息回调函数
+    单回调模式的 MQTT 消息回调函数（通过 userdata 传入 on_data_ready）
     """
     try:
         logger.debug(f"[MQTT-SUB][RECV] 收到消息 Topic: {msg.topic}")
-        payload = json.loads(msg.payload.decode("utf-8"))
+        payload = decode_message(msg.topic, msg.payload,
+                                 userdata.get("reassembler") if userdata else None)
+        if payload is None:
+            return
         logger.debug(f"[MQTT-SUB][RECV] Payload: {payload}")
 
         if userdata and "on_data_ready" in userdata:
@@ -20,16 +52,59 @@ def _on_message(client, userdata, msg):
     except Exception as e:
         logger.error(f"[MQTT-SUB][ERROR] 处理 MQTT 消息失败: {e}")
 
+class Subscription:
+    """单个订阅：处理函数、解码函数与分发方式"""
+    __slots__ = ('topic', 'handler', 'decoder', 'dispatch', 'loop')
+
+    def __init__(self,
+                 topic: str,
+                 handler: Callable[[str, Any], Any],
+                 decoder: Optional[Callable[[str, bytes], Any]],
+                 dispatch: str,
+                 loop: Optional[asyncio.AbstractEventLoop]):
+        self.topic = topic
+        self.handler = handler
+        self.decoder = decoder
+        self.dispatch = dispatch
+        self.loop = loop
+
+def dispatch(subscription: Subscription,
+             topic: str,
+             payload: Any,
+             get_executor: Callable[[], ThreadPoolExecutor]) -> None:
+    """按订阅的分发方式调用处理函数"""
+    handler = subscription.handler
+    if subscription.dispatch == DISPATCH_LOOP:
+        if asyncio.iscoroutinefunction(handler):
+            asyncio.run_coroutine_threadsafe(handler(topic, payload), subscription.loop)
+        else:
+            subscription.loop.call_soon_threadsafe(handler, topic, payload)
+    elif subscription.dispatch == DISPATCH_POOL:
+        get_executor().submit(handler, topic, payload)
+    else:
+        handler(topic, payload)
+
 class MqttSubscriber:
     def __init__(self, mqtt: dict,
                  port: int = 1883,
-                 on_message= _on_message):
+                 on_message=None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 max_workers: int = 4):
         """
         初始化 MQTT 订阅客户端
         :param config: MQTT 配置字典，包含 endpoint, client_id, username, password 等
         :param port: MQTT Broker 端口
+        :param on_message: 自定义消息回调，为空时使用 Topic 前缀树路由
+        :param loop: DISPATCH_LOOP 订阅默认投递的事件循环
+        :param max_workers: DISPATCH_POOL 订阅使用的线程池大小
         """
         self.config = mqtt
+        self.reassembler = ChunkReassembler()
+        self.router = TopicTrie()
+        self.loop = loop
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
         self.client = paho.Client(
             callback_api_version=CallbackAPIVersion.VERSION2,
             client_id=mqtt.get("client_id", "mqtt_subscriber"),
@@ -41,6 +116,8 @@ class MqttSubscriber:
             logger.debug("[MQTT-SUB][INFO] 使用用户名密码进行认证")
             self.client.username_pw_set(mqtt["username"], mqtt["password"])
 
+        self.client.on_message = on_message or self._on_message
+
         try:
             self.client.connect(mqtt["endpoint"], port=port)
             self.client.loop_start()
@@ -48,19 +125,84 @@ class MqttSubscriber:
         except Exception as e:
             logger.error(f"[MQTT-SUB][ERROR] MQTT 客户端连接失败: {e}")
 
-        self.client.on_message = on_message
+    def _default_decoder(self, topic: str, data: bytes):
+        return decode_message(topic, data, self.reassembler)
 
-    def subscribe(self, topic: str, on_data_ready=None):
+    def subscribe(self, topic: str,
+                  on_data_ready=None,
+                  decoder: Optional[Callable[[str, bytes], Any]] = None,
+                  dispatch: str = DISPATCH_INLINE,
+                  loop: Optional[asyncio.AbstractEventLoop] = None,
+                  qos: int = 0) -> Subscription:
         """
-        订阅指定 Topic
-        :param topic: 要订阅的 Topic
-        :param on_data_ready: 收到消息后的回调函数
+        订阅指定 Topic，每个订阅独立登记处理函数
+        :param topic: 要订阅的 Topic，支持 +/# 通配符
+        :param on_data_ready: 收到消息后的回调函数 (topic, payload)，可为协程函数
+        :param decoder: 负载解码函数 (topic, bytes) -> payload，为空时使用默认解码
+        :param dispatch: 分发方式 inline/loop/pool
+        :param loop: DISPATCH_LOOP 时投递的事件循环，为空时使用构造时传入的事件循环
+        :param qos: 订阅 QoS
+        :return: 订阅句柄，可用于 unsubscribe
         """
-        userdata = {"on_data_ready": on_data_ready}
-        self.client.user_data_set(userdata)
-        self.client.subscribe(topic)
+        if dispatch == DISPATCH_LOOP and (loop or self.loop) is None:
+            raise ValueError("DISPATCH_LOOP 订阅需要指定事件循环")
+        subscription = Subscription(topic, on_data_ready, decoder or self._default_decoder,
+                                    dispatch, loop or self.loop)
+        with self._lock:
+            first = not self.router.get(topic)
+            self.router.insert(topic, id(subscription), subscription)
+        if first:
+            self.client.subscribe(topic, qos=qos)
         logger.debug(f"[MQTT-SUB][INFO] 已订阅 Topic: {topic}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        取消订阅，Topic 下没有其他处理函数时才向 Broker 取消
+        :param subscription: subscribe 返回的订阅句柄
+        """
+        with self._lock:
+            self.router.remove(subscription.topic, id(subscription))
+            last = not self.router.get(subscription.topic)
+        if last:
+            self.client.unsubscribe(subscription.topic)
+        logger.debug(f"[MQTT-SUB][INFO] 已取消订阅 Topic: {subscription.topic}")
+
+    def _on_message(self, client, userdata, msg):
+        """
+        按 Topic 前缀树路由消息，同一解码函数只解码一次
+        以解码函数本身作为去重键：每次取 self._default_decoder 得到的绑定方法对象不同，
+        但相等且哈希一致，按 id 去重会让共用默认解码的订阅把分片重复喂给重组器
+        """
+        with self._lock:
+            subscriptions: List[Subscription] = [sub for _, sub in self.router.match(msg.topic)]
+        if not subscriptions:
+            return
+
+        decoded: Dict[Callable, Any] = {}
+        for subscription in subscriptions:
+            try:
+                key = subscription.decoder
+                if key not in decoded:
+                    decoded[key] = subscription.decoder(msg.topic, msg.payload)
+                payload = decoded[key]
+                if payload is None or subscription.handler is None:
+                    continue
+                self._dispatch(subscription, msg.topic, payload)
+            except Exception as e:
+                logger.error(f"[MQTT-SUB][ERROR] 处理 MQTT 消息失败: {e}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="MqttSubscriber")
+        return self._executor
+
+    def _dispatch(self, subscription: Subscription, topic: str, payload: Any) -> None:
+        dispatch(subscription, topic, payload, self._get_executor)
 
     def stop(self):
         self.client.loop_stop()
-        self.client.disconnect()
\ No newline at end of file
+        self.client.disconnect()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,183 @@
+import asyncio
+import math
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger as _logger
+from .configs import UdpConfigs
+from .protocol import ResponseType
+
+
+class UdpAutoscaler:
+    """
+    UDP 驱动器自动扩缩容
+    按采样间隔统计每个驱动器的包速率、接收积压与丢包数：
+    任一驱动器饱和时创建新驱动器，并向该驱动器最近活跃的一部分设备下发 RED 重定向包；
+    自动创建的驱动器连续空闲时先把设备重定向到负载最低的驱动器，
+    RED 包全部确认（或放弃重发）或超过 drain_timeout 后再停止并回收端口；
+    驱动器共享缓存，回收不会丢失数据；手动创建的驱动器不会被回收
+    """
+    def __init__(self,
+                 manager,
+                 downlink=None,
+                 interval: float = UdpConfigs.AUTOSCALE_INTERVAL,
+                 max_drivers: int = UdpConfigs.AUTOSCALE_MAX_DRIVERS,
+                 high_rate: float = UdpConfigs.AUTOSCALE_HIGH_RATE,
+                 idle_rate: float = UdpConfigs.AUTOSCALE_IDLE_RATE,
+                 idle_checks: int = UdpConfigs.AUTOSCALE_IDLE_CHECKS,
+                 redirect_window: float = UdpConfigs.AUTOSCALE_REDIRECT_WINDOW,
+                 drain_timeout: float = UdpConfigs.AUTOSCALE_DRAIN_TIMEOUT):
+        """
+        :param manager: UdpManager
+        :param downlink: 发送重定向包的 UdpDownlink，为空时只扩容不重定向
+        :param interval: 采样间隔（秒）
+        :param max_drivers: 驱动器数量上限
+        :param high_rate: 单驱动器饱和包速率（包/秒）
+        :param idle_rate: 单驱动器空闲包速率（包/秒）
+        :param idle_checks: 连续空闲多少次采样后回收
+        :param redirect_window: 只重定向最近多少秒内上行过的设备
+        :param drain_timeout: 回收前等待 RED 确认的最长秒数
+        """
+        self.manager = manager
+        self.downlink = downlink
+        self.interval = interval
+        self.max_drivers = max_drivers
+        self.high_rate = high_rate
+        self.idle_rate = idle_rate
+        self.idle_checks = idle_checks
+        self.redirect_window = redirect_window
+        self.drain_timeout = drain_timeout
+        self.managed: Set[str] = set()      # 自动创建的驱动器
+        # 已重定向设备、等待停止的驱动器 -> (未确认的 RED (设备 id, 时间戳), 截止时刻)
+        self.draining: Dict[str, Tuple[List[Tuple[int, int]], float]] = {}
+        self.loads: Dict[str, Dict[str, float]] = {}
+        self.stats = {"scaled_up": 0, "retired": 0, "redirected": 0}
+        self._samples: Dict[str, Tuple[int, int, float]] = {}
+        self._idle: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="udp_autoscaler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                _logger.error(f"UDP 自动扩缩容检查失败: {e}")
+
+    def sample(self) -> Dict[str, Dict[str, float]]:
+        """采样各驱动器自上次采样以来的包速率与丢包数"""
+        now = asyncio.get_running_loop().time()
+        loads = {}
+        for driver_id, driver in self.manager.drivers.items():
+            received, dropped = driver.received, driver.dropped
+            last = self._samples.get(driver_id)
+            self._samples[driver_id] = (received, dropped, now)
+            if last is None or now <= last[2]:
+                continue
+            loads[driver_id] = {"rate": (received - last[0]) / (now - last[2]),
+                                "dropped": dropped - last[1],
+                                "backlog": driver.backlog()}
+        for driver_id in list(self._samples):
+            if driver_id not in self.manager.drivers:
+                del self._samples[driver_id]
+        self.loads = loads
+        return loads
+
+    def _saturated(self, driver_id: str, load: Dict[str, float]) -> bool:
+        driver = self.manager.drivers[driver_id]
+        return (load["rate"] >= self.high_rate
+                or load["dropped"] > 0
+                or load["backlog"] > driver.queue_size // 2)
+
+    async def check(self) -> None:
+        """一次采样与扩缩容决策，每次最多执行一个扩容或回收动作"""
+        now = asyncio.get_running_loop().time()
+        for driver_id, (redirects, deadline) in list(self.draining.items()):
+            redirects[:] = [key for key in redirects if self.downlink.is_pending(*key)]
+            if redirects and now < deadline:
+                # 仍有设备未确认重定向，继续接收其数据
+                continue
+            del self.draining[driver_id]
+            self.managed.discard(driver_id)
+            self._idle.pop(driver_id, None)
+            if driver_id in self.manager.drivers:
+                await self.manager.stop_driver(driver_id)
+                self.stats["retired"] += 1
+                _logger.info(f"自动回收空闲UDP驱动器 {driver_id}")
+
+        loads = self.sample()
+        saturated = [driver_id for driver_id, load in loads.items() if self._saturated(driver_id, load)]
+        if saturated:
+            if len(self.manager.drivers) < self.max_drivers:
+                await self._scale_up(max(saturated, key=lambda driver_id: loads[driver_id]["rate"]))
+            return
+
+        for driver_id in list(self.managed):
+            load = loads.get(driver_id)
+            if load is None or driver_id in self.draining:
+                continue
+            if load["rate"] <= self.idle_rate and load["backlog"] == 0:
+                self._idle[driver_id] = self._idle.get(driver_id, 0) + 1
+            else:
+                self._idle[driver_id] = 0
+            if self._idle[driver_id] >= self.idle_checks and self._retire(driver_id, loads):
+                return
+
+    async def _scale_up(self, hot_id: str) -> None:
+        driver_id, driver = await self.manager.create_driver()
+        self.managed.add(driver_id)
+        self.stats["scaled_up"] += 1
+        _logger.info(f"UDP驱动器 {hot_id} 饱和，已扩容 {driver_id}（端口 {driver.port}）")
+        # 分走饱和驱动器一半的活跃设备
+        self._redirect(self.manager.drivers[hot_id], driver, share=0.5)
+
+    def _retire(self, driver_id: str, loads: Dict[str, Dict[str, float]]) -> bool:
+        driver = self.manager.drivers[driver_id]
+        others = [other_id for other_id in self.manager.drivers
+                  if other_id != driver_id and other_id not in self.draining]
+        if not others:
+            return False
+        target = min(others, key=lambda other_id: loads.get(other_id, {}).get("rate", 0.0))
+        redirects = self._redirect(driver, self.manager.drivers[target], share=1.0)
+        self.draining[driver_id] = (redirects, asyncio.get_running_loop().time() + self.drain_timeout)
+        return True
+
+    def _recent_devices(self, driver) -> List[int]:
+        now = asyncio.get_running_loop().time()
+        return [device_id for device_id, (_, seen) in driver.device_addrs.items()
+                if now - seen <= self.redirect_window]
+
+    def _redirect(self, source, target, share: float) -> List[Tuple[int, int]]:
+        """
+        向 source 上最近活跃的部分设备下发重定向到 target 端口的 RED 包（需设备确认，超时重发）
+        :return: 已下发的 (设备 id, 时间戳)，用于查询是否已确认
+        """
+        redirects = []
+        if self.downlink is None or target.port is None:
+            return redirects
+        devices = self._recent_devices(source)
+        for device_id in devices[:math.ceil(len(devices) * share)]:
+            try:
+                timestamp = self.downlink.send(device_id, ResponseType.RED, {'port': target.port}, ack=True)
+                redirects.append((device_id, timestamp))
+                self.stats["redirected"] += 1
+            except Exception as e:
+                _logger.error(f"重定向包编码失败: {e}")
+        return redirects
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats,
+                    managed=sorted(self.managed),
+                    draining=sorted(self.draining),
+                    loads=self.loads)
@@ -1,5 +1,7 @@
 import threading
-from typing import Tuple, Union, Any, Optional, ClassVar, Dict
+import zlib
+from typing import Tuple, Union, Any, Optional, ClassVar, Dict, List
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass, field
 from enum import Enum
 import logging
@@ -9,6 +11,7 @@ from abc import ABC, abstractmethod
 from utils.datastruct.chain import ChunkChain
 from loguru import logger as _logger
 from collections import OrderedDict
+from typing import Callable
 
 __all__ = ['StaticBufferStruct',
            'StreamBufferStruct',
@@ -23,6 +26,11 @@ DEFAULT_STATIC_CACHE_RAM_SIZE = UdpConfigs.DEFAULT_STATIC_CACHE_RAM_SIZE
 DEFAULT_STREAM_CACHE_LEN_SIZE = UdpConfigs.DEFAULT_STREAM_CACHE_LEN_SIZE
 DEFAULT_STREAM_CACHE_RAM_SIZE = UdpConfigs.DEFAULT_STREAM_CACHE_RAM_SIZE
 
+# 压缩方式 -> zlib wbits
+_COMPRESSION_WBITS = {'zlib': 15, 'deflate': -15}
+# 初始化包未声明大小时，单个压缩流解压后的上限（不超过流缓存总容量）
+DEFAULT_STREAM_MAX_SIZE = DEFAULT_STREAM_CACHE_RAM_SIZE
+
 # 活跃节点超时配置项目
 DEFAULT_CLEAN_INTERVAL = UdpConfigs.DEFAULT_CLEAN_INTERVAL
 
@@ -30,7 +38,7 @@ DEFAULT_CLEAN_INTERVAL = UdpConfigs.DEFAULT_CLEAN_INTERVAL
 @dataclass(frozen=True)
 class StaticBufferStruct:
     """静态数据缓冲区"""
-    id: hex
+    id: int
     uid: int
     name: str
     addr: Tuple[str, int]
@@ -38,14 +46,14 @@ class StaticBufferStruct:
     data: Any
     rout: str
     dtype: str = "static"
-    def __init__(self):
+    def __post_init__(self):
         _logger.debug(f' {self.uid}(static): 数据块添加成功 ')
 
-@dataclass(frozen=True)
+@dataclass
 class StreamBufferStruct:
     """流式数据缓冲区"""
     addr: Tuple[str, int]
-    id: hex
+    id: int
     uid: int
     name: str
     timestamp: int
@@ -54,22 +62,100 @@ class StreamBufferStruct:
     end_chunk: int = 0xffff
     done: bool = False
     chunks: OrderedDict = field(default_factory=OrderedDict)
-    
+    # 压缩方式（zlib/deflate），为空表示未压缩
+    compression: Optional[str] = None
+    # 初始化包声明的数据大小，压缩流解压后超出即判定失败，为空或非正数时使用 DEFAULT_STREAM_MAX_SIZE
+    max_size: Optional[int] = None
+    # 解压失败或超出声明大小，失败的流不再接收分片
+    failed: bool = False
+    # _offsets[i] 为第 i 个 chunk 的起始字节偏移，末尾额外保存总长度
+    _offsets: List[int] = field(default_factory=lambda: [0], repr=False)
+    _iter_index: int = field(default=0, repr=False)
+    _decompressor: Any = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.compression is not None:
+            wbits = _COMPRESSION_WBITS.get(self.compression)
+            if wbits is None:
+                raise ValueError(f"Unsupported stream compression: {self.compression}")
+            self._decompressor = zlib.decompressobj(wbits)
+        if self.max_size is None or self.max_size <= 0:
+            self.max_size = DEFAULT_STREAM_MAX_SIZE
+
+    def _fail(self, reason: str) -> bool:
+        """ 标记流失败并释放已接收的数据 """
+        self.failed = True
+        self.chunks.clear()
+        self._offsets = [0]
+        self._decompressor = None
+        _logger.warning(f' {self.uid}(stream): {reason}，流已丢弃 ')
+        return False
+
     def add_chunk(self, chunk: bytes, chunk_id: int) -> bool:
         """
         将缓存数据添加到有序字典中
+        压缩流在到达时增量解压，chunks 中保存的是解压后的数据；
+        解压输出以声明大小为上限，超出或数据损坏时整条流失败
         返回值表示是否成功添加
         """
+        if self.failed:
+            return False
         if chunk_id == self.current_chunk:
+            decompressor = self._decompressor
+            if decompressor is not None:
+                remaining = self.max_size - self._offsets[-1]
+                try:
+                    # 最多多解出 1 字节用于判断是否超出，max_length 为 0 表示不限制
+                    chunk = decompressor.decompress(chunk, remaining + 1)
+                except (zlib.error, ValueError) as e:
+                    return self._fail(f"数据块 {chunk_id} 解压失败: {e}")
+                if len(chunk) > remaining:
+                    return self._fail(f"解压后超出声明大小 {self.max_size} 字节")
             self.chunks[chunk_id] = chunk
+            self._offsets.append(self._offsets[-1] + len(chunk))
             self.current_chunk += 0x0001
-            self.done = self.current_chunk >= self.end_chunk
+            # 压缩流读到结束标记即视为接收完成
+            self.done = (self.current_chunk >= self.end_chunk
+                         or (decompressor is not None and decompressor.eof))
             _logger.debug(f' {self.uid}(stream): 数据块 {chunk_id} 添加成功 ')
             return True
         return False
     def get_chunk(self, chunk_id: int) -> Optional[bytes]:
         """随机访问特定chunk"""
         return self.chunks.get(chunk_id)
+
+    def get_chunk_range(self, start: int, end: Optional[int] = None) -> List[bytes]:
+        """
+        读取 [start, end) 区间内的 chunk
+        chunk 按序号连续写入，直接按序号取值，代价与区间长度成正比
+        """
+        count = len(self.chunks)
+        end = count if end is None else min(end, count)
+        start = max(start, 0)
+        return [self.chunks[chunk_id] for chunk_id in range(start, end)]
+
+    def get_byte_range(self, start: int, end: Optional[int] = None) -> bytes:
+        """
+        读取 [start, end) 字节区间
+        通过 chunk 起始偏移表二分定位首尾 chunk，只拼接命中的部分
+        """
+        total = self._offsets[-1]
+        end = total if end is None else min(end, total)
+        start = max(start, 0)
+        if start >= end:
+            return b""
+
+        first = bisect_right(self._offsets, start) - 1
+        last = bisect_left(self._offsets, end) - 1
+        head = start - self._offsets[first]
+        if first == last:
+            return bytes(self.chunks[first][head:head + end - start])
+
+        parts = [self.chunks[first][head:]]
+        parts.extend(self.chunks[chunk_id] for chunk_id in range(first + 1, last))
+        parts.append(self.chunks[last][:end - self._offsets[last]])
+        return b"".join(parts)
+
     @property
     def get_full_data(self) -> bytes:
         """按顺序拼接所有的数据"""
@@ -96,12 +182,8 @@ class StreamBufferStruct:
         """
         迭代获取数据，每次调用返回下一个chunk
         """
-        if not hasattr(self, '_iter_index'):
-            self._iter_index = 0
-            
         if self._iter_index < len(self.chunks):
-            chunk_key = list(self.chunks.keys())[self._iter_index]
-            chunk_data = self.chunks[chunk_key]
+            chunk_data = self.chunks[self._iter_index]
             self._iter_index += 1
             return chunk_data
         else:
@@ -117,12 +199,12 @@ class StreamBufferStruct:
 
     def __len__(self) -> int:
         """返回所有chunks的总byte"""
-        return sum(len(chunk) for chunk in self.chunks.values())
+        return self._offsets[-1]
     
 @dataclass(frozen=True)
 class FltStruct:
     """ 流式文本数据结构 """
-    id: hex
+    id: int
     uid: int
     addr: Tuple[str, int]
     name: str
@@ -138,7 +220,7 @@ class FltStruct:
 @dataclass(frozen=True)
 class AudStruct:
     """ 音频数据结构 """
-    id: hex
+    id: int
     uid: int
     addr: Tuple[str, int]
     name: str
@@ -156,7 +238,7 @@ class AudStruct:
 @dataclass(frozen=True)
 class ImgStruct:
     """ 图片数据结构 """
-    id: hex
+    id: int
     uid: int
     addr: Tuple[str, int]
     name: str
@@ -168,15 +250,54 @@ class ImgStruct:
     datas: StreamBufferStruct
     dtype: str = "img"
     
+class _EvictLRUCache(LRUCache):
+    """淘汰时回调通知的 LRU 缓存"""
+    def __init__(self, maxsize, on_evict: Optional[Callable[[Any, Any], None]] = None):
+        super().__init__(maxsize=maxsize)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+        return key, value
+
+
 class BaseCache(ABC):
     """缓存方法基类"""
     def __init__(self,
                  max_len: int,
-                 max_ram: int):
-        self._cache = LRUCache(maxsize=max_len, getsizeof=self._getsizeof)
+                 max_ram: int,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None):
+        self._on_evict = on_evict
+        # 条目数由 LRUCache 按 max_len 限制，字节数由 _current_ram/_max_ram 单独统计
+        self._cache = _EvictLRUCache(maxsize=max_len, on_evict=self._evicted)
+        # 各条目写入时记录的字节数，淘汰与删除时按记录值归还
+        self._sizes: Dict[Any, int] = {}
         self._current_ram = 0
         self._lock = threading.Lock()
         self._max_ram = max_ram
+
+    def _evicted(self, key: Any, value: Any) -> None:
+        """ LRU 淘汰回调：归还字节数并通知外部 """
+        self._current_ram -= self._sizes.pop(key, 0)
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def _put(self, key: Any, item: Any, size: int) -> bool:
+        """
+        写入条目并维护字节数（调用方持有锁）
+        超出 max_ram 时从最久未使用的条目开始淘汰，单个条目超过 max_ram 时拒绝写入
+        """
+        if size > self._max_ram:
+            return False
+        while self._current_ram - self._sizes.get(key, 0) + size > self._max_ram and self._cache:
+            self._cache.popitem()
+        # 条目数已满时 LRUCache 在写入时自行淘汰，经 _evicted 归还字节数
+        self._cache[key] = item
+        self._current_ram += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        return True
     @abstractmethod
     def _getsizeof(self, item: Any) -> int:
         """获取缓存对象大小（子类必须实现此方法）"""
@@ -194,40 +315,46 @@ class BaseCache(ABC):
     def remove_by_id(self, target_id: hex) -> None:
         """删除指定ID的缓存项"""
         with self._lock:
-            if target_id in self._cache:
-                removed = self._cache.pop(target_id)
-                self._current_ram -= self._getsizeof(removed)
+            self._remove(target_id)
+
+    def _remove(self, target_id: Any) -> None:
+        """ 删除缓存项并归还字节数（调用方持有锁） """
+        if target_id in self._cache:
+            removed = self._cache.pop(target_id)
+            self._current_ram -= self._sizes.pop(target_id, 0)
+            if self._on_evict is not None:
+                self._on_evict(target_id, removed)
     
     
 class StaticCache(BaseCache):
     """静态数据缓存"""
     def __init__(self, 
                  max_len: int = DEFAULT_STATIC_CACHE_LEN_SIZE,
-                 max_ram: int = DEFAULT_STATIC_CACHE_RAM_SIZE):
-        super().__init__(max_len, max_ram)
+                 max_ram: int = DEFAULT_STATIC_CACHE_RAM_SIZE,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None):
+        super().__init__(max_len, max_ram, on_evict)
 
     def _getsizeof(self, item: 'StaticBufferStruct') -> int:
-        return len(item.data)
-    def _update_cache(self, target_uid: int, old_item: Any, new_item: Any) -> None:
-        """ 更新缓存并调整内存使用量 """
-        old_size = self._getsizeof(old_item) if old_item else 0
-        new_size = self._getsizeof(new_item)
-
-        size_diff = new_size - old_size
-
-        while self._current_ram + size_diff > self._max_ram and self._cache:
-            _, removed = self._cache.popitem()
-            self._current_ram -= self._getsizeof(removed)
-
-        if self._current_ram + size_diff <= self._max_ram:
-            self._cache[target_uid] = new_item
-            self._current_ram += size_diff
-
-    def add(self, buffer: 'StaticBufferStruct') -> None:
+        data = item.data
+        if isinstance(data, (bytes, bytearray, str)):
+            return len(data)
+        # 数值按 8 字节计
+        return 8
+    def add(self, buffer: 'StaticBufferStruct') -> bool:
+        """ 写入静态数据，返回是否写入成功 """
         with self._lock:
-            current_buffer = self._cache.get(buffer.id)
             _logger.info(f' {buffer.uid} 已被添加入缓存 ')
-            self._update_cache(buffer.uid, current_buffer, buffer)
+            return self._put(buffer.uid, buffer, self._getsizeof(buffer))
+
+    def add_many(self, buffers: List['StaticBufferStruct']) -> List['StaticBufferStruct']:
+        """ 批量写入（一次加锁），返回写入成功的缓冲 """
+        added = []
+        with self._lock:
+            for buffer in buffers:
+                if self._put(buffer.uid, buffer, self._getsizeof(buffer)):
+                    added.append(buffer)
+        _logger.info(f' {len(added)}/{len(buffers)} 条静态数据已批量添加入缓存 ')
+        return added
     def get_cache(self, uid: int):
         with self._lock:
             if uid not in self._cache:
@@ -244,40 +371,48 @@ class StreamCache(BaseCache):
     """流数据缓存"""
     def __init__(self, 
                  max_len: int = DEFAULT_STREAM_CACHE_LEN_SIZE,
-                 max_ram: int = DEFAULT_STREAM_CACHE_RAM_SIZE):
-        super().__init__(max_len, max_ram)
+                 max_ram: int = DEFAULT_STREAM_CACHE_RAM_SIZE,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None):
+        super().__init__(max_len, max_ram, on_evict)
 
     def _getsizeof(self, item: 'StreamBufferStruct') -> int:
         return len(item.datas)
 
     def _update_cache(self, target_uid: int, old_item: Any, new_item: Any) -> None:
         """ 更新缓存并调整内存使用量 """
-        old_size = self._getsizeof(old_item) if old_item else 0
-        new_size = self._getsizeof(new_item)
-
-        size_diff = new_size - old_size
-
-        while self._current_ram + size_diff > self._max_ram and self._cache:
-            _, removed = self._cache.popitem()
-            self._current_ram -= self._getsizeof(removed)
+        if isinstance(new_item, StreamBufferStruct) and new_item.chunks is not None:
+            current = new_item.chunks
+            while current.next:
+                current = current.next
 
-        if self._current_ram + size_diff <= self._max_ram:
+            if old_item and isinstance(old_item, StreamBufferStruct) and old_item.chunks is not None:
+                current.next = old_item.chunks
 
-            if isinstance(new_item, StreamBufferStruct) and new_item.chunks is not None:
-                current = new_item.chunks
-                while current.next:
-                    current = current.next
-                
-                if old_item and isinstance(old_item, StreamBufferStruct) and old_item.chunks is not None:
-                    current.next = old_item.chunks
-            
-            self._cache[target_uid] = new_item
-            self._current_ram += size_diff
+        self._put(target_uid, new_item, self._getsizeof(new_item))
     def init_stream(self, buffer: FltStruct | AudStruct | ImgStruct ) -> None:
         with self._lock:
-            self._cache[buffer.uid] = buffer
+            self._put(buffer.uid, buffer, self._getsizeof(buffer))
             _logger.info(f' {buffer.uid} 已在缓存中被初始化 ')
 
+    def add_chunk(self, buffer: FltStruct | AudStruct | ImgStruct, chunk: bytes, chunk_id: int) -> bool:
+        """
+        写入流分片，并按解压后的大小更新字节统计
+        流失败或单条流超出缓存容量时移出缓存（淘汰回调同步下线）
+        返回值表示是否成功添加
+        """
+        added = buffer.datas.add_chunk(chunk=chunk, chunk_id=chunk_id)
+        with self._lock:
+            if self._cache.get(buffer.uid) is not buffer:
+                # 写入期间已被淘汰或重新初始化
+                return added
+            if buffer.datas.failed:
+                self._remove(buffer.uid)
+            elif added and not self._put(buffer.uid, buffer, self._getsizeof(buffer)):
+                _logger.warning(f' {buffer.uid}(stream): 超出流缓存容量，流已丢弃 ')
+                self._remove(buffer.uid)
+                return False
+        return added
+
     def add(self, buffer: 'StreamBufferStruct') -> None:
         with self._lock:
             current_buffer = self._cache.get(buffer.uid).datas
@@ -0,0 +1,144 @@
+"""
+------------------------------------------------------------------------
+原始数据报抓包格式
+文件头:  magic(4s) 'NCAP' / version(B)
+记录:    到达时间(d, Unix 秒) / 地址长度(B, 4 或 16) / 端口(H) / 数据长度(H) / 地址 / 数据
+------------------------------------------------------------------------
+"""
+
+import asyncio
+import os
+import socket
+import struct
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+from loguru import logger as _logger
+
+MAGIC = b'NCAP'
+VERSION = 1
+DEFAULT_FLUSH_BYTES = 256 * 1024    # 缓冲达到该大小时交给写线程
+DEFAULT_FLUSH_INTERVAL = 1.0        # 缓冲最长停留秒数
+
+_FILE_HEAD = struct.Struct('>4sB')
+_RECORD = struct.Struct('>dBHH')
+
+
+def _pack_addr(ip: str) -> bytes:
+    try:
+        return socket.inet_pton(socket.AF_INET, ip)
+    except OSError:
+        return socket.inet_pton(socket.AF_INET6, ip)
+
+
+class DatagramCapture:
+    """
+    原始数据报抓包
+    record 在事件循环线程中把记录追加到内存缓冲区，缓冲区满或停留超过 flush_interval 时
+    整块交给单线程执行器写盘，接收路径与关闭都不做文件 I/O
+    """
+    def __init__(self,
+                 path: str,
+                 flush_bytes: int = DEFAULT_FLUSH_BYTES,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        :param path: 抓包文件路径，已存在时追加
+        :param flush_bytes: 缓冲达到该字节数时写盘
+        :param flush_interval: 缓冲最长停留秒数
+        :param loop: record 所在的事件循环
+        """
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.loop = loop or asyncio.get_event_loop()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab')
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="UdpCapture")
+        self._buffer = bytearray(_FILE_HEAD.pack(MAGIC, VERSION) if new_file else b'')
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._addr_cache: dict = {}
+        self._closed: Optional[Future] = None
+        self.records = 0
+        self.bytes = 0
+
+    def record(self, data: bytes, addr: Tuple[str, int], arrival: Optional[float] = None) -> None:
+        """
+        追加一条数据报
+        :param arrival: 到达时刻（Unix 秒），为空时取调用时刻（驱动器在 datagram_received 中调用）
+        """
+        ip = addr[0]
+        packed = self._addr_cache.get(ip)
+        if packed is None:
+            packed = self._addr_cache[ip] = _pack_addr(ip)
+        buffer = self._buffer
+        buffer += _RECORD.pack(time.time() if arrival is None else arrival,
+                               len(packed), addr[1], len(data))
+        buffer += packed
+        buffer += data
+        self.records += 1
+        if len(buffer) >= self.flush_bytes:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> None:
+        """把当前缓冲区交给写线程"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buffer:
+            return
+        chunk, self._buffer = self._buffer, bytearray()
+        self.bytes += len(chunk)
+        self._executor.submit(self._write, chunk)
+
+    def _write(self, chunk: bytearray) -> None:
+        try:
+            self._file.write(chunk)
+            self._file.flush()
+        except Exception as e:
+            _logger.error(f"抓包写入失败 {self.path}: {e}")
+
+    def close(self) -> Future:
+        """
+        写出剩余缓冲并关闭文件
+        写盘与关闭文件都排在写线程中，不阻塞事件循环；返回文件关闭完成的 Future
+        """
+        if self._closed is None:
+            self.flush()
+            self._closed = self._executor.submit(self._file.close)
+            self._executor.shutdown(wait=False)
+        return self._closed
+
+    async def wait_closed(self) -> None:
+        """等待剩余缓冲写盘并关闭文件"""
+        await asyncio.wrap_future(self.close())
+
+    def get_stats(self):
+        return {"path": self.path, "records": self.records, "bytes": self.bytes + len(self._buffer)}
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, Tuple[str, int], bytes]]:
+    """按顺序读取抓包文件，产出 (到达时间, (ip, port), 数据)；忽略不完整的尾部记录"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _FILE_HEAD.size:
+        return
+    magic, version = _FILE_HEAD.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported capture file: {path}")
+    offset = _FILE_HEAD.size
+    head = _RECORD.size
+    end = len(data)
+    view = memoryview(data)
+    while offset + head <= end:
+        arrival, addr_len, port, length = _RECORD.unpack_from(data, offset)
+        start = offset + head
+        if start + addr_len + length > end:
+            break
+        family = socket.AF_INET if addr_len == 4 else socket.AF_INET6
+        ip = socket.inet_ntop(family, view[start:start + addr_len])
+        yield arrival, (ip, port), bytes(view[start + addr_len:start + addr_len + length])
+        offset = start + addr_len + length
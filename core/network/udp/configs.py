@@ -14,6 +14,10 @@ class UdpConfigs:
     BUFFER_SIZE: Final[int] = 1024                        # socket缓冲区大小
     MAX_WORKERS: Final[int] = 10                          # 并行数据处理线程上限
     QUEUE_SIZE: Final[int] = 100                          # 数据队列大小
+    QUARANTINE_SIZE: Final[int] = 64                      # 不合格数据包样本保留数量
+    CONTROL_REPLY_INTERVAL: Final[float] = 1.0            # 同一设备 FIN/HEA 回复的最小间隔（秒）
+    MAX_DEVICES: Final[int] = 65536                       # 设备状态/地址/回复限流记录的数量上限
+    UID_JOURNAL_FILE: Final[str] = 'uid_journal.bin'      # UID 注册表追加日志文件名
 
     DEFAULT_STATIC_CACHE_LEN_SIZE: Final[int] = 50                # 默认静态缓存长度
     DEFAULT_STATIC_CACHE_RAM_SIZE: Final[int] = 4 * 1024 * 1024   # 默认静态缓存大小
@@ -22,6 +26,14 @@ class UdpConfigs:
 
     DEFAULT_CLEAN_INTERVAL: Final[int] = 5      # 默认清理间隔
     DEFAULT_NODE_TIMEOUT: Final[int] = 30       # 默认节点超时时间
+
+    AUTOSCALE_INTERVAL: Final[float] = 2.0      # 自动扩缩容采样间隔（秒）
+    AUTOSCALE_MAX_DRIVERS: Final[int] = 8       # 驱动器数量上限
+    AUTOSCALE_HIGH_RATE: Final[float] = 2000.0  # 单驱动器饱和包速率（包/秒）
+    AUTOSCALE_IDLE_RATE: Final[float] = 50.0    # 单驱动器空闲包速率（包/秒）
+    AUTOSCALE_IDLE_CHECKS: Final[int] = 15      # 连续空闲多少次采样后回收
+    AUTOSCALE_REDIRECT_WINDOW: Final[float] = 30.0  # 重定向最近多少秒内上行过的设备
+    AUTOSCALE_DRAIN_TIMEOUT: Final[float] = 5.0     # 回收前等待 RED 确认的最长秒数
     
 
 
@@ -0,0 +1,115 @@
+import struct
+import time
+from collections import deque, OrderedDict
+from typing import Any, Callable, Dict, Tuple
+from loguru import logger as _logger
+from .configs import UdpConfigs
+from .protocol import ResponseType, RequestType, DefaultProtocolHeader
+
+CONTROL_TYPES = frozenset(("control", "stop"))     # 在事件循环内直接处理的解码类型
+LATENCY_SAMPLES = 1024                              # 回复耗时保留的样本数
+
+
+class ControlReplier:
+    """
+    控制面快速回复
+    FIN/HEA 包在事件循环内解码后立即回复 FindResponse/HeartBeatResponse，不经过解码线程池；
+    回复包在构造时预编码为模板，发送前只原地改写设备 id 与时间戳（原样带回请求时间戳）；
+    同一设备的同一类请求在 min_interval 秒内只回复一次（FIN 与 HEA 分别限流）；
+    限流记录按时间顺序保存，超过 min_interval 的记录随回复清理，总数不超过 max_entries；
+    记录从收到请求到回复写出的耗时
+    """
+    _PATCH = struct.Struct('>IHI')      # id/时间戳高16位/时间戳低32位
+
+    def __init__(self,
+                 min_interval: float = UdpConfigs.CONTROL_REPLY_INTERVAL,
+                 max_entries: int = UdpConfigs.MAX_DEVICES,
+                 clock=time.perf_counter):
+        """
+        :param min_interval: 同一设备同类请求两次回复的最小间隔（秒）
+        :param max_entries: 限流记录数量上限，超出时丢弃最早的记录
+        :param clock: 计时时钟，需与 reply 传入的 received 一致
+        """
+        self.min_interval = min_interval
+        self.max_entries = max_entries
+        self.clock = clock
+        self._offset = DefaultProtocolHeader.__len__()
+        # 请求解码方法 -> 回复模板
+        self._templates: Dict[Callable, bytearray] = {
+            RequestType._decode_fin: self._template(ResponseType.FIN),
+            RequestType._decode_hea: self._template(ResponseType.HEA),
+        }
+        # (设备 id, 请求解码方法) -> 最近回复时刻，按回复时刻先后排列
+        self._last_reply: Dict[Tuple[int, Callable], float] = OrderedDict()
+        self._latency: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {"replied": 0, "rate_limited": 0, "errors": 0}
+
+    @staticmethod
+    def _template(response_type: ResponseType) -> bytearray:
+        return bytearray(ResponseType.encode_packet(response_type, {'id': 0, 'timestamp': 0}))
+
+    def reply(self,
+              record: Dict[str, Any],
+              decode_func: Callable,
+              addr: Tuple[str, int],
+              sock,
+              received: float) -> bool:
+        """
+        回复一条控制面请求，返回是否已发送
+        :param record: 解码记录
+        :param decode_func: 该请求的解码方法，用于选择回复模板
+        :param addr: 设备地址
+        :param sock: 接收该请求的 UDP 传输（提供 sendto）
+        :param received: 收到请求时的 clock() 读数
+        """
+        template = self._templates.get(decode_func)
+        if template is None or sock is None:
+            return False
+        device_id = record['id']
+        key = (device_id, decode_func)
+        last = self._last_reply.get(key)
+        if last is not None and received - last < self.min_interval:
+            self.stats["rate_limited"] += 1
+            return False
+        timestamp = record['timestamp']
+        try:
+            self._PATCH.pack_into(template, self._offset, device_id,
+                                  timestamp >> 32, timestamp & 0xFFFFFFFF)
+            # 传输层在无法立即发送时会复制数据，模板可以立即复用
+            sock.sendto(template, addr)
+        except Exception as e:
+            self.stats["errors"] += 1
+            _logger.error(f"控制面回复失败 {addr}: {e}")
+            return False
+        self._remember(key, received)
+        self.stats["replied"] += 1
+        self._latency.append(self.clock() - received)
+        return True
+
+    def _remember(self, key: Tuple[int, Callable], received: float) -> None:
+        """记录回复时刻，并清理已过限流间隔或超出数量上限的最早记录"""
+        last_reply = self._last_reply
+        last_reply[key] = received
+        last_reply.move_to_end(key)
+        expired = received - self.min_interval
+        while last_reply:
+            oldest_key, oldest = next(iter(last_reply.items()))
+            if oldest > expired and len(last_reply) <= self.max_entries:
+                break
+            del last_reply[oldest_key]
+
+    def forget(self, device_id: int) -> None:
+        """设备下线后清除限流记录，重新上线时立即回复"""
+        for decode_func in self._templates:
+            self._last_reply.pop((device_id, decode_func), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        if self._latency:
+            ordered = sorted(self._latency)
+            stats["latency_us"] = {
+                "p50": round(ordered[len(ordered) // 2] * 1e6, 1),
+                "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 1),
+                "max": round(ordered[-1] * 1e6, 1),
+            }
+        return stats
@@ -0,0 +1,199 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+from loguru import logger as _logger
+from utils.codec.device_id import format_device_id, parse_device_id
+from .protocol import ResponseType, PreparedResponse, PacketBatch
+
+COMMAND_TOPIC = "nar/cmd/+/+"       # 下行命令 Topic：nar/cmd/{device_id}/{type}
+DEFAULT_ACK_TIMEOUT = 0.5           # 等待设备确认的秒数
+DEFAULT_MAX_RETRIES = 3             # 未确认时的最大重发次数
+
+# Topic 中的类型名 -> ResponseType（枚举值为元组，不能直接 ResponseType('flo')）
+_RESPONSE_TYPES = {response_type.value: response_type for response_type in ResponseType}
+
+
+class _PendingAck:
+    """ 等待确认的下行数据包 """
+    __slots__ = ('device_id', 'timestamp', 'packet', 'attempts', 'handle')
+
+    def __init__(self, device_id: int, timestamp: int, packet: PreparedResponse):
+        self.device_id = device_id
+        self.timestamp = timestamp
+        self.packet = packet
+        self.attempts = 0
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class UdpDownlink:
+    """
+    MQTT -> UDP 下行命令通道
+    命令负载经 ResponseType 编码器编码并加上协议头，发往设备最近一次上行所在的驱动器与地址；
+    同一事件循环 tick 内的发送先进入发件箱，tick 结束时连续编码进一块池化缓冲区后统一写出；
+    需要确认的命令按 (设备 id, 时间戳) 等待 ACK 包，超时重发，超过重发次数后放弃
+    所有方法都需在事件循环线程中调用
+    """
+    def __init__(self,
+                 manager,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        """
+        :param manager: 提供 locate(device_id) -> (driver, addr) 的 UdpManager
+        :param loop: 发送所在的事件循环
+        :param ack_timeout: 等待确认的秒数
+        :param max_retries: 最大重发次数
+        """
+        self.manager = manager
+        self.loop = loop or asyncio.get_event_loop()
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self._outbox: List[PreparedResponse] = []
+        self._flush_scheduled = False
+        self._pending: Dict[Tuple[int, int], _PendingAck] = {}
+        self.stats = {"queued": 0, "sent": 0, "unroutable": 0, "errors": 0,
+                      "acked": 0, "retried": 0, "expired": 0}
+
+    def send(self,
+             device_id: Union[int, str],
+             response_type: ResponseType,
+             data: Dict[str, Any],
+             ack: bool = False) -> int:
+        """
+        编码并排队一条下行命令
+        :param device_id: 设备 id（整数或 8 位十六进制）
+        :param response_type: 响应类型
+        :param data: 负载字段，timestamp 为空时使用当前毫秒时间戳
+        :param ack: 是否等待设备确认
+        :return: 命令时间戳，设备确认时原样带回
+        """
+        if isinstance(device_id, str):
+            device_id = parse_device_id(device_id)
+        timestamp = data.get('timestamp') or int(time.time() * 1000)
+        packet = ResponseType.prepare(response_type,
+                                      dict(data, id=device_id, timestamp=timestamp))
+        self._enqueue(packet)
+        if ack:
+            key = (device_id, timestamp)
+            previous = self._pending.pop(key, None)
+            if previous is not None:
+                previous.handle.cancel()
+            entry = _PendingAck(device_id, timestamp, packet)
+            entry.handle = self.loop.call_later(self.ack_timeout, self._on_ack_timeout, key)
+            self._pending[key] = entry
+        return timestamp
+
+    def on_command(self, topic: str, payload: Any) -> None:
+        """
+        命令 Topic 的订阅处理函数
+        负载为字段字典，ack 字段缺省为 True
+        """
+        try:
+            _, _, device_hex, type_name = topic.split('/')
+            device_id = parse_device_id(device_hex)
+            response_type = _RESPONSE_TYPES.get(type_name)
+            if response_type is None:
+                raise ValueError(f"Unknown response type: {type_name}")
+            data = dict(payload) if isinstance(payload, dict) else {'value': payload}
+            ack = bool(data.pop('ack', True))
+            self.send(device_id, response_type, data, ack=ack)
+        except Exception as e:
+            self.stats["errors"] += 1
+            _logger.error(f"下行命令处理失败 {topic}: {e}")
+
+    def on_record(self, record: Dict[str, Any], decode_type: str) -> None:
+        """UDP 驱动器解码下游：匹配设备确认包"""
+        if decode_type != "ack":
+            return
+        entry = self._pending.pop((record["id"], record["timestamp"]), None)
+        if entry is None:
+            return
+        entry.handle.cancel()
+        self.stats["acked"] += 1
+
+    def is_pending(self, device_id: int, timestamp: int) -> bool:
+        """该命令是否仍在等待确认（已确认或已放弃时为 False）"""
+        return (device_id, timestamp) in self._pending
+
+    def pending_count(self, device_id: Optional[int] = None) -> int:
+        """等待确认的命令数量"""
+        if device_id is None:
+            return len(self._pending)
+        return sum(1 for entry in self._pending.values() if entry.device_id == device_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, pending=len(self._pending))
+
+    def _enqueue(self, packet: PreparedResponse) -> None:
+        self._outbox.append(packet)
+        self.stats["queued"] += 1
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.loop.call_soon(self._flush)
+
+    def _flush(self) -> None:
+        """编码并写出本 tick 内排队的全部数据包"""
+        self._flush_scheduled = False
+        outbox, self._outbox = self._outbox, []
+        routes: Dict[int, Any] = {}
+        targets: List[Tuple[Any, Tuple[str, int]]] = []
+        with PacketBatch() as batch:
+            for packet in outbox:
+                device_id = packet.device_id
+                if device_id not in routes:
+                    routes[device_id] = self.manager.locate(device_id)
+                route = routes[device_id]
+                if route is None:
+                    self.stats["unroutable"] += 1
+                    continue
+                try:
+                    if not batch.add(packet):
+                        # 缓冲区已满：先写出已编码部分
+                        self._send_batch(batch, targets)
+                        if not batch.add(packet):
+                            # 超过池化缓冲区大小的数据包单独编码
+                            buffer = bytearray(packet.max_size())
+                            end = ResponseType.encode_packet_into(packet, buffer)
+                            self._send(device_id, route, memoryview(buffer)[:end])
+                            continue
+                    targets.append(route)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    _logger.error(f"下行数据包编码失败 {format_device_id(device_id)}: {e}")
+            self._send_batch(batch, targets)
+
+    def _send_batch(self, batch: PacketBatch, targets: List[Tuple[Any, Tuple[str, int]]]) -> None:
+        for packet, route in zip(batch.packets(), targets):
+            self._send(None, route, packet)
+        batch.clear()
+        targets.clear()
+
+    def _send(self, device_id: Optional[int], route: Tuple[Any, Tuple[str, int]], packet) -> None:
+        driver, addr = route
+        try:
+            # 传输层在无法立即发送时会复制数据，缓冲区可以在返回后复用
+            driver.sock.sendto(packet, addr)
+            self.stats["sent"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            _logger.error(f"下行数据包发送失败 {addr if device_id is None else format_device_id(device_id)}: {e}")
+
+    def _on_ack_timeout(self, key: Tuple[int, int]) -> None:
+        entry = self._pending.get(key)
+        if entry is None:
+            return
+        if entry.attempts >= self.max_retries:
+            del self._pending[key]
+            self.stats["expired"] += 1
+            _logger.warning(f"设备 {format_device_id(entry.device_id)} 未确认下行命令 {entry.timestamp}，已放弃")
+            return
+        entry.attempts += 1
+        self.stats["retried"] += 1
+        self._enqueue(entry.packet)
+        entry.handle = self.loop.call_later(self.ack_timeout, self._on_ack_timeout, key)
+
+    def stop(self) -> None:
+        """取消所有等待中的确认"""
+        for entry in self._pending.values():
+            entry.handle.cancel()
+        self._pending.clear()
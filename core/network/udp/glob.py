@@ -1,5 +1,7 @@
+import os
+import struct
 import threading
-from typing import Optional, Set, Dict, Tuple, List
+from typing import BinaryIO, Optional, Set, Dict, Tuple, List
 import heapq
 from loguru import logger as _logger
 
@@ -34,6 +36,11 @@ class GlobalCache:
         self._init_data()
 
 class PortPool(GlobalCache):
+    """
+    端口池
+    每个范围维护一个未使用过端口的水位线和一个已释放端口的最小堆，
+    分配优先复用最小的已释放端口，分配与释放均为 O(log n)
+    """
     def _init_data(self):
         """初始化端口池数据结构"""
         self._allocated_ports: Set[int] = set()
@@ -55,21 +62,20 @@ class PortPool(GlobalCache):
     def allocate_port(self) -> Optional[int]:
         """从任意范围中分配一个可用端口"""
         with self._instance_lock:
-            for range_key, pool in self._port_pools.items():
-                start = pool["start"]
-                end = pool["end"]
-                current = pool["current"]
+            for pool in self._port_pools.values():
                 freed = pool["freed"]
 
-                # 优先从 freed 中取
-                if freed:
-                    port = freed.pop(0)
-                    if start <= port <= end and port not in self._allocated_ports:
+                # 优先复用已释放的端口
+                while freed:
+                    port = heapq.heappop(freed)
+                    if port not in self._allocated_ports:
                         self._allocated_ports.add(port)
                         _logger.info(f"获取端口成功: {port}")
                         return port
 
-                # 从 current 向后找
+                # 水位线只增不减，跳过的端口不会被重复检查
+                current = pool["current"]
+                end = pool["end"]
                 while current <= end:
                     if current not in self._allocated_ports:
                         self._allocated_ports.add(current)
@@ -79,31 +85,33 @@ class PortPool(GlobalCache):
                     current += 1
 
                 pool["current"] = end + 1
-                _logger.info("端口已满")
+            _logger.info("端口已满")
             return None  # 所有范围都满
 
     def release_port(self, port: int):
         """释放一个端口"""
-        if port not in self._allocated_ports:
-            _logger.warning("释放一个未分配的端口")
-            return
-
         with self._instance_lock:
+            if port not in self._allocated_ports:
+                _logger.warning("释放一个未分配的端口")
+                return
             self._allocated_ports.discard(port)
             _logger.info(f"释放端口 {port}")
 
-            for range_key, pool in self._port_pools.items():
-                start = pool["start"]
-                end = pool["end"]
-                if start <= port <= end:
-                    pool["freed"].append(port)
-                    pool["freed"].sort()
+            for pool in self._port_pools.values():
+                if pool["start"] <= port <= pool["end"]:
+                    heapq.heappush(pool["freed"], port)
                     break
 
     def has_port(self, port: int) -> bool:
         """查询端口是否已被分配"""
         return port in self._allocated_ports
 
+    def available(self) -> int:
+        """剩余可分配的端口数量"""
+        with self._instance_lock:
+            total = sum(pool["end"] - pool["start"] + 1 for pool in self._port_pools.values())
+            return total - len(self._allocated_ports)
+
     def reset(self):
         """重置状态，用于测试"""
         with self._instance_lock:
@@ -111,25 +119,119 @@ class PortPool(GlobalCache):
         _logger.debug(f"重置端口池")
 
 class UidGenerator(GlobalCache):
+    """
+    UID 注册表
+    (设备 id, 传感器名) -> uid 的映射在解码线程中读取：查询路径不加锁，
+    只有新分配时在分配锁内再次确认并递增计数器；反向索引 uid -> (设备 id, 传感器名)；
+    打开日志后每次分配追加一条记录，启动时整块读入回放，重启后 uid 保持不变
+    日志记录: uid(I) / 设备 id(I) / 名称长度(H) / 名称(UTF-8)
+    """
+    _RECORD = struct.Struct('>IIH')
+
     def _init_data(self):
         """初始化 UID 生成器的数据结构"""
         self._uid_counter = 0 
         self._uid_map: Dict[Tuple[int, str], int] = {}  # (id, name) -> uid 的映射表
+        self._uid_reverse: Dict[int, Tuple[int, str]] = {}  # uid -> (id, name) 的反向索引
+        self._alloc_lock = threading.Lock()
+        self._journal: Optional[BinaryIO] = None
+        self._journal_path: Optional[str] = None
 
     def get_uid(self, id: int, name: str) -> int:
         """获取与 (id, name) 对应的唯一 UID"""
-        key = (id, name)
-        if key in self._uid_map:
-            return self._uid_map[key]
-        
-        self._uid_counter += 1
-        uid = self._uid_counter
-        self._uid_map[key] = uid
+        uid = self._uid_map.get((id, name))
+        if uid is not None:
+            return uid
+        return self._allocate((id, name))
+
+    def _allocate(self, key: Tuple[int, str]) -> int:
+        with self._alloc_lock:
+            # 等待锁期间可能已被其他线程分配
+            uid = self._uid_map.get(key)
+            if uid is not None:
+                return uid
+            uid = self._uid_counter + 1
+            if self._journal is not None:
+                self._append(uid, key)
+            self._uid_counter = uid
+            # 先写反向索引，查询方看到 uid 时反查一定命中
+            self._uid_reverse[uid] = key
+            self._uid_map[key] = uid
         _logger.info(f"UID: {uid} 输出成功")
         return uid
 
+    def lookup(self, uid: int) -> Optional[Tuple[int, str]]:
+        """uid -> (设备 id, 传感器名)，未分配时返回 None"""
+        return self._uid_reverse.get(uid)
+
+    def __len__(self) -> int:
+        return len(self._uid_map)
+
+    def open_journal(self, path: str) -> int:
+        """
+        回放并打开追加日志，需在解码开始前调用
+        :param path: 日志文件路径，不存在时创建
+        :return: 回放的记录数
+        """
+        with self._alloc_lock:
+            self._close_journal()
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'a+b') as f:
+                f.seek(0)
+                data = f.read()
+            count, valid = self._replay(data)
+            if valid < len(data):
+                # 写入中断留下的不完整尾部记录
+                _logger.warning(f"UID 日志尾部 {len(data) - valid} 字节不完整，已截断")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+            self._journal = open(path, 'ab')
+            self._journal_path = path
+        _logger.info(f"UID 日志回放完成: {count} 条, 当前 UID {self._uid_counter}")
+        return count
+
+    def _replay(self, data: bytes) -> Tuple[int, int]:
+        """整块解析日志，返回 (记录数, 有效字节数)"""
+        record = self._RECORD
+        head = record.size
+        uid_map = self._uid_map
+        uid_reverse = self._uid_reverse
+        counter = self._uid_counter
+        offset = count = 0
+        end = len(data)
+        while offset + head <= end:
+            uid, device_id, length = record.unpack_from(data, offset)
+            if offset + head + length > end:
+                break
+            name = data[offset + head:offset + head + length].decode('utf-8')
+            key = (device_id, name)
+            uid_map[key] = uid
+            uid_reverse[uid] = key
+            if uid > counter:
+                counter = uid
+            offset += head + length
+            count += 1
+        self._uid_counter = counter
+        return count, offset
+
+    def _append(self, uid: int, key: Tuple[int, str]) -> None:
+        name = key[1].encode('utf-8')
+        self._journal.write(self._RECORD.pack(uid, key[0], len(name)) + name)
+        self._journal.flush()
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self) -> None:
+        """关闭日志，已分配的映射保留在内存中"""
+        with self._alloc_lock:
+            self._close_journal()
+
     def reset(self):
-        """重置 UID 生成器，用于测试或重新初始化"""
+        """重置 UID 生成器，用于测试或重新初始化（不清除磁盘日志）"""
         with self._instance_lock:
+            self.close()
             self._init_data()
-        _logger.info("UID 重置成功")
\ No newline at end of file
+        _logger.info("UID 重置成功")
@@ -1,10 +1,12 @@
 import struct
-from typing import Any, Union, Final
+from collections import deque
+from typing import Any, ClassVar, List, Optional, Tuple, Union, Final
 import warnings
 from PIL import Image
 import numpy as np
 from dataclasses import dataclass
 from loguru import logger as _logger
+from utils.codec.device_id import device_id_bytes
 
 IMGFORMAT = {
             '565': 'RGB565',
@@ -18,6 +20,12 @@ AUDFORMAT = {
             'MP3': 'MP3',
             'AAC': 'AAC'
             }
+# 初始化包末尾可选的标志字节：取值为枚举值（0 未压缩），不是按位组合的标志，其它取值一律拒绝
+COMPRESSION_FLAGS = {
+            0x01: 'zlib',       # zlib 格式（带头部与校验）
+            0x02: 'deflate',    # 原始 deflate 流
+            }
+
 # id/timestamp/
 class BaseDecoder:
     """"解码基函数"""
@@ -35,13 +43,13 @@ class BaseDecoder:
         self.uid = None
     def _parse_id(self,
                   data: bytes,
-                  length: int) -> hex:
-        """ id 解析方法 """
+                  length: int) -> int:
+        """ id 解析方法（整数，十六进制形式只在对外边界生成） """
         if len(data) < self._ptr + length:
             raise ValueError("Insufficient data for hex field")
-        segment = data[self._ptr:self._ptr+length]
+        value = int.from_bytes(data[self._ptr:self._ptr+length], byteorder='big')
         self._ptr += length
-        return ''.join(f'{b:02x}' for b in segment)
+        return value
     def _parse_name(self,
                     data: bytes,
                     length: int) -> str:
@@ -90,6 +98,20 @@ class BaseDecoder:
         int_value = int.from_bytes(data[self._ptr:self._ptr+length], byteorder='big')
         self._ptr += length
         return int_value
+    def _parse_flags(self, data: bytes) -> int:
+        """ 可选的 1 字节标志位，旧设备不发送时为 0 """
+        if len(data) <= self._ptr:
+            return 0
+        return self._parse_int(data, 1)
+    def _parse_compression(self, data: bytes) -> Optional[str]:
+        """ 标志字节按枚举值取压缩方式（0x01 zlib / 0x02 deflate），0 表示未压缩，其它取值（含 0x03）直接拒绝 """
+        flags = self._parse_flags(data)
+        if flags == 0:
+            return None
+        compression = COMPRESSION_FLAGS.get(flags)
+        if compression is None:
+            raise ValueError(f"Unknown compression flags {flags:#04x}")
+        return compression
     def _parse_str(self, data: bytes, length: int) -> str:
         """ 字符串解析方法 """
         if len(data) < self._ptr + length:
@@ -120,6 +142,12 @@ class StopDecode(BaseDecoder):
     def __init__(self, byte: bytes):
         super().__init__(byte)
 
+#id/timestamp
+# 下行命令确认包
+class AckDecode(BaseDecoder):
+    def __init__(self, byte: bytes):
+        super().__init__(byte)
+
 #id/timestamp/name_length/sensor_name
 class SensorDecode(BaseDecoder):
     def __init__(self, byte: bytes):
@@ -149,20 +177,66 @@ class StrDecode(BaseDecoder):
         value_len = self._parse_int(byte, 1) 
         self.value = self._parse_str(byte, value_len)
 
-#id/timestamp/uid/value
+#id/timestamp/flags/count/[uid/type/(delta)/value]...
+# 多记录聚合包：type 沿用 FLO/INT/STR 的 decode 值，flags bit0 表示记录带 2 字节毫秒时间差
+class AggregateDecode(BaseDecoder):
+    FLAG_DELTA: Final[int] = 0x01
+    _record_head = struct.Struct('>IB')
+    _record_head_delta = struct.Struct('>IBH')
+    _values = {0x10: struct.Struct('>f'), 0x11: struct.Struct('>i')}
+
+    def __init__(self, byte: bytes):
+        super().__init__(byte)
+        flags = self._parse_int(byte, 1)
+        count = self._parse_int(byte, 1)
+        head = self._record_head_delta if flags & self.FLAG_DELTA else self._record_head
+        # (uid, type, timestamp, value)
+        self.records: List[Tuple[int, int, int, Any]] = []
+        for _ in range(count):
+            if len(byte) < self._ptr + head.size:
+                raise ValueError("Insufficient data for aggregate record")
+            fields = head.unpack_from(byte, self._ptr)
+            self._ptr += head.size
+            uid, kind = fields[0], fields[1]
+            delta = fields[2] if len(fields) > 2 else 0
+            value_struct = self._values.get(kind)
+            if value_struct is not None:
+                if len(byte) < self._ptr + value_struct.size:
+                    raise ValueError("Insufficient data for aggregate value")
+                value = value_struct.unpack_from(byte, self._ptr)[0]
+                self._ptr += value_struct.size
+            elif kind == 0x12:
+                value = self._parse_str(byte, self._parse_int(byte, 1))
+            else:
+                raise ValueError(f"Unknown aggregate record type {kind:#04x}")
+            self.records.append((uid, kind, self.timestamp + delta, value))
+
+#id/timestamp/uid/value/(flags)
 class FltInit(BaseDecoder):
     def __init__(self, byte: bytes):
         super().__init__(byte)
         self.uid = self._parse_int(byte, 4)
         self.stream_length = self._parse_int32(byte)
+        self.compression = self._parse_compression(byte)
 
 #id/timestamp/uid/str_length/value/index
-class FltValue(StrDecode):
+class FltValue(BaseDecoder):
     def __init__(self, byte: bytes):
         super().__init__(byte)
+        self.uid = self._parse_int(byte, 4)
+        value_len = self._parse_int(byte, 1)
+        if len(byte) < self._ptr + value_len:
+            raise ValueError("Insufficient data for str field")
+        raw = byte[self._ptr:self._ptr + value_len]
+        self._ptr += value_len
+        # 压缩流的分片不是合法 UTF-8，保留原始字节
+        try:
+            self.value = raw.decode(encoding='utf-8')
+        except UnicodeDecodeError:
+            self.value = raw
         self.packet_index = self._parse_int32(byte)
 
-#id/timestamp/uid/format/width/height
+#id/timestamp/uid/format/width/height/(flags)
 class ImgInit(BaseDecoder):
     def __init__(self, byte: bytes):
         super().__init__(byte)
@@ -170,6 +244,7 @@ class ImgInit(BaseDecoder):
         self.format = self._parse_pixel_format(byte)
         self.width = self._parse_int(byte, 2)
         self.height = self._parse_int(byte, 2)
+        self.compression = self._parse_compression(byte)
     def _parse_pixel_format(self, data: bytes) -> str:
         """解析像素格式标识 (3字节ASCII)"""
 
@@ -210,6 +285,7 @@ class AudInit(BaseDecoder):
         self.sample_rate = self._parse_int32(byte)   # 4字节采样率
         self.bit_depth = self._parse_int(byte, 1)    # 1字节位深度
         self.channels = self._parse_int(byte, 1)     # 1字节通道数
+        self.compression = self._parse_compression(byte)  # 可选1字节标志
         
     def _parse_audio_format(self, data: bytes) -> str:
         """解析音频格式标识 (3字节ASCII)"""
@@ -258,12 +334,23 @@ class SensorResponse:
 class StopResponse:
     timestamp: int
 
+@dataclass
+class RedirectResponse:
+    timestamp: int
+    port: int
+
 @dataclass
 class FloatResponse:
     timestamp: int
     uid: int
     value: float
 
+@dataclass
+class IntResponse:
+    timestamp: int
+    uid: int
+    value: int
+
 @dataclass
 class StringResponse:
     timestamp: int
@@ -279,192 +366,194 @@ class AudioResponse:
     value: bytes
 
 
+def encode_device_id(device_id: Union[int, str]) -> bytes:
+    """ID编码方法 (整数或十六进制字符串 -> 4字节)，按设备缓存"""
+    return device_id_bytes(device_id)
+
+
+class BufferPool:
+    """ 定长 bytearray 复用池，deque 的 append/pop 本身线程安全 """
+    def __init__(self, buffer_size: int = 64 * 1024, max_buffers: int = 8):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free: deque = deque()
+
+    def acquire(self) -> bytearray:
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray) -> None:
+        if len(buffer) == self.buffer_size and len(self._free) < self.max_buffers:
+            self._free.append(buffer)
+
+
+ENCODE_POOL = BufferPool()
+
+
 class BaseEncoder:
-    """编码基类 """
-    timestamp_bytes: Final[int] = 6 
+    """
+    编码基类
+    每个子类用预编译的 struct.Struct 描述定长部分，encode_into 直接写入调用方提供的缓冲区；
+    构造函数保留原有用法 Encoder(device_id, response).get_bytes()
+    """
+    timestamp_bytes: Final[int] = 6
+    # id/时间戳高16位/时间戳低32位
+    _struct: ClassVar[struct.Struct] = struct.Struct('>4sHI')
+
+    def __init__(self, device_id: int, response: Any):
+        buffer = bytearray(self.max_size(response))
+        end = self.encode_into(buffer, 0, device_id, response)
+        self._buffer = bytes(memoryview(buffer)[:end])
 
-    def __init__(self):
-        self._buffer = bytearray()
-    
     def get_bytes(self) -> bytes:
         """返回编码完成的字节流"""
-        return bytes(self._buffer)
+        return self._buffer
 
-    def _encode_timestamp(self, timestamp: int) -> None:
-        """时间戳编码方法 (整型 -> 6字节大端序)"""
-        if timestamp.bit_length() > 48:  # 6字节 = 48位
-            raise ValueError("Timestamp exceeds 6-byte limit")
-        
-        # 高位补0确保6字节长度
-        self._buffer.extend(struct.pack('>Q', timestamp)[2:8])
-
-    def _encode_float32(self, value: float) -> None:
-        """float32编码方法 (浮点数 -> 4字节IEEE754)"""
-        self._buffer.extend(struct.pack('>f', value))
+    @classmethod
+    def max_size(cls, response: Any) -> int:
+        """编码后的最大字节数（变长字段按上限估计）"""
+        return cls._struct.size
 
-    def _encode_int32(self, value: int) -> None:
-        """int32编码方法 (整型 -> 4字节大端序)"""
-        self._buffer.extend(struct.pack('>i', value))
+    @classmethod
+    def encode_into(cls, buffer: bytearray, offset: int, device_id: int, response: Any) -> int:
+        """写入 buffer[offset:]，返回结束偏移"""
+        if response.timestamp.bit_length() > 48:  # 6字节 = 48位
+            raise ValueError("Timestamp exceeds 6-byte limit")
+        try:
+            return cls._pack_into(buffer, offset, encode_device_id(device_id),
+                                  response.timestamp >> 32, response.timestamp & 0xFFFFFFFF,
+                                  response)
+        except struct.error as e:
+            raise ValueError(f"Field out of range: {e}")
 
-    def _encode_int(self, value: int, length: int) -> None:
-        """通用整型编码方法 (整型 -> 定长大端序字节)"""
-        if value < 0:
-            raise ValueError("Negative integers not supported")
-        
-        if value.bit_length() > length * 8:
-            raise ValueError(f"Integer exceeds {length}-byte limit")
-        
-        self._buffer.extend(value.to_bytes(length, 'big'))
+    @classmethod
+    def _pack_into(cls, buffer, offset: int, id_bytes: bytes, ts_high: int, ts_low: int, response) -> int:
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low)
+        return offset + cls._struct.size
 
-    def _encode_str(self, value: str) -> None:
-        """字符串编码方法 (字符串 -> 长度前缀 + UTF-8字节)"""
-        encoded = value.encode('utf-8')
-        self._encode_int(len(encoded), 1)
-        self._buffer.extend(encoded)
+    @staticmethod
+    def _pack_tail(buffer, offset: int, value: bytes) -> int:
+        """在定长部分之后写入变长字节"""
+        end = offset + len(value)
+        buffer[offset:end] = value
+        return end
 
 
 # Find响应编码器
 class FindEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: FindResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
+    def __init__(self, device_id: int, response: FindResponse):
+        super().__init__(device_id, response)
 
 
 # HeartBeat响应编码器
 class HeartBeatEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: HeartBeatResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
+    def __init__(self, device_id: int, response: HeartBeatResponse):
+        super().__init__(device_id, response)
+
+
+# Stop响应编码器
+class StopEncoder(BaseEncoder):
+    def __init__(self, device_id: int, response: StopResponse):
+        super().__init__(device_id, response)
+
+
+# Redirect响应编码器：通知设备改用新的驱动器端口
+# id/timestamp/port
+class RedirectEncoder(BaseEncoder):
+    _struct = struct.Struct('>4sHIH')
+
+    def __init__(self, device_id: int, response: RedirectResponse):
+        super().__init__(device_id, response)
+
+    @classmethod
+    def _pack_into(cls, buffer, offset, id_bytes, ts_high, ts_low, response):
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low, response.port)
+        return offset + cls._struct.size
 
 
 # Sensor响应编码器
+# id/timestamp/uid/name_length/name
 class SensorEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: SensorResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        self._encode_int(response.uid, 4)
-        self._encode_str(response.name)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
+    _struct = struct.Struct('>4sHIIB')
 
+    def __init__(self, device_id: int, response: SensorResponse):
+        super().__init__(device_id, response)
 
-# Stop响应编码器
-class StopEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: StopResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
+    @classmethod
+    def max_size(cls, response: SensorResponse) -> int:
+        return cls._struct.size + 4 * len(response.name)
+
+    @classmethod
+    def _pack_into(cls, buffer, offset, id_bytes, ts_high, ts_low, response):
+        name = response.name.encode('utf-8')
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low, response.uid, len(name))
+        return cls._pack_tail(buffer, offset + cls._struct.size, name)
 
 
 # Float响应编码器
+# id/timestamp/uid/value
 class FloatEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: FloatResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        self._encode_int(response.uid, 4)
-        self._encode_float32(response.value)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
+    _struct = struct.Struct('>4sHIIf')
+
+    def __init__(self, device_id: int, response: FloatResponse):
+        super().__init__(device_id, response)
+
+    @classmethod
+    def _pack_into(cls, buffer, offset, id_bytes, ts_high, ts_low, response):
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low, response.uid, response.value)
+        return offset + cls._struct.size
+
+
+# Int响应编码器
+# id/timestamp/uid/value
+class IntEncoder(BaseEncoder):
+    _struct = struct.Struct('>4sHIIi')
+
+    def __init__(self, device_id: int, response: IntResponse):
+        super().__init__(device_id, response)
+
+    @classmethod
+    def _pack_into(cls, buffer, offset, id_bytes, ts_high, ts_low, response):
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low, response.uid, response.value)
+        return offset + cls._struct.size
 
 
 # String响应编码器
+# id/timestamp/uid/chunk/str_length/value
 class StringEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: StringResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        self._encode_int(response.uid, 4)
-        self._encode_int32(response.chunck)
-        self._encode_str(response.value)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
+    _struct = struct.Struct('>4sHIIiB')
+
+    def __init__(self, device_id: int, response: StringResponse):
+        super().__init__(device_id, response)
+
+    @classmethod
+    def max_size(cls, response: StringResponse) -> int:
+        return cls._struct.size + 4 * len(response.value)
+
+    @classmethod
+    def _pack_into(cls, buffer, offset, id_bytes, ts_high, ts_low, response):
+        value = response.value.encode('utf-8')
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low,
+                              response.uid, response.chunck, len(value))
+        return cls._pack_tail(buffer, offset + cls._struct.size, value)
 
 
 # Audio响应编码器
+# id/timestamp/uid/chunk/value_length/value
 class AudioEncoder(BaseEncoder):
-    def __init__(self, device_id: str, response: AudioResponse):
-        super().__init__()
-        self._encode_id(device_id)
-        self._encode_timestamp(response.timestamp)
-        self._encode_int(response.uid, 4)
-        self._encode_int32(response.chunck)
-        self._encode_bytes(response.value)
-        
-    def _encode_id(self, device_id: str) -> None:
-        """ID编码方法 (十六进制字符串 -> 字节流)"""
-        if len(device_id) != 8:  # 4字节对应8个十六进制字符
-            raise ValueError("Invalid ID length. Expected 8 hex chars")
-        
-        try:
-            self._buffer.extend(bytes.fromhex(device_id))
-        except ValueError:
-            raise ValueError("Invalid hexadecimal ID format")
-            
-    def _encode_bytes(self, value: bytes) -> None:
-        """字节流编码方法 (字节流 -> 长度前缀 + 字节流)"""
-        self._encode_int(len(value), 4)
-        self._buffer.extend(value)
-        
+    _struct = struct.Struct('>4sHIIiI')
 
+    def __init__(self, device_id: int, response: AudioResponse):
+        super().__init__(device_id, response)
 
-        
-        
-    
\ No newline at end of file
+    @classmethod
+    def max_size(cls, response: AudioResponse) -> int:
+        return cls._struct.size + len(response.value)
+
+    @classmethod
+    def _pack_into(cls, buffer, offset, id_bytes, ts_high, ts_low, response):
+        cls._struct.pack_into(buffer, offset, id_bytes, ts_high, ts_low,
+                              response.uid, response.chunck, len(response.value))
+        return cls._pack_tail(buffer, offset + cls._struct.size, response.value)
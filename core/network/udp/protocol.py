@@ -1,9 +1,13 @@
-from typing import Dict, Final, ClassVar
+import base64
+import struct
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, Final, Iterator, List, NamedTuple, Tuple
 from dataclasses import dataclass
 from enum import Enum
 from loguru import logger as _logger
 from .packet import *
 from .glob import UidGenerator
+from utils.codec.device_id import format_device_id
 
 
 UID = UidGenerator()
@@ -62,6 +66,109 @@ class DefaultProtocolHeader(BaseProtocolHeader):
 
         return DefaultProtocolHeaderStruct(**field_values)
 
+    @classmethod
+    def encode_method(cls, channel: int, port: int, decode: int, length: int) -> bytes:
+        """ 按字段顺序编码协议头，length 超过字段范围时取最大值 """
+        head = bytearray(cls.__len__())
+        cls.pack_into(head, 0, channel, port, decode, length)
+        return bytes(head)
+
+    @classmethod
+    def pack_into(cls, buffer, offset: int, channel: int, port: int, decode: int, length: int) -> int:
+        """ 协议头直接写入 buffer[offset:]，返回结束偏移 """
+        header = cls._header_struct()
+        header.pack_into(buffer, offset, channel, port, decode, min(length, cls._length_limit))
+        return offset + header.size
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Tuple[int, ...]:
+        """ 快速解析协议头，返回 (channel, port, decode, length) """
+        return cls._header_struct().unpack_from(data)
+
+    @classmethod
+    def length_limit(cls) -> int:
+        """ length 字段能表示的最大值，负载达到该长度时 length 固定为此值 """
+        cls._header_struct()
+        return cls._length_limit
+
+    @classmethod
+    def _header_struct(cls) -> struct.Struct:
+        """ 由字段表生成的预编译 Struct（字段顺序 channel/port/decode/length） """
+        header = cls.__dict__.get('_struct')
+        if header is None:
+            formats = {1: 'B', 2: 'H', 4: 'I'}
+            header = struct.Struct('>' + ''.join(formats[field.length]
+                                                 for field in cls._field_map.values()))
+            cls._struct = header
+            cls._length_limit = (1 << (cls._field_map['length'].length * 8)) - 1
+        return header
+
+@lru_cache(maxsize=4096)
+def _device_rout(device_id: int) -> str:
+    """ 设备 Topic 前缀，按设备缓存 """
+    return f'nar/device/{format_device_id(device_id)}'
+
+
+def _fin_response(data: dict):
+    return FindEncoder, FindResponse(timestamp=data['timestamp'])
+
+def _hea_response(data: dict):
+    return HeartBeatEncoder, HeartBeatResponse(timestamp=data['timestamp'])
+
+def _sto_response(data: dict):
+    return StopEncoder, StopResponse(timestamp=data['timestamp'])
+
+def _red_response(data: dict):
+    return RedirectEncoder, RedirectResponse(timestamp=data['timestamp'],
+                                             port=int(data['port']))
+
+def _sen_response(data: dict):
+    return SensorEncoder, SensorResponse(timestamp=data['timestamp'],
+                                         uid=data['uid'],
+                                         name=data['name'])
+
+def _flo_response(data: dict):
+    return FloatEncoder, FloatResponse(timestamp=data['timestamp'],
+                                       uid=data['uid'],
+                                       value=float(data['value']))
+
+def _int_response(data: dict):
+    return IntEncoder, IntResponse(timestamp=data['timestamp'],
+                                   uid=data['uid'],
+                                   value=int(data['value']))
+
+def _str_response(data: dict):
+    return StringEncoder, StringResponse(timestamp=data['timestamp'],
+                                         uid=data['uid'],
+                                         chunck=data.get('chunk', 0),
+                                         value=str(data['value']))
+
+def _aud_response(data: dict):
+    """JSON 负载中的音频以 base64 字符串传输"""
+    value = data['value']
+    if isinstance(value, str):
+        value = base64.b64decode(value)
+    return AudioEncoder, AudioResponse(timestamp=data['timestamp'],
+                                       uid=data['uid'],
+                                       chunck=data.get('chunk', 0),
+                                       value=bytes(value))
+
+def _encode_response(build, data: dict) -> bytes:
+    encoder, response = build(data)
+    return encoder(data['id'], response).get_bytes()
+
+
+class PreparedResponse(NamedTuple):
+    """ 已校验、待写入缓冲区的下行数据包 """
+    struct: '_ResponseStruct'
+    encoder: type
+    device_id: int
+    response: Any
+
+    def max_size(self) -> int:
+        return DefaultProtocolHeader.__len__() + self.encoder.max_size(self.response)
+
+
 class _ResponseStruct:
     """ 响应类型和结构配置 """
     def __init__(self, channel: int, port: int, decode: int):
@@ -75,6 +182,7 @@ class ResponseType(Enum):
     HEA = 'hea', _ResponseStruct(channel=0x00, port=0x00, decode=0x01)  # 心跳包
     STO = 'sto', _ResponseStruct(channel=0x00, port=0x00, decode=0x02)  # 停止包
     SEN = 'sen', _ResponseStruct(channel=0x00, port=0x00, decode=0x03)
+    RED = 'red', _ResponseStruct(channel=0x00, port=0x00, decode=0x05)  # 端口重定向
     FLO = 'flo', _ResponseStruct(channel=0x01, port=0x00, decode=0x10)  # 浮点数
     INT = 'int', _ResponseStruct(channel=0x01, port=0x00, decode=0x11)  # 整数
     STR = 'str', _ResponseStruct(channel=0x01, port=0x00, decode=0x12)  # 字符串
@@ -89,14 +197,53 @@ class ResponseType(Enum):
     @classmethod
     def get_type(cls, response_type: 'ResponseType') -> _ResponseStruct:
         if not isinstance(response_type, ResponseType):
-            logger.error(f"Invalid response type: {response_type}")
+            _logger.error(f"Invalid response type: {response_type}")
             raise ValueError(f"Invalid response type: {response_type}")
         return response_type.struct
 
     @classmethod
     def get_all_types(cls) -> list['ResponseType']:
         return list(cls.__members__.values())
+
+    @classmethod
+    def prepare(cls, response_type: 'ResponseType', data: dict) -> PreparedResponse:
+        """
+        构造响应并校验设备 id，供 encode_packet_into/PacketBatch 写入
+        :param response_type: 响应类型
+        :param data: 负载字段，至少包含 id 与 timestamp
+        """
+        struct = cls.get_type(response_type)
+        build = _RESPONSE_BUILDERS.get(response_type)
+        if build is None:
+            raise ValueError(f"Response type {response_type.value} has no encoder")
+        encoder, response = build(data)
+        encode_device_id(data['id'])
+        return PreparedResponse(struct, encoder, data['id'], response)
+
+    @staticmethod
+    def encode_packet_into(prepared: PreparedResponse, buffer, offset: int = 0) -> int:
+        """ 协议头 + 负载写入 buffer[offset:]，返回结束偏移 """
+        head_len = DefaultProtocolHeader.__len__()
+        end = prepared.encoder.encode_into(buffer, offset + head_len,
+                                           prepared.device_id, prepared.response)
+        struct = prepared.struct
+        DefaultProtocolHeader.pack_into(buffer, offset, struct.channel, struct.port,
+                                        struct.decode, end - offset - head_len)
+        return end
+
+    @classmethod
+    def encode_packet(cls, response_type: 'ResponseType', data: dict) -> bytes:
+        """
+        编码完整的下行数据包（协议头 + 负载）
+        :param response_type: 响应类型
+        :param data: 负载字段，至少包含 id 与 timestamp
+        """
+        prepared = cls.prepare(response_type, data)
+        buffer = bytearray(prepared.max_size())
+        end = cls.encode_packet_into(prepared, buffer)
+        return bytes(memoryview(buffer)[:end])
     
+    @classmethod
     def get_encoder(cls, channel: int, port: int, decode: int) -> callable:
         """
         根据channel, port, decode的值匹配返回对应的编码方法
@@ -111,7 +258,7 @@ class ResponseType(Enum):
         
         if matched_type is None:
             _logger.warning(f"No matching ResponseType found for channel={channel:#04x}, port={port:#04x}, decode={decode:#04x}")
-            return cls._encode_default
+            return cls._encode_default, "static"
         
         # 获取对应编码函数
         encoder_map = {
@@ -119,6 +266,7 @@ class ResponseType(Enum):
             cls.HEA: (cls._encode_hea, "static"),
             cls.STO: (cls._encode_sto, "static"),
             cls.SEN: (cls._encode_sen, "static"),
+            cls.RED: (cls._encode_red, "static"),
             cls.FLO: (cls._encode_flo, "static"),
             cls.INT: (cls._encode_int, "static"),
             cls.STR: (cls._encode_str, "static"),
@@ -127,53 +275,57 @@ class ResponseType(Enum):
             cls.IMG: (cls._encode_img, "stream"),
         }
         
-        return encoder_map.get(matched_type, cls._encode_default)
+        return encoder_map.get(matched_type, (cls._encode_default, "static"))
     
     @staticmethod
     def _encode_fin(data: dict) -> bytes:
         """节点发现包编码"""
-        
-        return None
+        return _encode_response(_fin_response, data)
     
     @staticmethod
     def _encode_hea(data: dict) -> bytes:
         """HEA包编码"""
-        return None
+        return _encode_response(_hea_response, data)
     
     @staticmethod
     def _encode_sto(data: dict) -> bytes:
         """STO包编码"""
-        return None
+        return _encode_response(_sto_response, data)
     
     @staticmethod
     def _encode_sen(data: dict) -> bytes:
         """SEN包编码"""
-        return None
+        return _encode_response(_sen_response, data)
+    
+    @staticmethod
+    def _encode_red(data: dict) -> bytes:
+        """RED包编码"""
+        return _encode_response(_red_response, data)
     
     @staticmethod
     def _encode_flo(data: dict) -> bytes:
         """FLO包编码"""
-        return None
+        return _encode_response(_flo_response, data)
     
     @staticmethod
     def _encode_int(data: dict) -> bytes:
         """INT包编码"""
-        return None
+        return _encode_response(_int_response, data)
     
     @staticmethod
     def _encode_str(data: dict) -> bytes:
         """STR包编码"""
-        return None
+        return _encode_response(_str_response, data)
     
     @staticmethod
     def _encode_flt(data: dict) -> bytes:
         """FLT包编码"""
-        return None
+        return _encode_response(_str_response, data)
     
     @staticmethod
     def _encode_aud(data: dict) -> bytes:
         """AUD包编码"""
-        return None
+        return _encode_response(_aud_response, data)
     
     @staticmethod
     def _encode_img(data: dict) -> bytes:
@@ -191,28 +343,94 @@ class ResponseType(Enum):
         return None
 
 
+_RESPONSE_BUILDERS = {
+    ResponseType.FIN: _fin_response,
+    ResponseType.HEA: _hea_response,
+    ResponseType.STO: _sto_response,
+    ResponseType.SEN: _sen_response,
+    ResponseType.RED: _red_response,
+    ResponseType.FLO: _flo_response,
+    ResponseType.INT: _int_response,
+    ResponseType.STR: _str_response,
+    ResponseType.FLT: _str_response,
+    ResponseType.AUD: _aud_response,
+}
+
+
+class PacketBatch:
+    """
+    下行数据包批量编码
+    多个数据包连续写入同一块池化缓冲区，每个包的区间记录在 spans 中；
+    缓冲区剩余空间不足时 add 返回 False，由调用方先发送已编码部分再 clear
+    """
+    def __init__(self, pool: BufferPool = ENCODE_POOL):
+        self.pool = pool
+        self.buffer = pool.acquire()
+        self._view = memoryview(self.buffer)
+        self.offset = 0
+        self.spans: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def add(self, prepared: PreparedResponse) -> bool:
+        if prepared.max_size() > len(self.buffer) - self.offset:
+            return False
+        end = ResponseType.encode_packet_into(prepared, self.buffer, self.offset)
+        self.spans.append((self.offset, end))
+        self.offset = end
+        return True
+
+    def packets(self) -> Iterator[memoryview]:
+        """ 各数据包的只读视图，clear/release 之后失效 """
+        view = self._view
+        for start, end in self.spans:
+            yield view[start:end]
+
+    def clear(self) -> None:
+        self.offset = 0
+        self.spans.clear()
+
+    def release(self) -> None:
+        self._view.release()
+        self.pool.release(self.buffer)
+        self.buffer = None
+
+    def __enter__(self) -> 'PacketBatch':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+_DECODER_TABLE = None
+
+
 class _RequestStruct:
-    """ 请求类型和结构配置 """
-    def __init__(self, channel: int, port: int, decode: int):
+    """ 请求类型和结构配置，min_size 为负载（不含协议头）的最小字节数 """
+    def __init__(self, channel: int, port: int, decode: int, min_size: int = 10):
         self.channel = channel
         self.port = port
         self.decode = decode
+        self.min_size = min_size
 
 
 class RequestType(Enum):
-    FIN = 'fin', _RequestStruct(channel=0x00, port=0x00, decode=0x00)   # 搜索包
+    FIN = 'fin', _RequestStruct(channel=0x00, port=0x00, decode=0x00, min_size=11)   # 搜索包
     HEA = 'hea', _RequestStruct(channel=0x00, port=0x00, decode=0x01)   # 心跳包
     STO = 'sto', _RequestStruct(channel=0x00, port=0x00, decode=0x02)   # 停止包
-    SEN = 'sen', _RequestStruct(channel=0x00, port=0x00, decode=0x03)
-    FLO = 'flo', _RequestStruct(channel=0x01, port=0x00, decode=0x10)   # 浮点数
-    INT = 'int', _RequestStruct(channel=0x01, port=0x00, decode=0x11)   # 整数
-    STR = 'str', _RequestStruct(channel=0x01, port=0x00, decode=0x12)   # 字符串
-    FLT_I = 'flt_i', _RequestStruct(channel=0x01, port=0x00, decode=0x13)   # 流式文本初始化
-    AUD_I = 'aud_i', _RequestStruct(channel=0x01, port=0x00, decode=0x14)   # 音频初始化
-    IMG_I = 'img_i', _RequestStruct(channel=0x01, port=0x00, decode=0x15)   # 图片初始化
-    FLT = 'flt', _RequestStruct(channel=0x01, port=0x01, decode=0x13)   # 流式文本
-    AUD = 'aud', _RequestStruct(channel=0x01, port=0x01, decode=0x14)   # 音频
-    IMG = 'img', _RequestStruct(channel=0x01, port=0x01, decode=0x15)   # 图片
+    ACK = 'ack', _RequestStruct(channel=0x00, port=0x00, decode=0x04)   # 下行命令确认包
+    SEN = 'sen', _RequestStruct(channel=0x00, port=0x00, decode=0x03, min_size=11)
+    FLO = 'flo', _RequestStruct(channel=0x01, port=0x00, decode=0x10, min_size=18)   # 浮点数
+    INT = 'int', _RequestStruct(channel=0x01, port=0x00, decode=0x11, min_size=18)   # 整数
+    STR = 'str', _RequestStruct(channel=0x01, port=0x00, decode=0x12, min_size=15)   # 字符串
+    FLT_I = 'flt_i', _RequestStruct(channel=0x01, port=0x00, decode=0x13, min_size=18)   # 流式文本初始化
+    AUD_I = 'aud_i', _RequestStruct(channel=0x01, port=0x00, decode=0x14, min_size=23)   # 音频初始化
+    IMG_I = 'img_i', _RequestStruct(channel=0x01, port=0x00, decode=0x15, min_size=21)   # 图片初始化
+    AGG = 'agg', _RequestStruct(channel=0x01, port=0x00, decode=0x16, min_size=12)   # 多记录聚合包
+    FLT = 'flt', _RequestStruct(channel=0x01, port=0x01, decode=0x13, min_size=19)   # 流式文本
+    AUD = 'aud', _RequestStruct(channel=0x01, port=0x01, decode=0x14, min_size=22)   # 音频
+    IMG = 'img', _RequestStruct(channel=0x01, port=0x01, decode=0x15, min_size=22)   # 图片
     
 
     def __init__(self, value, struct: _RequestStruct):
@@ -222,43 +440,46 @@ class RequestType(Enum):
     @classmethod
     def get_type(cls, request_type: 'RequestType') -> _RequestStruct:
         if not isinstance(request_type, RequestType):
-            logger.error(f"Invalid request type: {request_type}")
+            _logger.error(f"Invalid request type: {request_type}")
             raise ValueError(f"Invalid request type: {request_type}")
         return request_type.struct
     @classmethod
     def get_decoder(cls, channel: int, port: int, decode: int) -> callable:
         """根据channel, port, decode的值匹配返回对应的解码方法"""
-        
-        matched_type = None
-        for response_type in cls.__members__.values():
-            if (response_type.struct.channel == channel and 
-                response_type.struct.port == port and 
-                response_type.struct.decode == decode):
-                matched_type = response_type
-                break
-        
-        if matched_type is None:
+        entry = cls.decoder_table().get((channel, port, decode))
+        if entry is None:
             _logger.warning(f"No matching ResponseType found for channel={channel:#04x}, port={port:#04x}, decode={decode:#04x}")
-            return cls._decode_default
-        
-        # 获取对应解码函数
-        decoder_map = {
-            cls.FIN: (cls._decode_fin, "static"),
-            cls.HEA: (cls._decode_hea, "static"),
-            cls.STO: (cls._decode_sto, "static"),
-            cls.SEN: (cls._decode_sen, "static"),
-            cls.FLO: (cls._decode_flo, "static"),
-            cls.INT: (cls._decode_int, "static"),
-            cls.STR: (cls._decode_str, "static"),
-            cls.FLT_I: (cls._decode_flt_init, "init"),
-            cls.AUD_I: (cls._decode_aud_init, "init"),
-            cls.IMG_I: (cls._decode_img_init, "init"),
-            cls.FLT: (cls._decode_flt, "stream"),
-            cls.AUD: (cls._decode_aud, "stream"),
-            cls.IMG: (cls._decode_img, "stream"),
-        }
-        
-        return decoder_map.get(matched_type, cls._decode_default)
+            return cls._decode_default, None
+        return entry[0], entry[1]
+
+    @classmethod
+    def decoder_table(cls) -> Dict[Tuple[int, int, int], Tuple[callable, str, int]]:
+        """ (channel, port, decode) -> (解码方法, 缓存类型, 最小负载长度)，首次调用时生成 """
+        global _DECODER_TABLE
+        if _DECODER_TABLE is None:
+            decoder_map = {
+                cls.FIN: (cls._decode_fin, "control"),
+                cls.HEA: (cls._decode_hea, "control"),
+                cls.STO: (cls._decode_sto, "stop"),
+                cls.ACK: (cls._decode_ack, "ack"),
+                cls.SEN: (cls._decode_sen, "static"),
+                cls.FLO: (cls._decode_flo, "static"),
+                cls.INT: (cls._decode_int, "static"),
+                cls.STR: (cls._decode_str, "static"),
+                cls.AGG: (cls._decode_agg, "aggregate"),
+                cls.FLT_I: (cls._decode_flt_init, "init"),
+                cls.AUD_I: (cls._decode_aud_init, "init"),
+                cls.IMG_I: (cls._decode_img_init, "init"),
+                cls.FLT: (cls._decode_flt, "stream"),
+                cls.AUD: (cls._decode_aud, "stream"),
+                cls.IMG: (cls._decode_img, "stream"),
+            }
+            _DECODER_TABLE = {
+                (request_type.struct.channel, request_type.struct.port, request_type.struct.decode):
+                    (decode_func, decode_type, request_type.struct.min_size)
+                for request_type, (decode_func, decode_type) in decoder_map.items()
+            }
+        return _DECODER_TABLE
 
     @classmethod
     def get_all_types(cls) -> list['RequestType']:
@@ -290,7 +511,7 @@ class RequestType(Enum):
                 'uid': None,
                 'name': None,
                 'timestamp': timestamp,
-                'rout': f'nar/device/{id}/heartbeat',
+                'rout': f'{_device_rout(id)}/heartbeat',
                 }
     
     @staticmethod
@@ -304,7 +525,21 @@ class RequestType(Enum):
                 'uid': None,
                 'name': None,
                 'timestamp': timestamp,
-                'rout': f'nar/device/{id}/stop'
+                'rout': f'{_device_rout(id)}/stop'
+                }
+
+    @staticmethod
+    def _decode_ack(data: bytes) -> AckDecode:
+        """ACK包解码"""
+        ack = AckDecode(data)
+        id = ack.id
+        timestamp = ack.timestamp
+        return {
+                'id': id,
+                'uid': None,
+                'name': None,
+                'timestamp': timestamp,
+                'rout': f'{_device_rout(id)}/ack'
                 }
 
     @staticmethod
@@ -320,7 +555,7 @@ class RequestType(Enum):
             'uid': uid,
             'name': sensor_name,
             'timestamp': timestamp,
-            'rout': f'nar/device/{id}/register',
+            'rout': f'{_device_rout(id)}/register',
             }
 
     
@@ -338,7 +573,7 @@ class RequestType(Enum):
             'name': None,
             'timestamp': timestamp,
             'data': value,
-            'rout': f'nar/device/{id}/{uid}/static',
+            'rout': f'{_device_rout(id)}/{uid}/static',
             }
     
     @staticmethod
@@ -356,7 +591,7 @@ class RequestType(Enum):
             'name': None,
             'timestamp': timestamp,
             'data': value,
-            'rout': f'nar/device/{id}/{uid}/static',
+            'rout': f'{_device_rout(id)}/{uid}/static',
             }
     
     @staticmethod
@@ -374,9 +609,31 @@ class RequestType(Enum):
                 'name': None,
                 'timestamp': timestamp,
                 'data': value,
-                'rout': f'nar/device/{id}/{uid}/static',
+                'rout': f'{_device_rout(id)}/{uid}/static',
                 }
     
+    @staticmethod
+    def _decode_agg(data: bytes) -> AggregateDecode:
+        """AGG包解码：展开为多条静态记录"""
+        aggregate = AggregateDecode(data)
+        id = aggregate.id
+        records = [{
+                    'id': id,
+                    'uid': uid,
+                    'name': None,
+                    'timestamp': timestamp,
+                    'data': value,
+                    'rout': f'{_device_rout(id)}/{uid}/static',
+                    } for uid, _, timestamp, value in aggregate.records]
+        return {
+                'id': id,
+                'uid': None,
+                'name': None,
+                'timestamp': aggregate.timestamp,
+                'records': records,
+                'rout': f'{_device_rout(id)}/aggregate',
+                }
+
     @staticmethod
     def _decode_flt_init(data: bytes) -> FltInit:
         """FLT包流式任务解码"""
@@ -391,7 +648,8 @@ class RequestType(Enum):
                 'name': None,
                 'timestamp': timestamp,
                 'stream_len': stream_len,
-                'rout': f'nar/device/{id}/{uid}/streamstr',
+                'compression': flt_init.compression,
+                'rout': f'{_device_rout(id)}/{uid}/streamstr',
                 'type': "flt"
                 }
     
@@ -411,7 +669,7 @@ class RequestType(Enum):
                 'timestamp': timestamp,
                 'data': value,
                 'chunk': chunk,
-                'rout': f'nar/device/{id}/{uid}/streamstr/chunk',
+                'rout': f'{_device_rout(id)}/{uid}/streamstr/chunk',
                 }
     
     @staticmethod
@@ -434,7 +692,8 @@ class RequestType(Enum):
                 'sample_rate': sample_rate,
                 'bit_depth': bit_depth,
                 'channels': channels,
-                'rout': f'nar/device/{id}/{uid}/audio',
+                'compression': aud_init.compression,
+                'rout': f'{_device_rout(id)}/{uid}/audio',
                 'type': "aud"
                 }
     
@@ -454,7 +713,7 @@ class RequestType(Enum):
                 'timestamp': timestamp,
                 'data': value,
                 'chunk': chunk,
-                'rout': f'nar/device/{id}/{uid}/audio/chunk',
+                'rout': f'{_device_rout(id)}/{uid}/audio/chunk',
                 }
     
     @staticmethod
@@ -473,7 +732,8 @@ class RequestType(Enum):
                 'timestamp': timestamp,
                 'format': formats,
                 'size': size,
-                'rout': f'nar/device/{id}/{uid}/img',
+                'compression': img_init.compression,
+                'rout': f'{_device_rout(id)}/{uid}/img',
                 'type': "img"
 
         }
@@ -495,7 +755,7 @@ class RequestType(Enum):
                 'complete': complete,
                 'data': data,
                 'chunk': chunk,
-                'rout': f'nar/device/{id}/{uid}/img/chunk',
+                'rout': f'{_device_rout(id)}/{uid}/img/chunk',
                 }
     
     @staticmethod
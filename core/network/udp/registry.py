@@ -0,0 +1,196 @@
+import asyncio
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger as _logger
+from utils.codec.device_id import format_device_id
+from utils.datastruct.timing_wheel import TimingWheel
+from .configs import UdpConfigs
+
+STATE_ONLINE = 1
+STATE_OFFLINE = 2
+_STATE_NAMES = {STATE_ONLINE: "online", STATE_OFFLINE: "offline"}
+
+DEFAULT_TICK = 0.5      # 超时检查刻度（秒）
+
+
+class DeviceRegistry:
+    """
+    设备在线状态表
+    每台设备占一个槽位，最后上行时刻/状态/是否已挂定时器存放在定长数组中，地址单独存列表；
+    上行只写数组，不操作定时器；每台在线设备在时间轮中最多挂一个定时器，
+    到期时若期间有过上行则按剩余时间重新挂上，否则转为离线，
+    因此超时检查的代价与到期设备数量成正比
+    状态变化以 (记录, "state") 交给 on_event，记录的 rout 为 nar/device/{id}/state
+    设备数量达到 max_devices 后，新设备复用最早离线设备的槽位；没有离线槽位时不再记录新设备
+    touch/mark_offline/expire 需在同一线程（事件循环）中调用
+    """
+    def __init__(self,
+                 timeout: float = UdpConfigs.DEFAULT_NODE_TIMEOUT,
+                 tick: float = DEFAULT_TICK,
+                 on_event: Optional[Callable[[Dict[str, Any], str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 max_devices: int = UdpConfigs.MAX_DEVICES):
+        """
+        :param timeout: 多少秒无上行视为离线
+        :param tick: 超时检查刻度（秒）
+        :param on_event: 状态变化回调 on_event(record, "state")
+        :param clock: 单调时钟
+        :param max_devices: 记录的设备数量上限
+        """
+        self.timeout = timeout
+        self.max_devices = max_devices
+        self.tick = tick
+        self.on_event = on_event
+        self.clock = clock
+        self._slots: Dict[int, int] = {}        # 设备 id -> 槽位
+        self._ids = array('I')
+        self._last_seen = array('d')
+        self._state = array('B')
+        self._scheduled = array('B')
+        self._addrs: List[Optional[Tuple[str, int]]] = []
+        # 离线设备的槽位，按离线先后排列，设备数量达到上限时从最早的开始复用
+        self._offline: Dict[int, None] = OrderedDict()
+        self.rejected = 0
+        self._wheel = TimingWheel(tick, start=clock())
+        self._online = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def online_count(self) -> int:
+        return self._online
+
+    def touch(self, device_id: int, addr: Tuple[str, int], now: Optional[float] = None) -> bool:
+        """记录一次上行，返回设备是否由此上线"""
+        now = self.clock() if now is None else now
+        slot = self._slots.get(device_id)
+        if slot is None:
+            slot = self._allocate(device_id, addr, now)
+            if slot is None:
+                return False
+        else:
+            self._last_seen[slot] = now
+            self._addrs[slot] = addr
+        if self._state[slot] == STATE_ONLINE:
+            return False
+        self._offline.pop(slot, None)
+        self._state[slot] = STATE_ONLINE
+        self._online += 1
+        if not self._scheduled[slot]:
+            self._scheduled[slot] = 1
+            self._wheel.schedule(slot, now + self.timeout)
+        self._publish(slot, "online", "seen")
+        return True
+
+    def _allocate(self, device_id: int, addr: Tuple[str, int], now: float) -> Optional[int]:
+        """为新设备分配槽位，达到上限时复用最早离线设备的槽位，无可复用槽位时返回 None"""
+        if len(self._ids) < self.max_devices:
+            slot = len(self._ids)
+            self._ids.append(device_id)
+            self._last_seen.append(now)
+            self._state.append(STATE_OFFLINE)
+            self._scheduled.append(0)
+            self._addrs.append(addr)
+        elif self._offline:
+            # 已挂的定时器保留，到期时按新设备的最后上行时刻重新判断
+            slot, _ = self._offline.popitem(last=False)
+            del self._slots[self._ids[slot]]
+            self._ids[slot] = device_id
+            self._last_seen[slot] = now
+            self._addrs[slot] = addr
+        else:
+            self.rejected += 1
+            return None
+        self._slots[device_id] = slot
+        return slot
+
+    def mark_offline(self, device_id: int, reason: str = "stop") -> bool:
+        """设备主动下线（STO 包），返回状态是否变化；已挂的定时器到期时自然跳过"""
+        slot = self._slots.get(device_id)
+        if slot is None or self._state[slot] != STATE_ONLINE:
+            return False
+        self._set_offline(slot, reason)
+        return True
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """推进时间轮，处理到期设备，返回本次离线的设备数量"""
+        now = self.clock() if now is None else now
+        offline = 0
+        for slot in self._wheel.advance(now):
+            self._scheduled[slot] = 0
+            if self._state[slot] != STATE_ONLINE:
+                continue
+            deadline = self._last_seen[slot] + self.timeout
+            if deadline > now:
+                # 期间有过上行，按剩余时间重新挂上
+                self._scheduled[slot] = 1
+                self._wheel.schedule(slot, deadline)
+                continue
+            self._set_offline(slot, "timeout")
+            offline += 1
+        return offline
+
+    def _set_offline(self, slot: int, reason: str) -> None:
+        self._state[slot] = STATE_OFFLINE
+        self._online -= 1
+        self._offline[slot] = None
+        self._publish(slot, "offline", reason)
+
+    def _publish(self, slot: int, state: str, reason: str) -> None:
+        if self.on_event is None:
+            return
+        device_id = self._ids[slot]
+        record = {'id': device_id,
+                  'uid': None,
+                  'name': None,
+                  'timestamp': int(time.time() * 1000),
+                  'data': {'state': state, 'reason': reason},
+                  'addr': self._addrs[slot],
+                  'rout': f'nar/device/{format_device_id(device_id)}/state'}
+        try:
+            self.on_event(record, "state")
+        except Exception as e:
+            _logger.error(f"设备状态事件处理失败: {e}")
+
+    def get(self, device_id: int) -> Optional[Dict[str, Any]]:
+        slot = self._slots.get(device_id)
+        if slot is None:
+            return None
+        return self._describe(slot, self.clock())
+
+    def snapshot(self, online_only: bool = False) -> List[Dict[str, Any]]:
+        now = self.clock()
+        return [self._describe(slot, now) for slot in range(len(self._ids))
+                if not online_only or self._state[slot] == STATE_ONLINE]
+
+    def _describe(self, slot: int, now: float) -> Dict[str, Any]:
+        return {"id": format_device_id(self._ids[slot]),
+                "state": _STATE_NAMES[self._state[slot]],
+                "last_seen": round(now - self._last_seen[slot], 3),
+                "addr": self._addrs[slot]}
+
+    def start(self) -> None:
+        """在当前事件循环中按刻度执行超时检查"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="device_registry")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.expire()
+            except Exception as e:
+                _logger.error(f"设备超时检查失败: {e}")
@@ -1,9 +1,9 @@
 import asyncio
-import asyncudp
+import time
 import traceback
 from typing import Optional, Dict, Any, Tuple
 from concurrent.futures import ThreadPoolExecutor
-import redis
+from cachetools import LRUCache
 
 # 项目模块导入
 from .configs import UdpConfigs
@@ -14,10 +14,14 @@ from .cache import (
     AudStruct, ImgStruct
 )
 from .glob import PortPool
+from .validator import PacketValidator, REJECT_DECODE_ERROR
+from .registry import DeviceRegistry
+from .control import ControlReplier, CONTROL_TYPES
+from .capture import DatagramCapture
+from utils.datastruct.versioned_map import VersionedMap
 from loguru import logger
 
 _logger = logger
-r = redis.Redis()
 #_data_logger = log.get_child_logger('data', enable_console=True)
 
 # UDP 配置
@@ -26,17 +30,18 @@ LISTEN_PORT_RANGE = UdpConfigs.LISTEN_PORT_RANGE
 BUFFER_SIZE = UdpConfigs.BUFFER_SIZE
 MAX_WORKERS = UdpConfigs.MAX_WORKERS
 QUEUE_SIZE = UdpConfigs.QUEUE_SIZE
+QUARANTINE_SIZE = UdpConfigs.QUARANTINE_SIZE
 PORT_CACHE = PortPool()
 PORT_CACHE.register_range(*LISTEN_PORT_RANGE)
 
 
-class UdpDriver(asyncio.Protocol):
-    """基于 asyncudp 的异步 UDP 驱动器，支持静态/流式数据缓存处理"""
+class UdpDriver(asyncio.DatagramProtocol):
+    """
+    异步 UDP 驱动器，支持静态/流式数据缓存处理
+    驱动器本身即数据报协议：datagram_received 入队并计数，listen 逐个取出解码
+    """
     thread_name = "UdpDriver"
 
-    # 共享缓存
-    
-
     def __init__(self,
                  ip: str = None,
                  port_range: PortPool = None,
@@ -44,7 +49,12 @@ class UdpDriver(asyncio.Protocol):
                  buffer_size: int = None,
                  queue_size: int = None,
                  max_workers: int = None,
-                 request=None):
+                 request=None,
+                 quarantine_size: int = None,
+                 registry: DeviceRegistry = None,
+                 static_cache: StaticCache = None,
+                 stream_cache: StreamCache = None,
+                 online_map: VersionedMap = None):
         super().__init__()
 
         # 初始化配置
@@ -55,11 +65,37 @@ class UdpDriver(asyncio.Protocol):
         self.request = request or RequestType
         self.header_cache = header_cache or DefaultProtocolHeader()
         self.header_cache_len = len(self.header_cache)
-        self.static_cache = StaticCache()
-        self.stream_cache = StreamCache()
+        # 解码前的快速校验，不合格的包不进入线程池
+        self.validator = PacketValidator(header=type(self.header_cache),
+                                         request=self.request,
+                                         quarantine_size=QUARANTINE_SIZE if quarantine_size is None else quarantine_size)
+        # 在线主题表：uid -> rout，缓存淘汰时同步移除
+        # 由 UdpManager 创建时缓存与在线表在驱动器间共享，设备被重定向到其它端口后数据仍在同一处
+        self.online_map = online_map if online_map is not None else VersionedMap()
+        self.static_cache = static_cache if static_cache is not None else StaticCache(on_evict=self._on_cache_evict)
+        self.stream_cache = stream_cache if stream_cache is not None else StreamCache(on_evict=self._on_cache_evict)
+        # 设备最近一次上行的地址：id -> (addr, 接收时刻)，供下行命令寻址；按最近上行保留 MAX_DEVICES 台
+        self.device_addrs: Dict[int, Tuple[Tuple[str, int], float]] = LRUCache(maxsize=UdpConfigs.MAX_DEVICES)
+        # 设备在线状态表，由 UdpManager 在驱动器间共享；心跳/停止包只更新状态，不进入缓存
+        self.registry = registry
+        # FIN/HEA/STO 在事件循环内解码并回复
+        self.control = ControlReplier()
+        # 原始数据报抓包，开启后记录每个到达的数据报
+        self.capture: Optional[DatagramCapture] = None
         
         self.running = True
+        # UDP 传输（sendto/close），listen 建立端点后赋值
         self.sock = None
+        # 已校验、等待解码的数据包，None 表示传输已关闭；控制面包不进入队列
+        self._packets: asyncio.Queue = asyncio.Queue()
+        # 负载统计：到达包数 / 积压超过 queue_size 时丢弃的数据包数
+        self.received = 0
+        self.dropped = 0
+        # 数据包入队数 / 取出数，二者之差为积压
+        self.queued = 0
+        self.processed = 0
+        # 解码记录下游（如 MQTT 桥），签名为 sink(record, decode_type)
+        self.sinks = []
 
         # 端口分配
         self.port_range = PORT_CACHE
@@ -73,6 +109,7 @@ class UdpDriver(asyncio.Protocol):
         # 缓存系统初始化
         self.cache_map = {
             'static': StaticBufferStruct,
+            'aggregate': StaticBufferStruct,
             'stream': StreamBufferStruct,
             'init': StreamBufferStruct,
         }
@@ -82,50 +119,163 @@ class UdpDriver(asyncio.Protocol):
         self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
         self._loop = asyncio.get_event_loop()
 
+    def connection_made(self, transport) -> None:
+        self.sock = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        """
+        数据报到达：在此记录到达时刻并校验
+        控制面包（FIN/HEA/STO）很短，立即解码回复，不排在数据包之后，也不参与负载丢弃；
+        数据包在积压超过 queue_size 时丢弃，否则入队等待解码
+        """
+        received = time.perf_counter()
+        self.received += 1
+        if self.capture is not None:
+            self.capture.record(data, addr)
+        checked = self.validator.validate(data, addr)
+        if checked is None:
+            return
+        payload, decode_func, decode_type = checked
+        if decode_type in CONTROL_TYPES:
+            self._handle_control(data, addr, payload, decode_func, decode_type, received)
+            return
+        if self.backlog() >= self.queue_size:
+            # 解码跟不上接收：丢弃新到的数据包，由扩容分担负载
+            self.dropped += 1
+            return
+        self.queued += 1
+        self._packets.put_nowait((data, addr, payload, decode_func, decode_type))
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP 不可达等错误只影响单次发送，不关闭端点
+        _logger.debug(f"UDP 传输错误: {exc}")
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._packets.put_nowait(None)
+
     async def listen(self):
         """启动 UDP 接收监听"""
-        self.sock = await asyncudp.create_socket(local_addr=(self.ip, self.port))
+        await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: self, local_addr=(self.ip, self.port))
         _logger.info(f"UDP Socket 启动成功，监听 {self.ip}:{self.port} {self.running}")
         
         while self.running:
             try:
                 _logger.info(f"等待接收包")
-                data, addr = await self.sock.recvfrom()
+                packet = await self._packets.get()
+                if packet is None:
+                    break
+                self.processed += 1
+                data, addr, payload, decode_func, decode_type = packet
                 _logger.info(f"接收数据包: {addr} ; 数据长度: {len(data)}")
-                if len(data) < self.header_cache_len:
+
+                # 数据包按到达顺序逐个解码，保证流分片按序写入
+                try:
+                    decoded_data = await self._loop.run_in_executor(
+                        self._executor,
+                        decode_func,
+                        payload
+                    )
+                except Exception as e:
+                    self.validator.reject(REJECT_DECODE_ERROR, data, addr)
+                    _logger.debug(f"数据包解码失败 {addr}: {e}")
                     continue
-                
-                head = data[:self.header_cache_len]
-                #_data_logger.debug(f"数据包头: {head}")
-                payload = data[self.header_cache_len:]
-                #_data_logger.debug(f"数据包体: {payload}")
-                protocol_header = self.header_cache.decode_method(head)
-                decode_func, decode_type = self.request.get_decoder(
-                    channel=protocol_header.channel,
-                    port=protocol_header.port,
-                    decode=protocol_header.decode
-                )
-
-                decoded_data = await self._loop.run_in_executor(
-                    self._executor,
-                    decode_func,
-                    payload
-                )
                 #_data_logger.debug(f"解码数据{decoded_data}")
-                await self._add_to_cache(addr, decoded_data, decode_type)
-                
+                self._dispatch(addr, decoded_data, decode_type)
 
             except Exception as e:
                 _logger.error(f"\033[91m数据包解析错误:\033[0m")
                 _logger.debug(f"\033[91m{traceback.format_exc()}\033[0m")
 
-    async def _add_to_cache(self,
+    def _handle_control(self,
+                        data: bytes,
+                        addr: Tuple[str, int],
+                        payload: bytes,
+                        decode_func,
+                        decode_type: str,
+                        received: float) -> None:
+        """在事件循环内直接解码并回复控制面包"""
+        try:
+            decoded_data = decode_func(payload)
+        except Exception as e:
+            self.validator.reject(REJECT_DECODE_ERROR, data, addr)
+            _logger.debug(f"控制面包解码失败 {addr}: {e}")
+            return
+        try:
+            if decode_type == "control":
+                # 先回复，再更新设备状态与分发
+                self.control.reply(decoded_data, decode_func, addr, self.sock, received)
+            elif decode_type == "stop":
+                self.control.forget(decoded_data["id"])
+            self._dispatch(addr, decoded_data, decode_type)
+        except Exception as e:
+            _logger.error(f"\033[91m控制面包处理错误:\033[0m")
+            _logger.debug(f"\033[91m{traceback.format_exc()}\033[0m")
+
+    def _dispatch(self, addr: Tuple[str, int], decoded_data: Dict[str, Any], decode_type: str) -> None:
+        """写入缓存并分发给下游"""
+        completed = self._add_to_cache(addr, decoded_data, decode_type)
+        if self.sinks:
+            if decode_type == "aggregate":
+                # 聚合包按单条静态记录分发，下游无需区分
+                for record in decoded_data["records"]:
+                    self._emit(record, "static")
+            else:
+                self._emit(decoded_data, decode_type)
+            if completed is not None:
+                self._emit(completed, "complete")
+
+    def start_capture(self, path: str) -> DatagramCapture:
+        """开始抓包，已在抓包时先结束上一个文件"""
+        self.stop_capture()
+        self.capture = DatagramCapture(path, loop=self._loop)
+        _logger.info(f"开始抓包: {path}")
+        return self.capture
+
+    def stop_capture(self) -> Optional[Dict[str, Any]]:
+        """结束抓包，返回抓包统计（剩余缓冲在写线程中写出，不等待）"""
+        capture, self.capture = self.capture, None
+        if capture is None:
+            return None
+        capture.close()
+        _logger.info(f"结束抓包: {capture.path}，共 {capture.records} 个数据报")
+        return capture.get_stats()
+
+    def backlog(self) -> int:
+        """等待解码的数据包数（已入队、尚未取出）"""
+        return self.queued - self.processed
+
+    def load_stats(self) -> Dict[str, int]:
+        return {"received": self.received,
+                "dropped": self.dropped,
+                "backlog": self.backlog()}
+
+    def add_sink(self, sink) -> None:
+        """注册解码记录下游"""
+        if sink not in self.sinks:
+            self.sinks.append(sink)
+
+    def _emit(self, record: Dict[str, Any], decode_type: str) -> None:
+        """将解码记录分发给所有下游，下游异常不影响接收"""
+        for sink in self.sinks:
+            try:
+                sink(record, decode_type)
+            except Exception as e:
+                _logger.error(f"下游处理解码记录失败: {e}")
+
+    def _add_to_cache(self,
                            addr: Tuple[str, int],
                            decoded_data: Any,
-                           decode_type: str):
+                           decode_type: str) -> Optional[Dict[str, Any]]:
         
-        """处理缓存逻辑"""
+        """处理缓存逻辑，流数据接收完成时返回完成事件记录"""
         decoded_data["addr"] = addr
+        self.device_addrs[decoded_data["id"]] = (addr, self._loop.time())
+        if self.registry is not None:
+            if decode_type == "stop":
+                self.registry.mark_offline(decoded_data["id"])
+            else:
+                self.registry.touch(decoded_data["id"], addr)
 
         cache = self.cache_map.get(decode_type, None)
         #_data_logger.debug(f"解码类型: {decode_type}")
@@ -135,6 +285,9 @@ class UdpDriver(asyncio.Protocol):
 
         try:
             if decode_type == "static":
+                if "data" not in decoded_data:
+                    # SEN 注册包只分配 uid，不携带数据
+                    return None
                 buffer = cache(id=decoded_data["id"],
                                   uid=decoded_data["uid"],
                                   name=decoded_data["name"],
@@ -143,15 +296,58 @@ class UdpDriver(asyncio.Protocol):
                                   addr=addr,
                                   rout=decoded_data["rout"])
                 _logger.info("静态数据缓冲赋值成功")
-                self.static_cache.add(buffer=buffer)
+                if self.static_cache.add(buffer=buffer):
+                    self.online_map.set(buffer.uid, buffer.rout)
+
+            elif decode_type == "aggregate":
+                buffers = []
+                for record in decoded_data["records"]:
+                    record["addr"] = addr
+                    buffers.append(cache(id=record["id"],
+                                         uid=record["uid"],
+                                         name=record["name"],
+                                         data=record["data"],
+                                         timestamp=record["timestamp"],
+                                         addr=addr,
+                                         rout=record["rout"]))
+                added = self.static_cache.add_many(buffers)
+                self.online_map.update((buffer.uid, buffer.rout) for buffer in added)
 
             elif decode_type == "stream":
                 buffer = self.stream_cache.get_by_id(id=decoded_data["uid"])
-                buffer.datas.add_chunk(chunk=decoded_data["data"], 
-                                        chunk_id=decoded_data["chunk"])
+                if buffer is None:
+                    # 初始化包未收到或流已被淘汰
+                    _logger.debug(f"流 {decoded_data['uid']} 未初始化，丢弃数据块 {decoded_data['chunk']}")
+                    return None
+                chunk = decoded_data["data"]
+                if isinstance(chunk, str):
+                    # 流式文本统一以 UTF-8 字节存储，便于按字节区间读取
+                    chunk = chunk.encode("utf-8")
+                added = self.stream_cache.add_chunk(buffer, chunk=chunk,
+                                                    chunk_id=decoded_data["chunk"])
                 _logger.info("流数据缓冲赋值成功")
+                if added and buffer.datas.done:
+                    self.online_map.set(buffer.uid, buffer.rout)
+                    return {'id': buffer.id,
+                            'uid': buffer.uid,
+                            'name': buffer.name,
+                            'timestamp': buffer.timestamp,
+                            'type': buffer.dtype,
+                            'chunks': buffer.datas.get_chunks_count,
+                            'size': len(buffer.datas),
+                            'rout': buffer.rout}
 
             elif decode_type == "init":
+                # 解压后的数据以初始化包声明的大小为上限（音频未声明大小，使用默认上限）
+                # 长度/尺寸按有符号整数解析，非正数视为未声明
+                if decoded_data["type"] == "flt":
+                    stream_len = decoded_data["stream_len"]
+                    max_size = stream_len if stream_len > 0 else None
+                elif decoded_data["type"] == "img":
+                    width, height = decoded_data["size"]
+                    max_size = width * height * 4 if width > 0 and height > 0 else None
+                else:
+                    max_size = None
                 data_struct = cache(
                         id = decoded_data["id"],
                         uid = decoded_data["uid"],
@@ -159,7 +355,8 @@ class UdpDriver(asyncio.Protocol):
                         timestamp = decoded_data["timestamp"],
                         addr = addr,
                         rout = decoded_data["rout"] + "/chunck",
-
+                        compression = decoded_data.get("compression"),
+                        max_size = max_size,
                     )
                 if decoded_data["type"] == "flt":
                     
@@ -174,6 +371,7 @@ class UdpDriver(asyncio.Protocol):
                     
 
                     self.stream_cache.init_stream(buffer=buffer)
+                    self.online_map.set(buffer.uid, buffer.rout)
                     _logger.info("flt数据缓冲赋值成功")
 
                 elif decoded_data["type"] == "aud":
@@ -190,6 +388,7 @@ class UdpDriver(asyncio.Protocol):
                                          rout=decoded_data["rout"],
                                          datas=data_struct)
                     self.stream_cache.init_stream(buffer=buffer)
+                    self.online_map.set(buffer.uid, buffer.rout)
                     _logger.info("aud数据缓冲赋值成功")
                     
 
@@ -204,12 +403,19 @@ class UdpDriver(asyncio.Protocol):
                                        rout=decoded_data["rout"],
                                        datas=data_struct)
                     self.stream_cache.init_stream(buffer=buffer)
+                    # 图片在接收完成前不视为在线
+                    self.online_map.discard(buffer.uid)
                     _logger.info("img数据缓冲赋值成功")
 
 
         except Exception as e:
             _logger.error(f"\033[91m缓冲区错误:\033[0m")
             _logger.error(f"\033[91m{traceback.format_exc()}\033[0m")
+        return None
+
+    def _on_cache_evict(self, uid: int, item: Any) -> None:
+        """缓存淘汰回调：同步移除在线主题"""
+        self.online_map.discard(uid)
 
     async def run(self):
         """启动异步监听"""
@@ -222,6 +428,10 @@ class UdpDriver(asyncio.Protocol):
         if self.sock:
             self.sock.close()
         self._executor.shutdown(wait=False)
+        self.stop_capture()
+        if self.port is not None:
+            self.port_range.release_port(self.port)
+            self.port = None
         _logger.info("UDP 驱动器已关闭")
     
 
@@ -233,7 +443,16 @@ class UdpManager:
         self.drivers = {}
         self.tasks = {}
         self._lock = asyncio.Lock()
-        self.cur_cache = None
+        # 所有驱动器共享缓存与在线表：设备在端口间重定向、驱动器回收都不影响已缓存的数据
+        self.shared_cache = {
+            "static_cache": StaticCache(on_evict=self._on_cache_evict),
+            "stream_cache": StreamCache(on_evict=self._on_cache_evict),
+            "online_map": VersionedMap()
+        }
+        self.cur_cache = self.shared_cache
+        self.sinks = []
+        # 设备上下线事件与解码记录走同一组下游
+        self.registry = DeviceRegistry(on_event=self._emit)
         
     async def create_driver(self, **kwargs):
 
@@ -243,7 +462,12 @@ class UdpManager:
             while driver_id in self.drivers:
                 driver_id = f"udp_driver_{len(self.drivers) + 1}_{asyncio.get_event_loop().time()}"
             
+            kwargs.setdefault("registry", self.registry)
+            for name, shared in self.shared_cache.items():
+                kwargs.setdefault(name, shared)
             driver = UdpDriver(**kwargs)
+            for sink in self.sinks:
+                driver.add_sink(sink)
             self.drivers[driver_id] = driver
             
             task = asyncio.create_task(driver.run(), name=driver_id)
@@ -257,25 +481,28 @@ class UdpManager:
     async def stop_driver(self, driver_id: str):
         """停止指定的UDP驱动器"""
         async with self._lock:
-            if driver_id not in self.drivers:
-                raise ValueError(f"UDP驱动器 {driver_id} 不存在")
-            
-            # 停止驱动器
-            driver = self.drivers[driver_id]
-            driver.stop()
-            
-            # 取消任务
-            if driver_id in self.tasks:
-                task = self.tasks[driver_id]
-                if not task.done():
-                    task.cancel()
-            
-            # 移除记录
-            del self.drivers[driver_id]
-            if driver_id in self.tasks:
-                del self.tasks[driver_id]
-            
-            _logger.info(f"已停止UDP驱动器 {driver_id}")
+            self._stop_driver(driver_id)
+
+    def _stop_driver(self, driver_id: str):
+        """停止驱动器并回收端口，调用方需持有 _lock"""
+        if driver_id not in self.drivers:
+            raise ValueError(f"UDP驱动器 {driver_id} 不存在")
+        # 停止驱动器
+        driver = self.drivers[driver_id]
+        driver.stop()
+        
+        # 取消任务
+        if driver_id in self.tasks:
+            task = self.tasks[driver_id]
+            if not task.done():
+                task.cancel()
+        
+        # 移除记录
+        del self.drivers[driver_id]
+        if driver_id in self.tasks:
+            del self.tasks[driver_id]
+        
+        _logger.info(f"已停止UDP驱动器 {driver_id}")
     
     async def stop_all_drivers(self):
         """停止所有UDP驱动器"""
@@ -283,10 +510,39 @@ class UdpManager:
             driver_ids = list(self.drivers.keys())
             for driver_id in driver_ids:
                 try:
-                    await self.stop_driver(driver_id)
+                    # 已持有 _lock，不能再调用 stop_driver
+                    self._stop_driver(driver_id)
                 except Exception as e:
                     _logger.error(f"停止驱动器 {driver_id} 时出错: {e}")
     
+    def add_sink(self, sink):
+        """为现有及之后创建的驱动器注册解码记录下游"""
+        self.sinks.append(sink)
+        for driver in self.drivers.values():
+            driver.add_sink(sink)
+
+    def _emit(self, record: Dict[str, Any], decode_type: str) -> None:
+        for sink in self.sinks:
+            try:
+                sink(record, decode_type)
+            except Exception as e:
+                _logger.error(f"下游处理设备状态事件失败: {e}")
+
+    def _on_cache_evict(self, uid: int, item: Any) -> None:
+        """共享缓存淘汰回调：同步移除在线主题"""
+        self.shared_cache["online_map"].discard(uid)
+
+    def locate(self, device_id: int) -> Optional[Tuple[UdpDriver, Tuple[str, int]]]:
+        """查找最近收到该设备数据的驱动器及设备地址"""
+        route = None
+        latest = None
+        for driver in self.drivers.values():
+            entry = driver.device_addrs.get(device_id)
+            if entry is not None and driver.sock is not None and (latest is None or entry[1] > latest):
+                route = (driver, entry[0])
+                latest = entry[1]
+        return route
+
     def get_driver_info(self, driver_id: str):
         """获取驱动器信息"""
         if driver_id not in self.drivers:
@@ -300,18 +556,23 @@ class UdpManager:
             "port": driver.port,
             "ip": driver.ip,
             "running": driver.running,
-            "task_done": task.done() if task else None
+            "task_done": task.done() if task else None,
+            "packets": driver.validator.get_stats(),
+            "load": driver.load_stats(),
+            "control": driver.control.get_stats(),
+            "capture": driver.capture.get_stats() if driver.capture is not None else None
         }
 
     def choose_driver_cache(self, driver_id: str):
-        """获取指定驱动器的缓存数据"""
+        """获取指定驱动器的缓存数据（由管理器创建的驱动器共享同一份缓存）"""
         if driver_id not in self.drivers:
             raise ValueError(f"UDP驱动器 {driver_id} 不存在")
         
         driver: UdpDriver = self.drivers[driver_id]
         self.cur_cache = {
             "static_cache": driver.static_cache,
-            "stream_cache": driver.stream_cache
+            "stream_cache": driver.stream_cache,
+            "online_map": driver.online_map
         }
 
     def list_drivers(self):
@@ -324,4 +585,8 @@ class UdpManager:
     
     @property
     def stream_cache(self) -> StreamCache:
-        return self.cur_cache["stream_cache"]
\ No newline at end of file
+        return self.cur_cache["stream_cache"]
+
+    @property
+    def online_map(self) -> VersionedMap:
+        return self.cur_cache["online_map"]
\ No newline at end of file
@@ -0,0 +1,82 @@
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .protocol import RequestType, DefaultProtocolHeader
+
+# 拒绝原因
+REJECT_SHORT_HEADER = "short_header"        # 不足一个协议头
+REJECT_UNKNOWN_TYPE = "unknown_type"        # channel/port/decode 无对应解码方法
+REJECT_LENGTH_MISMATCH = "length_mismatch"  # length 字段与实际负载长度不符
+REJECT_TOO_SHORT = "too_short"              # 负载短于该类型的最小长度
+REJECT_DECODE_ERROR = "decode_error"        # 通过校验但解码失败
+
+
+class PacketValidator:
+    """
+    数据包快速校验
+    在进入解码线程池之前检查协议头、length 字段与该类型的最小负载长度，
+    不合格的包只累加按原因分类的计数，不产生解码开销与异常堆栈；
+    quarantine_size > 0 时在环形队列中保留最近的不合格样本用于排查
+    """
+    def __init__(self,
+                 header=DefaultProtocolHeader,
+                 request=RequestType,
+                 quarantine_size: int = 0,
+                 sample_bytes: int = 64):
+        """
+        :param header: 协议头类型，需提供 unpack/length_limit
+        :param request: 请求类型，需提供 decoder_table
+        :param quarantine_size: 隔离区保留的样本数量，0 表示不保留
+        :param sample_bytes: 每个样本保留的最大字节数
+        """
+        self.header_len = header.__len__()
+        self._unpack = header.unpack
+        self._length_limit = header.length_limit()
+        self._decoders = request.decoder_table()
+        self.sample_bytes = sample_bytes
+        self.rejected: Counter = Counter()
+        self.accepted = 0
+        self.quarantine: Optional[deque] = deque(maxlen=quarantine_size) if quarantine_size > 0 else None
+
+    def validate(self, data: bytes, addr: Tuple[str, int]) -> Optional[Tuple[bytes, Callable, str]]:
+        """
+        校验数据包
+        :return: (负载, 解码方法, 缓存类型)，不合格时返回 None
+        """
+        if len(data) < self.header_len:
+            self.reject(REJECT_SHORT_HEADER, data, addr)
+            return None
+        channel, port, decode, length = self._unpack(data)
+        entry = self._decoders.get((channel, port, decode))
+        if entry is None:
+            self.reject(REJECT_UNKNOWN_TYPE, data, addr)
+            return None
+        payload_len = len(data) - self.header_len
+        # length 达到字段上限时表示负载不短于该值
+        if length < self._length_limit and length != payload_len:
+            self.reject(REJECT_LENGTH_MISMATCH, data, addr)
+            return None
+        decode_func, decode_type, min_size = entry
+        if payload_len < min_size:
+            self.reject(REJECT_TOO_SHORT, data, addr)
+            return None
+        self.accepted += 1
+        return data[self.header_len:], decode_func, decode_type
+
+    def reject(self, reason: str, data: bytes, addr: Tuple[str, int]) -> None:
+        """记录一次拒绝，隔离区开启时保留样本"""
+        self.rejected[reason] += 1
+        if self.quarantine is not None:
+            self.quarantine.append((time.time(), addr, reason, bytes(data[:self.sample_bytes])))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"accepted": self.accepted,
+                "rejected": dict(self.rejected),
+                "quarantined": len(self.quarantine) if self.quarantine is not None else 0}
+
+    def get_quarantine(self) -> List[Dict[str, Any]]:
+        """隔离区样本（十六进制），从旧到新"""
+        if self.quarantine is None:
+            return []
+        return [{"time": received, "addr": addr, "reason": reason, "data": sample.hex()}
+                for received, addr, reason, sample in self.quarantine]
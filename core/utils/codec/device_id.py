@@ -0,0 +1,37 @@
+"""
+------------------------------------------------------------------------
+设备 id 在进程内以 32 位整数传递，只在 API / MQTT Topic 等对外边界格式化为
+8 位十六进制字符串；格式化结果按设备缓存，避免每个数据包重复分配字符串
+------------------------------------------------------------------------
+"""
+
+from functools import lru_cache
+
+DEVICE_ID_MAX = 0xFFFFFFFF
+
+
+@lru_cache(maxsize=4096)
+def format_device_id(device_id: int) -> str:
+    """整数 id -> 8 位十六进制字符串"""
+    return f'{device_id:08x}'
+
+
+@lru_cache(maxsize=4096)
+def parse_device_id(device_id: str) -> int:
+    """8 位十六进制字符串 -> 整数 id"""
+    if len(device_id) != 8:  # 4字节对应8个十六进制字符
+        raise ValueError("Invalid ID length. Expected 8 hex chars")
+    try:
+        return int(device_id, 16)
+    except ValueError:
+        raise ValueError("Invalid hexadecimal ID format")
+
+
+@lru_cache(maxsize=4096)
+def device_id_bytes(device_id) -> bytes:
+    """整数 id（或十六进制字符串）-> 4 字节大端序"""
+    if isinstance(device_id, str):
+        device_id = parse_device_id(device_id)
+    if not 0 <= device_id <= DEVICE_ID_MAX:
+        raise ValueError("Device id exceeds 4-byte limit")
+    return device_id.to_bytes(4, 'big')
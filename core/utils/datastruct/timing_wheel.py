@@ -0,0 +1,88 @@
+import math
+from typing import Hashable, List, Tuple
+
+
+class TimingWheel:
+    """
+    分层时间轮
+    每层 2**bits 个槽，第 l 层的一个槽覆盖 2**(bits*l) 个刻度；
+    定时器放在与到期刻度仍处于同一高位页的最低层，该层的槽轮到时再向下一层级联，
+    因此 advance 的代价与到期及级联的定时器数量成正比，与定时器总数无关。
+    超出最高层范围的定时器进入溢出表，最高层转完一圈时重新插入。
+    只做定时器存储，取消由调用方在到期时自行判断（惰性删除）。
+    """
+    def __init__(self, tick: float, bits: int = 6, levels: int = 4, start: float = 0.0):
+        """
+        :param tick: 刻度长度（秒）
+        :param bits: 每层槽数的位数
+        :param levels: 层数
+        :param start: 起始时间，与 advance 传入的时间同一时钟
+        """
+        self.tick = tick
+        self.bits = bits
+        self.levels = levels
+        self._mask = (1 << bits) - 1
+        self._wheels: List[List[List[Tuple[Hashable, int]]]] = [
+            [[] for _ in range(1 << bits)] for _ in range(levels)]
+        self._overflow: List[Tuple[Hashable, int]] = []
+        self._due: List[Hashable] = []
+        self._tick = int(start // tick)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """在 deadline（秒）之后到期，精度为一个刻度"""
+        self._count += 1
+        self._insert(key, math.ceil(deadline / self.tick))
+
+    def _insert(self, key: Hashable, ticks: int) -> None:
+        now = self._tick
+        if ticks <= now:
+            self._due.append(key)
+            return
+        bits = self.bits
+        for level in range(self.levels):
+            shift = bits * (level + 1)
+            if ticks >> shift == now >> shift:
+                self._wheels[level][(ticks >> (bits * level)) & self._mask].append((key, ticks))
+                return
+        self._overflow.append((key, ticks))
+
+    def advance(self, now: float) -> List[Hashable]:
+        """推进到 now，返回其间到期的键"""
+        expired, self._due = self._due, []
+        target = int(now // self.tick)
+        bits = self.bits
+        while self._tick < target:
+            if self._count == len(expired):
+                # 没有待到期的定时器，直接跳到目标刻度
+                self._tick = target
+                break
+            self._tick += 1
+            tick = self._tick
+            if not tick & self._mask:
+                # 低层转完一圈：从高到低级联本刻度开始的槽
+                cascade = 1
+                while cascade < self.levels and not tick & ((1 << (bits * (cascade + 1))) - 1):
+                    cascade += 1
+                if cascade == self.levels:
+                    pending, self._overflow = self._overflow, []
+                    for key, ticks in pending:
+                        self._insert(key, ticks)
+                for level in range(min(cascade, self.levels - 1), 0, -1):
+                    slot = self._wheels[level][(tick >> (bits * level)) & self._mask]
+                    if slot:
+                        self._wheels[level][(tick >> (bits * level)) & self._mask] = []
+                        for key, ticks in slot:
+                            self._insert(key, ticks)
+            slot = self._wheels[0][tick & self._mask]
+            if slot:
+                self._wheels[0][tick & self._mask] = []
+                expired.extend(key for key, _ in slot)
+            if self._due:
+                expired.extend(self._due)
+                self._due = []
+        self._count -= len(expired)
+        return expired
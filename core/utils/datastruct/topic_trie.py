@@ -0,0 +1,103 @@
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+
+class _TrieNode:
+    __slots__ = ('children', 'values')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.values: Dict[Hashable, Any] = {}
+
+
+class TopicTrie:
+    """
+    MQTT Topic 过滤器前缀树
+    以过滤器的层级为边插入，支持 +（单层）和 #（多层）通配符；
+    match 沿 topic 层级向下查找，代价与 topic 深度成正比，与过滤器数量无关
+    """
+    def __init__(self):
+        self._root = _TrieNode()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def insert(self, topic_filter: str, key: Hashable, value: Any = None) -> bool:
+        """ 在过滤器下登记 key，返回是否为新登记 """
+        node = self._root
+        for level in topic_filter.split('/'):
+            node = node.children.setdefault(level, _TrieNode())
+        is_new = key not in node.values
+        node.values[key] = value
+        if is_new:
+            self._count += 1
+        return is_new
+
+    def remove(self, topic_filter: str, key: Hashable) -> bool:
+        """ 移除过滤器下的 key，并裁剪空节点 """
+        path: List[Tuple[_TrieNode, str]] = []
+        node = self._root
+        for level in topic_filter.split('/'):
+            child = node.children.get(level)
+            if child is None:
+                return False
+            path.append((node, level))
+            node = child
+        if key not in node.values:
+            return False
+        del node.values[key]
+        self._count -= 1
+        for parent, level in reversed(path):
+            child = parent.children[level]
+            if child.values or child.children:
+                break
+            del parent.children[level]
+        return True
+
+    def get(self, topic_filter: str) -> Dict[Hashable, Any]:
+        """ 获取精确过滤器下登记的全部 key """
+        node = self._root
+        for level in topic_filter.split('/'):
+            node = node.children.get(level)
+            if node is None:
+                return {}
+        return node.values
+
+    def match(self, topic: str) -> Iterator[Tuple[Hashable, Any]]:
+        """ 遍历所有匹配 topic 的过滤器下登记的 (key, value) """
+        levels = topic.split('/')
+        # $ 开头的系统 Topic 不匹配首层通配符
+        system = topic.startswith('$')
+        stack = [(self._root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if not (system and depth == 0):
+                wildcard = node.children.get('#')
+                if wildcard is not None:
+                    yield from wildcard.values.items()
+            if depth == len(levels):
+                yield from node.values.items()
+                continue
+            child = node.children.get(levels[depth])
+            if child is not None:
+                stack.append((child, depth + 1))
+            if not (system and depth == 0):
+                child = node.children.get('+')
+                if child is not None:
+                    stack.append((child, depth + 1))
+
+    def match_keys(self, topic: str) -> Set[Hashable]:
+        """ 所有匹配 topic 的 key（去重） """
+        return {key for key, _ in self.match(topic)}
+
+    def items(self) -> Iterator[Tuple[str, Hashable, Any]]:
+        """ 遍历 (过滤器, key, value) """
+        stack = [(self._root, [])]
+        while stack:
+            node, path = stack.pop()
+            if node.values:
+                topic_filter = '/'.join(path)
+                for key, value in node.values.items():
+                    yield topic_filter, key, value
+            for level, child in node.children.items():
+                stack.append((child, path + [level]))
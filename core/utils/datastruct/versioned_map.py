@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MapDelta:
+    """ 增量同步结果 """
+    epoch: str
+    version: int
+    reset: bool
+    added: Dict[Hashable, Any] = field(default_factory=dict)
+    changed: Dict[Hashable, Any] = field(default_factory=dict)
+    removed: List[Hashable] = field(default_factory=list)
+
+
+class VersionedMap:
+    """
+    带版本号的映射表
+    每次写入都会分配一个递增版本号，条目按最后修改版本有序排列，
+    因此 delta(since) 只需要从尾部向前扫描到 since 为止，代价与变更数量成正比。
+    删除的键以墓碑形式保留，超过 max_tombstones 后最旧的墓碑被裁剪，
+    早于裁剪点的客户端需要全量重新同步。
+    """
+    def __init__(self, max_tombstones: int = 4096):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._horizon = 0
+        self._max_tombstones = max_tombstones
+        self._lock = threading.Lock()
+        self._values: Dict[Hashable, Any] = {}
+        self._created: Dict[Hashable, int] = {}
+        self._changes: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._removed: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._snapshot: Optional[Tuple[int, Dict[Hashable, Any]]] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """ 写入键值，值未变化时不产生新版本，返回是否发生变更 """
+        with self._lock:
+            if key in self._values and self._values[key] == value:
+                return False
+            self._version += 1
+            version = self._version
+            if key not in self._values:
+                self._created[key] = version
+            self._values[key] = value
+            self._changes[key] = version
+            self._changes.move_to_end(key)
+            self._removed.pop(key, None)
+        self._notify()
+        return True
+
+    def update(self, items) -> int:
+        """ 批量写入 (key, value)，只加锁与唤醒一次，返回发生变更的条目数 """
+        changed = 0
+        with self._lock:
+            for key, value in items:
+                if key in self._values and self._values[key] == value:
+                    continue
+                self._version += 1
+                version = self._version
+                if key not in self._values:
+                    self._created[key] = version
+                self._values[key] = value
+                self._changes[key] = version
+                self._changes.move_to_end(key)
+                self._removed.pop(key, None)
+                changed += 1
+        if changed:
+            self._notify()
+        return changed
+
+    def discard(self, key: Hashable) -> bool:
+        """ 删除键并留下墓碑，键不存在时不产生新版本 """
+        with self._lock:
+            if key not in self._values:
+                return False
+            self._version += 1
+            version = self._version
+            del self._values[key]
+            del self._created[key]
+            del self._changes[key]
+            self._removed[key] = version
+            while len(self._removed) > self._max_tombstones:
+                _, pruned = self._removed.popitem(last=False)
+                self._horizon = pruned
+        self._notify()
+        return True
+
+    def snapshot(self) -> Dict[Hashable, Any]:
+        """ 获取全量映射，同一版本内重复调用复用同一份拷贝 """
+        with self._lock:
+            if self._snapshot is None or self._snapshot[0] != self._version:
+                self._snapshot = (self._version, dict(self._values))
+            return self._snapshot[1]
+
+    def delta(self, since: int = 0, epoch: Optional[str] = None) -> MapDelta:
+        """
+        获取自 since 版本以来的变更
+        epoch 不匹配、since 早于墓碑裁剪点或超前于当前版本时返回全量（reset=True）
+        """
+        with self._lock:
+            version = self._version
+            if epoch != self.epoch or since < self._horizon or since > version:
+                return MapDelta(epoch=self.epoch,
+                                version=version,
+                                reset=True,
+                                added=dict(self._values))
+
+            result = MapDelta(epoch=self.epoch, version=version, reset=False)
+            for key, changed_at in reversed(self._changes.items()):
+                if changed_at <= since:
+                    break
+                if self._created[key] > since:
+                    result.added[key] = self._values[key]
+                else:
+                    result.changed[key] = self._values[key]
+            for key, removed_at in reversed(self._removed.items()):
+                if removed_at <= since:
+                    break
+                result.removed.append(key)
+            return result
+
+    async def wait_for_change(self, since: int, timeout: float) -> bool:
+        """ 长轮询：等待版本超过 since，超时返回 False """
+        if self._version > since:
+            return True
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (loop, waiter)
+        with self._lock:
+            self._waiters.append(entry)
+        try:
+            if self._version > since:
+                return True
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+
+    def _notify(self) -> None:
+        """ 唤醒所有长轮询等待者（可从任意线程调用） """
+        if not self._waiters:
+            return
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(True)
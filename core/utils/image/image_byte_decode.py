@@ -1,10 +1,16 @@
 import base64
-from core.network.udp.cache import ImgStruct
+from network.udp.cache import ImgStruct
+from network.udp.packet import IMGFORMAT
+
+# 解码后的格式名（RGB565 等）-> 设备上报的格式标识（565 等）
+_FORMAT_CODES = {name: code for code, name in IMGFORMAT.items()}
+
+
 def decode_image_data(img_struct: ImgStruct):
     """
     解码图片数据
     """
-    formats = img_struct.formats
+    formats = _FORMAT_CODES.get(img_struct.formats, img_struct.formats)
     size = img_struct.size
     byte_data = img_struct.datas.get_full_data
     
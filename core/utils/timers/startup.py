@@ -0,0 +1,69 @@
+import time
+import traceback
+from typing import Any, Awaitable, Dict, Optional
+from loguru import logger as _logger
+
+
+class StartupReport:
+    """
+    启动耗时报告
+    记录每个启动阶段相对进程导入起点的开始时间、耗时和状态，
+    用于度量冷启动与热重载时间
+    """
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def _ms(self, t: float) -> float:
+        return round((t - self.origin) * 1000, 3)
+
+    def begin(self) -> 'StartupReport':
+        """ 标记启动流程开始（导入阶段到此结束） """
+        self.started_at = time.perf_counter()
+        self.phases["import"] = {
+            "start_ms": 0.0,
+            "duration_ms": self._ms(self.started_at),
+            "status": "ok",
+        }
+        return self
+
+    def record(self, name: str, start: float, status: str = "ok", error: Optional[str] = None) -> None:
+        end = time.perf_counter()
+        self.phases[name] = {
+            "start_ms": self._ms(start),
+            "duration_ms": round((end - start) * 1000, 3),
+            "status": status,
+        }
+        if error is not None:
+            self.phases[name]["error"] = error
+
+    async def run_phase(self, name: str, awaitable: Awaitable) -> Any:
+        """
+        执行并计时一个启动阶段
+        阶段失败只记录错误并返回 None，不影响其他并发阶段
+        """
+        start = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception as e:
+            self.record(name, start, status="error", error=str(e))
+            _logger.error(f"启动阶段 {name} 失败: {e}")
+            _logger.debug(traceback.format_exc())
+            return None
+        self.record(name, start)
+        _logger.info(f"启动阶段 {name} 完成，耗时 {self.phases[name]['duration_ms']}ms")
+        return result
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+        _logger.info(f"应用启动完成，总耗时 {self._ms(self.finished_at)}ms")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": self._ms(self.finished_at) if self.finished_at else None,
+            "startup_ms": round((self.finished_at - self.started_at) * 1000, 3)
+                          if self.finished_at and self.started_at else None,
+            "phases": self.phases,
+        }
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 项目模块以 core 目录为根导入（network.*, utils.*），测试从仓库根目录以 python -m pytest tests 运行
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE_PATH = os.path.join(ROOT_PATH, "core")
+for _path in (ROOT_PATH, CORE_PATH):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
@@ -0,0 +1,152 @@
+import asyncio
+from network.mqtt.mqtt_codec import encode_payload, split_chunks
+from network.mqtt.mqtt_conflate import MqttConflator
+from network.mqtt.mqtt_loopback import (LoopbackBroker, LoopbackPublisher, LoopbackSubscriber,
+                                        HybridPublisher, LatestMessageStore)
+from network.mqtt.mqtt_monitor import MqttSubscriptionMonitor
+from network.mqtt.mqtt_sub import raw_payload
+
+
+class _RecordingPublisher:
+    """记录远端发布调用的替身"""
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.messages.append((topic, payload))
+
+
+class _FakeRemoteSubscriber:
+    """保存订阅关系，由测试直接注入 Broker 消息"""
+    def __init__(self):
+        self.subscriptions = []
+
+    def subscribe(self, topic, on_data_ready=None, decoder=None, qos=0, **kwargs):
+        self.subscriptions.append((topic, on_data_ready, decoder))
+        return len(self.subscriptions) - 1
+
+    def deliver(self, topic, data: bytes):
+        for _, handler, decoder in self.subscriptions:
+            handler(topic, decoder(topic, data))
+
+
+def test_records_are_delivered_by_reference():
+    broker = LoopbackBroker()
+    subscriber = LoopbackSubscriber(broker)
+    received = []
+    subscriber.subscribe("nar/+/data", lambda topic, payload: received.append((topic, payload)))
+    record = {"id": 1, "data": [1, 2, 3]}
+
+    assert broker.publish("nar/1/data", record) == 1
+    assert broker.publish("nar/1/status", record) == 0
+    assert received == [("nar/1/data", record)]
+    assert received[0][1] is record
+
+
+def test_unsubscribe_stops_delivery():
+    broker = LoopbackBroker()
+    subscriber = LoopbackSubscriber(broker)
+    received = []
+    subscription = subscriber.subscribe("nar/#", lambda topic, payload: received.append(payload))
+    subscriber.unsubscribe(subscription)
+
+    assert not broker.has_subscribers("nar/1/data")
+    assert broker.publish("nar/1/data", {"id": 1}) == 0
+    assert received == []
+
+
+def test_shared_chunks_are_reassembled_once():
+    broker = LoopbackBroker()
+    first, second = LoopbackSubscriber(broker), LoopbackSubscriber(broker)
+    received = []
+    first.subscribe("t/#", lambda topic, payload: received.append(payload))
+    second.subscribe("t/#", lambda topic, payload: received.append(payload))
+    chunks = split_chunks(encode_payload({"id": 7, "uid": 3, "timestamp": 1, "data": b"x" * 4000}),
+                          max_size=1024)
+    assert len(chunks) > 1
+
+    for chunk in chunks:
+        broker.publish("t/blob", chunk)
+
+    assert len(received) == 2
+    assert received[0] is received[1]
+    assert received[0]["data"] == b"x" * 4000
+    assert not broker.reassembler._pending
+
+
+def test_hybrid_publisher_skips_remote_without_receivers():
+    broker = LoopbackBroker()
+    remote = _RecordingPublisher()
+    receivers = {"nar/1/data"}
+    publisher = HybridPublisher(LoopbackPublisher(broker), remote,
+                                remote_filter=lambda topic: topic in receivers)
+    local = []
+    LoopbackSubscriber(broker).subscribe("nar/#", lambda topic, payload: local.append(topic))
+
+    publisher.publish("nar/1/data", {"id": 1})
+    publisher.publish("nar/2/data", {"id": 2})
+
+    assert local == ["nar/1/data", "nar/2/data"]
+    assert remote.messages == [("nar/1/data", {"id": 1})]
+    assert publisher.stats == {"local": 2, "remote": 1, "skipped": 1}
+
+
+def test_monitor_runs_on_loopback_with_relayed_sys_topics():
+    broker = LoopbackBroker()
+    monitor = MqttSubscriptionMonitor(subscriber=LoopbackSubscriber(broker))
+    remote = _FakeRemoteSubscriber()
+    broker.relay_from(remote, "$SYS/broker/subscriptions/#")
+    broker.relay_from(remote, "$SYS/broker/clients/+")
+    assert all(decoder is raw_payload for _, _, decoder in remote.subscriptions)
+
+    remote.deliver("$SYS/broker/subscriptions/dashboard/nar/+/data", b"1")
+    assert monitor.client is None
+    assert monitor.get_receivers("nar/5/data") == ["dashboard"]
+    assert monitor.get_receivers("nar/5/status") == []
+
+    version = monitor.version
+    remote.deliver("$SYS/broker/clients/dashboard", b"0")
+    assert monitor.version > version
+    assert monitor.get_receivers("nar/5/data") == []
+
+    monitor.stop_monitoring()
+    assert not broker.has_subscribers("$SYS/broker/clients/dashboard")
+
+
+def test_latest_message_store_keeps_newest_per_topic():
+    broker = LoopbackBroker()
+    store = LatestMessageStore(LoopbackSubscriber(broker), max_topics=2)
+    broker.publish("nar/1/data", {"id": 1, "data": 1})
+    broker.publish("nar/1/data", {"id": 1, "data": 2})
+    broker.publish("nar/2/data", {"id": 2, "data": b"\x00\x01"})
+    broker.publish("nar/3/status", {"id": 3, "data": "ok"})
+
+    assert len(store) == 2
+    latest = store.get("nar/+/data")
+    assert list(latest) == ["nar/2/data"]
+    assert latest["nar/2/data"]["payload"] == {"id": "00000002", "data": "AAE="}
+    assert store.get("nar/3/#")["nar/3/status"]["payload"]["data"] == "ok"
+
+    store.stop()
+    assert not broker.has_subscribers("nar/1/data")
+
+
+def test_conflator_publishes_latest_value_to_loopback():
+    broker = LoopbackBroker()
+    received = []
+    LoopbackSubscriber(broker).subscribe("nar/#", lambda topic, payload: received.append(payload))
+
+    async def run():
+        conflator = MqttConflator(LoopbackPublisher(broker), rates={"nar/+/data": 20.0})
+        await conflator.start()
+        for value in range(5):
+            conflator.publish("nar/1/data", {"id": 1, "data": value})
+        conflator.publish("nar/1/status", {"id": 1, "data": "ok"})
+        await asyncio.sleep(0.2)
+        await conflator.stop()
+        return conflator.get_stats()
+
+    stats = asyncio.run(run())
+    assert {"id": 1, "data": "ok"} in received
+    assert [payload["data"] for payload in received if payload["data"] != "ok"] == [4]
+    assert stats["passthrough"]["published"] == 1